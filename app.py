@@ -1,13 +1,15 @@
 import streamlit as st
 from modules import (
     usuarios, controles, graficos_control, graficos_alertas, reportes, estandares,
-    ordenes, gestion_usuarios, dashboard_powerbi, lineas
+    ordenes, gestion_usuarios, dashboard_powerbi, lineas, trazabilidad, reevaluacion, panel_vivo, andon
 )
 from modules.styles import cargar_estilos  # agregado
+from database.esquema import asegurar_esquema
 
 # FUNCIÓN PRINCIPAL
 def main():
     cargar_estilos()  # agregado
+    asegurar_esquema()  # índices de apoyo, una vez por proceso
 
     # Si no hay usuario logueado → mostrar login
     if "usuario" not in st.session_state:
@@ -42,6 +44,7 @@ def menu_operario():
     st.sidebar.title("Menú Operario")
     opciones = st.sidebar.radio("Seleccione una opción", [
         "Registrar Control de Calidad",
+        "Importar Mediciones",
         "Ver Registros Guardados",
         "Ver Alertas Automáticas"
     ])
@@ -49,6 +52,9 @@ def menu_operario():
     if opciones == "Registrar Control de Calidad":
         controles.registrar_control()
 
+    elif opciones == "Importar Mediciones":
+        controles.importar_mediciones_ui()
+
     elif opciones == "Ver Registros Guardados":
         controles.ver_registros_guardados()
 
@@ -63,7 +69,10 @@ def menu_supervisor():
         "Reportes Básicos",
         "Gráficos de Alertas",
         "Dashboards Power BI",
-        "Órdenes de Trabajo"
+        "Órdenes de Trabajo",
+        "Trazabilidad de Lotes",
+        "Panel en Vivo",
+        "Tablero Andon"
     ])
 
     if opciones == "Consultas de Registro":
@@ -81,6 +90,15 @@ def menu_supervisor():
     elif opciones == "Órdenes de Trabajo":
         ordenes.gestionar_ordenes()
 
+    elif opciones == "Trazabilidad de Lotes":
+        trazabilidad.ver_trazabilidad()
+
+    elif opciones == "Panel en Vivo":
+        panel_vivo.ver_panel_vivo()
+
+    elif opciones == "Tablero Andon":
+        andon.ver_tablero_andon()
+
 # MENÚ GERENTE DE PLANTA
 def menu_gerente():
     st.sidebar.title("Menú Gerente de Planta")
@@ -92,7 +110,11 @@ def menu_gerente():
         "Líneas de Producción",
         "Consultas y Reportes",
         "Gráficos de Alertas",
-        "Dashboards Power BI"
+        "Dashboards Power BI",
+        "Trazabilidad de Lotes",
+        "Re-evaluación de Alertas",
+        "Panel en Vivo",
+        "Tablero Andon"
     ])
 
     if opciones == "Configuración de Parámetros de Calidad":
@@ -116,6 +138,18 @@ def menu_gerente():
     elif opciones == "Dashboards Power BI":
         dashboard_powerbi.dashboard_powerbi_module()
 
+    elif opciones == "Trazabilidad de Lotes":
+        trazabilidad.ver_trazabilidad()
+
+    elif opciones == "Re-evaluación de Alertas":
+        reevaluacion.ver_reevaluacion()
+
+    elif opciones == "Panel en Vivo":
+        panel_vivo.ver_panel_vivo()
+
+    elif opciones == "Tablero Andon":
+        andon.ver_tablero_andon()
+
 # EJECUCIÓN
 if __name__ == "__main__":
     main()
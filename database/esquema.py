@@ -0,0 +1,142 @@
+import threading
+from database.db_connection import get_connection
+
+# ESQUEMA AUXILIAR (índices y tablas de apoyo)
+#
+# Sentencias idempotentes que se aplican una sola vez por proceso al iniciar
+# la app. Los índices ya existentes (errno 1061) se ignoran.
+
+ERRNO_INDICE_DUPLICADO = 1061
+
+SENTENCIAS_ESQUEMA = [
+    # búsqueda de órdenes por código (prefijo) y por turno reciente
+    "CREATE INDEX idx_orden_codigo ON OrdenTrabajo (codigoOrden)",
+    "CREATE INDEX idx_orden_fecha_turno ON OrdenTrabajo (fecha, turno)",
+    # búsqueda directa por lote impreso en el envase
+    "CREATE INDEX idx_detalle_lote ON DetalleOrdenTrabajo (lote)",
+    # resumen de calidad por detalle, mantenido en cada escritura de controles/alertas
+    """
+    CREATE TABLE IF NOT EXISTS resumencalidadorden (
+        idDetalle INT NOT NULL PRIMARY KEY,
+        idOrdenTrabajo INT NOT NULL,
+        controles INT NOT NULL DEFAULT 0,
+        parametrosCubiertos INT NOT NULL DEFAULT 0,
+        parametrosRequeridos INT NOT NULL DEFAULT 0,
+        fueraEspecificacion INT NOT NULL DEFAULT 0,
+        alertasAbiertas INT NOT NULL DEFAULT 0,
+        primerControl DATETIME NULL,
+        ultimoControl DATETIME NULL,
+        actualizado DATETIME NOT NULL,
+        INDEX idx_resumen_orden (idOrdenTrabajo)
+    )
+    """,
+    "CREATE INDEX idx_control_detalle ON controlcalidad (idDetalle)",
+    # trazabilidad: controles → alertas
+    "CREATE INDEX idx_alerta_control ON alerta (idControl)",
+    # versiones de especificación con fecha de vigencia
+    """
+    CREATE TABLE IF NOT EXISTS versionespecificacion (
+        idVersion INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        idParametro INT NOT NULL,
+        idPresentacion INT NULL,
+        limiteInferior DECIMAL(12,4) NULL,
+        limiteSuperior DECIMAL(12,4) NULL,
+        tipoParametro VARCHAR(20) NULL,
+        vigenteDesde DATETIME NOT NULL,
+        INDEX idx_version_param (idParametro, idPresentacion, vigenteDesde)
+    )
+    """,
+    # versión inicial = límites actuales, sólo si la tabla está vacía
+    """
+    INSERT INTO versionespecificacion
+        (idParametro, idPresentacion, limiteInferior, limiteSuperior, tipoParametro, vigenteDesde)
+    SELECT s.* FROM (
+        SELECT idParametro, NULL AS idPresentacion, limiteInferior, limiteSuperior, tipoParametro,
+                TIMESTAMP('2000-01-01') AS vigenteDesde
+        FROM parametrocalidad
+        UNION ALL
+        SELECT idParametro, idPresentacion, limiteInferior, limiteSuperior, tipoParametro,
+                TIMESTAMP('2000-01-01')
+        FROM presentacionparametro
+    ) s
+    WHERE NOT EXISTS (SELECT 1 FROM versionespecificacion)
+    """,
+    # envíos del formulario de controles ya aplicados (idempotencia ante reenvíos)
+    """
+    CREATE TABLE IF NOT EXISTS envioformulario (
+        claveEnvio CHAR(64) NOT NULL PRIMARY KEY,
+        idUsuario INT NOT NULL,
+        idDetalle INT NOT NULL,
+        controles INT NOT NULL,
+        recibido DATETIME NOT NULL
+    )
+    """,
+    # episodios de alertas: alertas consecutivas de la misma clave agrupadas en una fila
+    """
+    CREATE TABLE IF NOT EXISTS episodioalerta (
+        idEpisodio INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        claveAbierta VARCHAR(64) NULL,
+        idLinea INT NULL,
+        idPresentacion INT NULL,
+        idParametro INT NULL,
+        idDetalle INT NULL,
+        tipoAlerta VARCHAR(50) NULL,
+        alertas INT NOT NULL DEFAULT 0,
+        peorValor DECIMAL(12,4) NULL,
+        peorDesviacion DECIMAL(12,4) NOT NULL DEFAULT 0,
+        limiteInferior DECIMAL(12,4) NULL,
+        limiteSuperior DECIMAL(12,4) NULL,
+        primeraAlerta DATETIME NOT NULL,
+        ultimaAlerta DATETIME NOT NULL,
+        idUltimoControl INT NULL,
+        estado VARCHAR(20) NOT NULL DEFAULT 'abierto',
+        UNIQUE KEY ux_episodio_abierto (claveAbierta),
+        INDEX idx_episodio_ultima (ultimaAlerta),
+        INDEX idx_episodio_clave (idLinea, idPresentacion, idParametro, idDetalle)
+    )
+    """,
+    # marcas de agua del notificador de alertas (último idAlerta enviado por canal)
+    """
+    CREATE TABLE IF NOT EXISTS marcanotificacion (
+        canal VARCHAR(30) NOT NULL PRIMARY KEY,
+        ultimoIdAlerta INT NOT NULL,
+        actualizado DATETIME NOT NULL
+    )
+    """,
+    # tablero andon: controles recientes por línea (una consulta por línea cada refresco)
+    "CREATE INDEX idx_control_linea_fecha ON controlcalidad (idLinea, fechaControl)",
+    # panel en vivo: primera carga de las últimas horas sin filtro de línea
+    "CREATE INDEX idx_control_fecha ON controlcalidad (fechaControl)",
+]
+
+_lock_esquema = threading.Lock()
+_esquema_aplicado = False
+
+
+def asegurar_esquema():
+    """Aplica SENTENCIAS_ESQUEMA una vez por proceso. Devuelve la lista de errores no fatales."""
+    global _esquema_aplicado
+    with _lock_esquema:
+        if _esquema_aplicado:
+            return []
+        errores = []
+        conn = get_connection()
+        try:
+            cursor = conn.cursor()
+            for sentencia in SENTENCIAS_ESQUEMA:
+                try:
+                    cursor.execute(sentencia)
+                except Exception as e:
+                    if getattr(e, "errno", None) != ERRNO_INDICE_DUPLICADO:
+                        errores.append(f"{' '.join(sentencia.split('(')[0].split())}: {e}")
+            conn.commit()
+            cursor.close()
+        finally:
+            conn.close()
+        _esquema_aplicado = True
+        return errores
+
+
+if __name__ == "__main__":
+    for error in asegurar_esquema():
+        print(error)
@@ -0,0 +1,140 @@
+import html
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import streamlit as st
+from database.db_connection import get_connection
+from modules.catalogo import obtener_catalogo
+from modules.reevaluacion import evaluar_bloque
+from modules.panel_vivo import estado_imr, fragmento
+
+# TABLERO ANDON (pantalla de pared, estado por línea y parámetro)
+#
+# Para cada línea se leen los controles de las últimas HORAS_VENTANA horas (una
+# consulta por línea, todas en paralelo con un ThreadPoolExecutor) y se calcula
+# de forma vectorizada el estado de cada parámetro de la línea:
+#   sin datos          → ningún control en las últimas `horas_sin_datos` horas
+#   fuera de espec.    → el último control no cumple la especificación
+#   fuera de control   → el último punto sale de los límites I-MR (±3σ)
+#   en control         → ninguno de los anteriores
+# El resultado se cachea TTL_ANDON segundos: todas las pantallas abiertas
+# comparten un único cálculo.
+
+HORAS_VENTANA = 24
+HORAS_SIN_DATOS = 4
+TTL_ANDON = 10
+MAX_HILOS_ANDON = 8
+
+SIN_DATOS = "sin datos"
+FUERA_ESPEC = "fuera de especificación"
+FUERA_CONTROL = "fuera de control"
+EN_CONTROL = "en control"
+COLORES_ANDON = {SIN_DATOS: "#6B7280", FUERA_ESPEC: "#DC2626", FUERA_CONTROL: "#F59E0B", EN_CONTROL: "#16A34A"}
+
+Q_CONTROLES_LINEA = """
+    SELECT idControl, fechaControl, resultado, idLinea, idParametro, idPresentacion
+    FROM controlcalidad
+    WHERE idLinea = %s AND fechaControl >= NOW() - INTERVAL %s HOUR
+    ORDER BY idControl
+"""
+
+
+def parametros_por_linea(catalogo):
+    """Parámetros de cada línea (vía el tipo de control al que pertenecen)."""
+    tipos = catalogo["tipos"][["idTipoControl", "idLinea"]]
+    return catalogo["parametros"][["idParametro", "nombreParametro", "idTipoControl"]].merge(
+        tipos, on="idTipoControl", how="inner")
+
+
+def estado_linea(id_linea, parametros, catalogo, horas_sin_datos=HORAS_SIN_DATOS, ahora=None):
+    """Estado de cada parámetro de la línea. Abre su propia conexión (se ejecuta en un hilo)."""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(Q_CONTROLES_LINEA, (int(id_linea), HORAS_VENTANA))
+        columnas = [c[0] for c in cursor.description]
+        controles = pd.DataFrame(cursor.fetchall(), columns=columnas)
+        cursor.close()
+    finally:
+        conn.close()
+
+    tablero = parametros[["idParametro", "nombreParametro"]].assign(idLinea=id_linea)
+    if controles.empty:
+        return tablero.assign(estado=SIN_DATOS, ultimo=np.nan, ultimaFecha=pd.NaT, idPresentacion=np.nan)
+
+    controles["fechaControl"] = pd.to_datetime(controles["fechaControl"])
+    imr = estado_imr(controles)
+    # por parámetro, el grupo (presentación) con el control más reciente
+    imr = imr.sort_values("ultimaFecha").groupby("idParametro", sort=False).tail(1)
+    ultimos = controles.sort_values("idControl").groupby("idParametro", sort=False).tail(1)
+    espec = evaluar_bloque(ultimos, catalogo)[["idParametro", "cumple"]]
+
+    tablero = tablero.merge(imr[["idParametro", "idPresentacion", "ultimo", "ultimaFecha", "fueraControl"]],
+                            on="idParametro", how="left").merge(espec, on="idParametro", how="left")
+    ahora = ahora or datetime.now()
+    sin_datos = tablero["ultimaFecha"].isna() | (tablero["ultimaFecha"] < pd.Timestamp(ahora) - pd.Timedelta(hours=horas_sin_datos))
+    tablero["estado"] = np.select(
+        [sin_datos, tablero["cumple"].eq(False), tablero["fueraControl"].eq(True)],
+        [SIN_DATOS, FUERA_ESPEC, FUERA_CONTROL], default=EN_CONTROL)
+    return tablero.drop(columns=["cumple", "fueraControl"])
+
+
+@st.cache_data(ttl=TTL_ANDON, show_spinner=False)
+def tablero_andon(horas_sin_datos=HORAS_SIN_DATOS):
+    """Estado de todas las líneas, calculadas en paralelo. Compartido por todas las sesiones."""
+    catalogo = obtener_catalogo()
+    params = parametros_por_linea(catalogo)
+    lineas = catalogo["lineas"]["idLinea"].tolist()
+    if not lineas:
+        return pd.DataFrame()
+    ahora = datetime.now()
+    with ThreadPoolExecutor(max_workers=min(MAX_HILOS_ANDON, len(lineas))) as pool:
+        partes = list(pool.map(
+            lambda l: estado_linea(l, params[params["idLinea"] == l], catalogo, horas_sin_datos, ahora), lineas))
+    tablero = pd.concat(partes, ignore_index=True)
+    tablero["nombreLinea"] = tablero["idLinea"].map(catalogo["lineas"].set_index("idLinea")["nombreLinea"])
+    return tablero
+
+
+def _tarjeta(fila):
+    color = COLORES_ANDON[fila.estado]
+    valor = "-" if pd.isna(fila.ultimo) else f"{fila.ultimo:g}"
+    hora = "" if pd.isna(fila.ultimaFecha) else f"{fila.ultimaFecha:%H:%M}"
+    return (f"<div style='background:{color};border-radius:8px;padding:8px;margin:4px 0;color:white'>"
+            f"<b>{html.escape(str(fila.nombreParametro))}</b><br><small>{fila.estado} · {valor} · {hora}</small></div>")
+
+
+@fragmento(run_every=TTL_ANDON)
+def _mostrar_tablero(horas_sin_datos):
+    tablero = tablero_andon(horas_sin_datos)
+    if tablero.empty:
+        st.info("No hay líneas configuradas.")
+        return
+    conteo = tablero["estado"].value_counts()
+    cols = st.columns(4)
+    for col, estado in zip(cols, [FUERA_ESPEC, FUERA_CONTROL, SIN_DATOS, EN_CONTROL]):
+        col.metric(estado.capitalize(), int(conteo.get(estado, 0)))
+
+    orden = {FUERA_ESPEC: 0, FUERA_CONTROL: 1, SIN_DATOS: 2, EN_CONTROL: 3}
+    tablero = tablero.assign(_orden=tablero["estado"].map(orden)).sort_values(["nombreLinea", "_orden", "nombreParametro"])
+    lineas = list(tablero.groupby("nombreLinea", sort=True))
+    for i in range(0, len(lineas), 3):
+        cols = st.columns(3)
+        for col, (nombre_linea, g) in zip(cols, lineas[i:i + 3]):
+            with col:
+                peor = g["estado"].iloc[0]
+                st.markdown(f"<h3 style='border-bottom:4px solid {COLORES_ANDON[peor]}'>{html.escape(str(nombre_linea))}</h3>",
+                            unsafe_allow_html=True)
+                st.markdown("".join(_tarjeta(f) for f in g.itertuples(index=False)), unsafe_allow_html=True)
+    st.caption(f"Actualizado {datetime.now():%H:%M:%S} · se recalcula cada {TTL_ANDON} s")
+
+
+def ver_tablero_andon():
+    st.title("Tablero Andon")
+    horas = st.sidebar.number_input("Horas sin datos", min_value=1, max_value=HORAS_VENTANA, value=HORAS_SIN_DATOS)
+    _mostrar_tablero(int(horas))
+
+
+if __name__ == "__main__":
+    ver_tablero_andon()
@@ -0,0 +1,167 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+from modules.catalogo import obtener_catalogo, version_catalogo
+
+# ÍNDICE EN CASCADA (línea → presentación → tipo → parámetro → lote)
+#
+# Se construye una sola vez sobre las combinaciones distintas ("caminos") del
+# catálogo y/o de los datos observados. Para cada nivel y valor se guarda la
+# lista de posiciones (postings), de modo que:
+#   - hijos(indice, nivel, valor)   -> O(1) (precalculado)
+#   - opciones(indice, nivel, sel)  -> intersección de postings, memorizada
+# El filtrado de las filas lo hace modules.filtros (una máscara por especificación).
+# Los índices se comparten entre sesiones: no modificarlos.
+
+NIVELES_CATALOGO = ["idLinea", "idPresentacion", "idTipoControl", "idParametro", "lote"]
+
+
+def _postings(serie):
+    validos = serie.notna().to_numpy()
+    if not validos.any():
+        return {}
+    posiciones = np.flatnonzero(validos)
+    valores = serie[validos]
+    return {
+        _valor_nativo(k): posiciones[np.asarray(v, dtype=np.int64)]
+        for k, v in valores.groupby(valores, sort=False).indices.items()
+    }
+
+
+def _valor_nativo(v):
+    return v.item() if isinstance(v, np.generic) else v
+
+
+def construir_indice(df, niveles, etiquetas=None):
+    """
+    df: DataFrame con (al menos) las columnas de `niveles`, en orden jerárquico.
+    etiquetas: {nivel: {valor: nombre}} opcional, para ordenar las opciones por nombre.
+    """
+    etiquetas = etiquetas or {}
+    datos = df[niveles].reset_index(drop=True) if not df.empty else pd.DataFrame(columns=niveles)
+    caminos = datos.drop_duplicates().reset_index(drop=True)
+
+    indice = {
+        "niveles": list(niveles),
+        "etiquetas": etiquetas,
+        "caminos": {n: caminos[n].to_numpy() for n in niveles},
+        "postings_caminos": {n: _postings(caminos[n]) for n in niveles},
+        "hijos": {},
+        "_memo": {},
+    }
+
+    # hijos directos (nivel i -> nivel i+1) precalculados
+    for padre, hijo in zip(niveles[:-1], niveles[1:]):
+        pares = caminos[[padre, hijo]].dropna().drop_duplicates()
+        grupos = pares.groupby(padre, sort=False)[hijo].apply(list).to_dict() if not pares.empty else {}
+        indice["hijos"][padre] = {
+            _valor_nativo(k): _ordenar(indice, hijo, v) for k, v in grupos.items()
+        }
+    return indice
+
+
+def _ordenar(indice, nivel, valores):
+    valores = [_valor_nativo(v) for v in pd.unique(pd.Series(valores).dropna())]
+    nombres = indice["etiquetas"].get(nivel)
+    if nombres:
+        return sorted(valores, key=lambda v: str(nombres.get(v, v)))
+    return sorted(valores, key=str)
+
+
+def _interseccion(postings, seleccion):
+    """Intersección de postings para {nivel: valor}; None si no hay filtros."""
+    listas = []
+    for nivel, valor in seleccion.items():
+        if valor is None:
+            continue
+        listas.append(postings.get(nivel, {}).get(valor, np.empty(0, dtype=np.int64)))
+    if not listas:
+        return None
+    listas.sort(key=len)
+    pos = listas[0]
+    for otra in listas[1:]:
+        if pos.size == 0:
+            break
+        pos = np.intersect1d(pos, otra, assume_unique=True)
+    return pos
+
+
+def hijos(indice, nivel, valor):
+    """Valores del nivel siguiente para un valor del nivel dado."""
+    return indice["hijos"].get(nivel, {}).get(valor, [])
+
+
+def opciones(indice, nivel, seleccion=None):
+    """
+    Valores posibles de `nivel` compatibles con la selección {nivel: valor}
+    (valor None = "Todas"). Resultados memorizados por selección.
+    """
+    seleccion = {k: v for k, v in (seleccion or {}).items() if v is not None and k != nivel}
+    clave = (nivel, tuple(sorted(seleccion.items(), key=lambda kv: kv[0])))
+    memo = indice["_memo"]
+    if clave in memo:
+        return memo[clave]
+
+    # caso frecuente: sólo el padre inmediato seleccionado
+    niveles = indice["niveles"]
+    pos_nivel = niveles.index(nivel) if nivel in niveles else -1
+    if len(seleccion) == 1 and pos_nivel > 0 and niveles[pos_nivel - 1] in seleccion:
+        resultado = hijos(indice, niveles[pos_nivel - 1], seleccion[niveles[pos_nivel - 1]])
+    else:
+        pos = _interseccion(indice["postings_caminos"], seleccion)
+        columna = indice["caminos"][nivel]
+        valores = columna if pos is None else columna[pos]
+        resultado = _ordenar(indice, nivel, valores)
+    memo[clave] = resultado
+    return resultado
+
+
+def etiquetas_catalogo(catalogo):
+    return {
+        "idLinea": dict(zip(catalogo["lineas"]["idLinea"], catalogo["lineas"]["nombreLinea"])),
+        "idPresentacion": dict(zip(catalogo["presentaciones"]["idPresentacion"], catalogo["presentaciones"]["nombrePresentacion"])),
+        "idTipoControl": dict(zip(catalogo["tipos"]["idTipoControl"], catalogo["tipos"]["nombreTipo"])),
+        "idParametro": dict(zip(catalogo["parametros"]["idParametro"], catalogo["parametros"]["nombreParametro"])),
+    }
+
+
+def indice_cascada(catalogo, controles=None, detalles=None, rel_pres_tipo=None):
+    """
+    Índice por ids sobre el catálogo, completado con las combinaciones observadas
+    en controles, los lotes de detalleordentrabajo y la relación presentación-tipo.
+    """
+    pres = catalogo["presentaciones"][["idPresentacion", "idLinea"]]
+    tipos = catalogo["tipos"][["idTipoControl", "idLinea"]]
+    params = catalogo["parametros"][["idParametro", "idTipoControl"]]
+
+    partes = [
+        catalogo["lineas"][["idLinea"]],
+        pres,
+        tipos,
+        params.merge(tipos, on="idTipoControl", how="left"),
+        catalogo["especificaciones"][["idPresentacion", "idParametro"]]
+            .merge(params, on="idParametro", how="left")
+            .merge(pres, on="idPresentacion", how="left"),
+    ]
+    if rel_pres_tipo is not None and not rel_pres_tipo.empty:
+        partes.append(rel_pres_tipo[["idPresentacion", "idTipoControl"]].merge(pres, on="idPresentacion", how="left"))
+    if detalles is not None and not detalles.empty:
+        partes.append(detalles[["idPresentacion", "lote"]].merge(pres, on="idPresentacion", how="left"))
+    if controles is not None and not controles.empty:
+        cols = [c for c in NIVELES_CATALOGO if c in controles.columns]
+        partes.append(controles[cols].drop_duplicates())
+
+    caminos = pd.concat(partes, ignore_index=True).reindex(columns=NIVELES_CATALOGO)
+    for col in NIVELES_CATALOGO[:-1]:
+        caminos[col] = caminos[col].astype("Int64")
+    return construir_indice(caminos, NIVELES_CATALOGO, etiquetas_catalogo(catalogo))
+
+
+@st.cache_resource(max_entries=1)
+def _indice_catalogo(version):
+    return indice_cascada(obtener_catalogo())
+
+
+def obtener_indice_catalogo():
+    """Índice sólo de catálogo, reconstruido cuando cambia la versión del catálogo."""
+    return _indice_catalogo(version_catalogo())
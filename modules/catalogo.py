@@ -0,0 +1,88 @@
+import threading
+import streamlit as st
+import pandas as pd
+from database.db_connection import get_connection
+
+# CATÁLOGO COMPARTIDO (líneas, presentaciones, tipos, parámetros, especificaciones)
+#
+# Las tablas de catálogo son pequeñas y cambian poco, así que se cargan una
+# sola vez por proceso (una conexión) y se reutilizan en todas las páginas.
+# Las funciones de escritura (insertar_*, actualizar_*, eliminar_*, editar_*)
+# llaman a invalidar_catalogo(), que incrementa la versión y obliga a recargar.
+
+_lock_version = threading.Lock()
+_version_catalogo = 0
+
+CONSULTAS_CATALOGO = {
+    "lineas": """
+        SELECT idLinea, nombreLinea
+        FROM lineaproduccion
+        ORDER BY nombreLinea
+    """,
+    "presentaciones": """
+        SELECT idPresentacion, nombrePresentacion, codigoPresentacion, idLinea
+        FROM presentacionproducto
+        ORDER BY nombrePresentacion
+    """,
+    "tipos": """
+        SELECT idTipoControl, nombreTipo, descripcion, idLinea
+        FROM tipocontrol
+        ORDER BY nombreTipo
+    """,
+    "parametros": """
+        SELECT idParametro, nombreParametro, descripcion, unidadMedida,
+                limiteInferior, limiteSuperior, tipoParametro, idTipoControl
+        FROM parametrocalidad
+        ORDER BY nombreParametro
+    """,
+    "especificaciones": """
+        SELECT idPresentacionParametro, idPresentacion, idParametro,
+                limiteInferior, limiteSuperior, tipoParametro, unidadMedida
+        FROM presentacionparametro
+        ORDER BY idPresentacionParametro
+    """,
+}
+
+
+def version_catalogo():
+    return _version_catalogo
+
+
+def invalidar_catalogo():
+    """Marca el catálogo como desactualizado; la próxima lectura lo recarga."""
+    global _version_catalogo
+    with _lock_version:
+        _version_catalogo += 1
+
+
+@st.cache_resource(max_entries=1)
+def _cargar_catalogo(version):
+    conn = get_connection()
+    catalogo = {"version": version}
+    try:
+        cursor = conn.cursor()
+        for nombre, query in CONSULTAS_CATALOGO.items():
+            cursor.execute(query)
+            columnas = [c[0] for c in cursor.description]
+            catalogo[nombre] = pd.DataFrame(cursor.fetchall(), columns=columnas)
+        cursor.close()
+    finally:
+        conn.close()
+    return catalogo
+
+
+def obtener_catalogo():
+    """
+    Devuelve el snapshot vigente del catálogo (dict de DataFrames).
+    Es compartido por todas las sesiones: tratarlo como sólo lectura.
+    """
+    return _cargar_catalogo(_version_catalogo)
+
+
+def como_tuplas(df, columnas):
+    """Filas como tuplas de tipos nativos de Python (NULL -> None), como cursor.fetchall()."""
+    if df.empty:
+        return []
+    sub = df[columnas].astype(object)
+    sub = sub.where(sub.notna(), None)
+    return list(sub.itertuples(index=False, name=None))
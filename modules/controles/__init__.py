@@ -1,6 +1,7 @@
 from .registrar import registrar_control
 from .buscar import ver_registros_guardados
 from .alertas import ver_alertas
+from .importar import importar_mediciones_ui
 import streamlit as st
 
 def app_controles():
@@ -8,6 +9,7 @@ def app_controles():
         "Control de Calidad",
         [
             "Registrar Control",
+            "Importar Mediciones",
             "Ver Registros Guardados",
             "Ver Alertas Automáticas"
         ]
@@ -15,6 +17,8 @@ def app_controles():
 
     if menu == "Registrar Control":
         registrar_control()
+    elif menu == "Importar Mediciones":
+        importar_mediciones_ui()
     elif menu == "Ver Registros Guardados":
         ver_registros_guardados()
     else:
@@ -1,13 +1,35 @@
 import streamlit as st
-from .utils import get_conn
+from .utils import get_conn, fetch_df
+from modules.resumen_calidad import refrescar_resumen_calidad, detalles_de_alertas
+from modules.cascada import construir_indice, opciones
+from modules.filtros import filtro, condicion, aplicar
+from modules.episodios import (obtener_episodios, resolver_episodio, ESTADO_EPISODIO_ABIERTO,
+                                ESTADO_EPISODIO_CERRADO, ESTADO_EPISODIO_RESUELTO, ESTADO_EPISODIO_DESCARTADO)
 import pandas as pd
 
-def ver_alertas():
-    st.title("Historial de Alertas")
-    st.markdown("---")
+NIVELES_ALERTAS = ["codigoOrden", "nombreLinea", "nombrePresentacion", "tipoControl", "nombreParametro", "estado"]
+
 
+def marca_alertas():
+    """
+    (cantidad, último id) de alerta: cambia sólo cuando se insertan alertas. Quien
+    cambie el estado de alertas existentes debe llamar a cargar_alertas.clear().
+    """
     conn = get_conn()
-    df = pd.read_sql("""
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT COUNT(*), MAX(idAlerta) FROM alerta")
+        marca = tuple(cur.fetchone())
+        cur.close()
+    finally:
+        conn.close()
+    return marca
+
+
+@st.cache_resource(ttl=300, max_entries=2)
+def cargar_alertas(marca):
+    """DataFrame e índice en cascada (compartidos entre sesiones; sólo lectura)."""
+    df = fetch_df("""
         SELECT 
             a.idAlerta, a.tipoAlerta, a.descripcion, a.fechaAlerta, a.estado,
             a.idControl, a.idOrdenTrabajo, a.idLinea, a.idParametro, 
@@ -22,12 +44,71 @@ def ver_alertas():
         LEFT JOIN controlcalidad c ON c.idControl = a.idControl
         LEFT JOIN tipocontrol tc ON tc.idTipoControl = c.idTipoControl
         ORDER BY a.fechaAlerta DESC
-    """, conn)
+    """)
+    return df, construir_indice(df, NIVELES_ALERTAS)
+
+
+def ver_episodios():
+    """Alertas agrupadas por (línea, presentación, parámetro, lote) y ventana de tiempo."""
+    col1, col2 = st.columns(2)
+    with col1:
+        estado_sel = st.selectbox("Estado del episodio", ["Todos", ESTADO_EPISODIO_ABIERTO, ESTADO_EPISODIO_CERRADO,
+                                                            ESTADO_EPISODIO_RESUELTO, ESTADO_EPISODIO_DESCARTADO])
+    with col2:
+        limite = st.number_input("Máx. episodios", min_value=50, max_value=5000, value=500, step=50)
+    episodios = obtener_episodios(filtro(condicion("estado", "=", None if estado_sel == "Todos" else estado_sel)),
+                                    int(limite))
+    if episodios.empty:
+        st.info("No hay episodios de alerta.")
+        return
+
+    st.dataframe(episodios.drop(columns=["idLinea", "idPresentacion", "idParametro", "idDetalle"]),
+                    use_container_width=True)
+
+    st.markdown("### Actualizar todas las alertas de un episodio")
+    id_episodio = st.selectbox("Episodio", episodios["idEpisodio"].tolist(),
+                                format_func=lambda i: f"{i} — " + " | ".join(
+                                    str(v) for v in episodios.loc[episodios["idEpisodio"] == i,
+                                    ["nombreLinea", "nombreParametro", "lote", "alertas"]].iloc[0]))
+    nuevo_estado = st.selectbox("Acción", ["confirmada", "en_proceso", "rechazada"], key="accion_episodio")
+    if st.button("Actualizar episodio"):
+        conn = get_conn()
+        try:
+            cur = conn.cursor()
+            n = resolver_episodio(cur, id_episodio, nuevo_estado)
+            id_detalle = episodios.loc[episodios["idEpisodio"] == id_episodio, "idDetalle"].iloc[0]
+            if pd.notna(id_detalle):
+                refrescar_resumen_calidad(cur, [int(id_detalle)])
+            conn.commit()
+            obtener_episodios.clear()
+            cargar_alertas.clear()
+            st.success(f"Episodio actualizado ({n} alertas).")
+            st.rerun()
+        except Exception as e:
+            conn.rollback()
+            st.error(f"Error actualizando episodio: {e}")
+        finally:
+            conn.close()
+
+
+def ver_alertas():
+    st.title("Historial de Alertas")
+    st.markdown("---")
+
+    vista = st.radio("Vista", ["Episodios", "Alertas individuales"], horizontal=True)
+    if vista == "Episodios":
+        ver_episodios()
+        return
+
+    marca = marca_alertas()
+    df, indice = cargar_alertas(marca)
 
     if df.empty:
         st.info("No hay alertas registradas.")
         return
 
+    seleccion = {}
+
     st.subheader("Filtros")
 
     # 1) ORDEN
@@ -36,55 +117,39 @@ def ver_alertas():
     with col1:
         orden_sel = st.selectbox(
             "Orden",
-            ["Todas"] + sorted(df["codigoOrden"].dropna().unique().tolist())
+            ["Todas"] + opciones(indice, "codigoOrden")
         )
-
-    df_fil = df.copy()
-    if orden_sel != "Todas":
-        df_fil = df_fil[df_fil["codigoOrden"] == orden_sel]
+    seleccion["codigoOrden"] = None if orden_sel == "Todas" else orden_sel
 
     # 2) LÍNEA
     with col2:
-        lineas_disp = sorted(df_fil["nombreLinea"].dropna().unique().tolist())
-        linea_sel = st.selectbox("Línea", ["Todas"] + lineas_disp)
-
-    if linea_sel != "Todas":
-        df_fil = df_fil[df_fil["nombreLinea"] == linea_sel]
+        linea_sel = st.selectbox("Línea", ["Todas"] + opciones(indice, "nombreLinea", seleccion))
+    seleccion["nombreLinea"] = None if linea_sel == "Todas" else linea_sel
 
     # 3) PRESENTACIÓN
     with col3:
-        present_disp = sorted(df_fil["nombrePresentacion"].dropna().unique().tolist())
-        present_sel = st.selectbox("Presentación", ["Todas"] + present_disp)
-
-    if present_sel != "Todas":
-        df_fil = df_fil[df_fil["nombrePresentacion"] == present_sel]
+        present_sel = st.selectbox("Presentación", ["Todas"] + opciones(indice, "nombrePresentacion", seleccion))
+    seleccion["nombrePresentacion"] = None if present_sel == "Todas" else present_sel
 
     # 4) TIPO DE CONTROL
     col4 = st.columns(1)[0]
     with col4:
-        tipo_disp = sorted(df_fil["tipoControl"].dropna().unique().tolist())
-        tipo_sel = st.selectbox("Tipo de Control", ["Todos"] + tipo_disp)
-
-    if tipo_sel != "Todos":
-        df_fil = df_fil[df_fil["tipoControl"] == tipo_sel]
+        tipo_sel = st.selectbox("Tipo de Control", ["Todos"] + opciones(indice, "tipoControl", seleccion))
+    seleccion["tipoControl"] = None if tipo_sel == "Todos" else tipo_sel
 
     # 5) PARÁMETRO (DEPENDIENTE)
     col5 = st.columns(1)[0]
     with col5:
-        param_disp = sorted(df_fil["nombreParametro"].dropna().unique().tolist())
-        param_sel = st.selectbox("Parámetro", ["Todos"] + param_disp)
-
-    if param_sel != "Todos":
-        df_fil = df_fil[df_fil["nombreParametro"] == param_sel]
+        param_sel = st.selectbox("Parámetro", ["Todos"] + opciones(indice, "nombreParametro", seleccion))
+    seleccion["nombreParametro"] = None if param_sel == "Todos" else param_sel
 
     # 6) ESTADO (se mantiene como filtro adicional)
     col6 = st.columns(1)[0]
     with col6:
-        estado_disp = sorted(df["estado"].dropna().unique().tolist())
-        estado_sel = st.selectbox("Estado", ["Todos"] + estado_disp)
+        estado_sel = st.selectbox("Estado", ["Todos"] + opciones(indice, "estado"))
+    seleccion["estado"] = None if estado_sel == "Todos" else estado_sel
 
-    if estado_sel != "Todos":
-        df_fil = df_fil[df_fil["estado"] == estado_sel]
+    df_fil = aplicar(filtro(*[condicion(col, "=", val) for col, val in seleccion.items()]), df)
 
     #  RESULTADOS
     st.subheader("Resultados")
@@ -98,13 +163,16 @@ def ver_alertas():
     comentario = st.text_area("Comentario (opcional)")
 
     if st.button("Actualizar estado"):
+        conn = get_conn()
         try:
             cur = conn.cursor()
             cur.execute(
                 "UPDATE alerta SET estado = %s WHERE idAlerta = %s",
                 (nuevo_estado, int(id_alerta))
             )
+            refrescar_resumen_calidad(cur, detalles_de_alertas(cur, [id_alerta]))
             conn.commit()
+            cargar_alertas.clear()
             st.success("Alerta actualizada.")
             st.rerun()
         except Exception as e:
@@ -1,13 +1,29 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-from .utils import get_conn
+from .utils import get_conn, fetch_df
+from modules.cascada import construir_indice, opciones
+from modules.filtros import filtro, condicion, aplicar
+
+NIVELES_REGISTROS = ["codigoOrden", "nombreLinea", "nombrePresentacion", "tipoControl", "nombreParametro"]
 
-def ver_registros_guardados():
-    st.title("Registros Guardados de Control de Calidad")
-    st.markdown("---")
 
+def marca_registros():
+    """(cantidad, último id) de controlcalidad: cambia sólo cuando se registran controles."""
     conn = get_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT COUNT(*), MAX(idControl) FROM controlcalidad")
+        marca = tuple(cur.fetchone())
+        cur.close()
+    finally:
+        conn.close()
+    return marca
+
+
+@st.cache_resource(ttl=300, max_entries=2)
+def cargar_registros(marca):
+    """DataFrame e índice en cascada (compartidos entre sesiones; sólo lectura)."""
     query = """
         SELECT
             c.idControl,
@@ -29,12 +45,23 @@ def ver_registros_guardados():
         LEFT JOIN parametrocalidad pa ON pa.idParametro = c.idParametro
         ORDER BY c.fechaControl DESC
     """
-    df = pd.read_sql(query, conn)
+    df = fetch_df(query)
+    return df, construir_indice(df, NIVELES_REGISTROS)
+
+
+def ver_registros_guardados():
+    st.title("Registros Guardados de Control de Calidad")
+    st.markdown("---")
+
+    marca = marca_registros()
+    df, indice = cargar_registros(marca)
 
     if df.empty:
         st.info("No hay registros.")
         return
 
+    seleccion = {}
+
     st.subheader("Filtros")
 
     #  1) ORDEN
@@ -42,46 +69,31 @@ def ver_registros_guardados():
     with col1:
         orden = st.selectbox(
             "Orden",
-            ["Todas"] + sorted(df["codigoOrden"].dropna().unique().tolist())
+            ["Todas"] + opciones(indice, "codigoOrden")
         )
-
-    df_fil = df.copy()
-    if orden != "Todas":
-        df_fil = df_fil[df_fil["codigoOrden"] == orden]
+    seleccion["codigoOrden"] = None if orden == "Todas" else orden
 
     #  2) LÍNEA
     with col2:
-        lineas_disp = sorted(df_fil["nombreLinea"].dropna().unique().tolist())
-        linea = st.selectbox("Línea", ["Todas"] + lineas_disp)
-
-    if linea != "Todas":
-        df_fil = df_fil[df_fil["nombreLinea"] == linea]
+        linea = st.selectbox("Línea", ["Todas"] + opciones(indice, "nombreLinea", seleccion))
+    seleccion["nombreLinea"] = None if linea == "Todas" else linea
 
     #  3) PRESENTACIÓN
     with col3:
-        presentaciones_disp = sorted(df_fil["nombrePresentacion"].dropna().unique().tolist())
-        presentacion = st.selectbox("Presentación", ["Todas"] + presentaciones_disp)
-
-    if presentacion != "Todas":
-        df_fil = df_fil[df_fil["nombrePresentacion"] == presentacion]
+        presentacion = st.selectbox("Presentación", ["Todas"] + opciones(indice, "nombrePresentacion", seleccion))
+    seleccion["nombrePresentacion"] = None if presentacion == "Todas" else presentacion
 
     #  4) TIPO DE CONTROL
     col4 = st.columns(1)[0]
     with col4:
-        tipos_disp = sorted(df_fil["tipoControl"].dropna().unique().tolist())
-        tipo = st.selectbox("Tipo de control", ["Todos"] + tipos_disp)
-
-    if tipo != "Todos":
-        df_fil = df_fil[df_fil["tipoControl"] == tipo]
+        tipo = st.selectbox("Tipo de control", ["Todos"] + opciones(indice, "tipoControl", seleccion))
+    seleccion["tipoControl"] = None if tipo == "Todos" else tipo
 
     #  5) PARÁMETRO (DEPENDIENTE)
     col5 = st.columns(1)[0]
     with col5:
-        parametros_disp = sorted(df_fil["nombreParametro"].dropna().unique().tolist())
-        parametro = st.selectbox("Parámetro", ["Todos"] + parametros_disp)
-
-    if parametro != "Todos":
-        df_fil = df_fil[df_fil["nombreParametro"] == parametro]
+        parametro = st.selectbox("Parámetro", ["Todos"] + opciones(indice, "nombreParametro", seleccion))
+    seleccion["nombreParametro"] = None if parametro == "Todos" else parametro
 
     #  6) FECHA
     col6, col7 = st.columns(2)
@@ -91,8 +103,12 @@ def ver_registros_guardados():
     with col7:
         fecha = st.date_input("Fecha", datetime.now().date()) if usar_fecha else None
 
-    if usar_fecha and fecha:
-        df_fil = df_fil[pd.to_datetime(df_fil["fechaControl"]).dt.date == fecha]
+    # Todos los filtros en una sola máscara (una sola copia del DataFrame)
+    spec = filtro(
+        *[condicion(col, "=", val) for col, val in seleccion.items()],
+        condicion("fechaControl", "fecha", fecha if usar_fecha else None),
+    )
+    df_fil = aplicar(spec, df)
 
     #   RESULTADOS
     st.subheader("Resultados")
@@ -0,0 +1,222 @@
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+import pandas as pd
+import streamlit as st
+from mysql.connector import errors as errores_mysql
+from .utils import get_conn, insert_control_record
+from modules.evaluacion import evaluar, payloads_alerta, guardar_alertas
+from modules.resumen_calidad import refrescar_resumen_calidad
+
+# COLA LOCAL DE ESCRITURA (write-ahead) PARA LAS HOJAS DE CONTROL
+#
+# registrar_control() ya no escribe en MySQL: guarda la hoja validada en un
+# SQLite local en modo WAL (un INSERT y un fsync, milisegundos) y confirma al
+# operario. Un hilo por proceso vacía la cola hacia MySQL en lotes de hasta
+# TAM_LOTE_COLA hojas por transacción; si MySQL no responde, las hojas quedan
+# en disco y se reintentan con espera creciente. Una hoja que falla sola
+# MAX_INTENTOS veces queda marcada con error (no bloquea a las demás).
+#
+# Cada hoja lleva su claveEnvio: la cola local no acepta dos veces la misma
+# clave y en MySQL la tabla envioformulario (clave primaria) convierte en no-op
+# un segundo guardado, aunque llegue desde otra sesión o tras una caída entre
+# el commit en MySQL y el borrado local.
+
+RUTA_COLA = Path(__file__).resolve().parents[2] / "data" / "cola_controles.sqlite3"
+TAM_LOTE_COLA = 50
+INTERVALO_COLA = 1.0
+ESPERA_MAXIMA_COLA = 30.0
+MAX_INTENTOS = 5
+# errores de conexión/servidor: no son culpa de la hoja, no cuentan como intento
+ERRORES_CONEXION = (errores_mysql.InterfaceError, errores_mysql.OperationalError)
+
+_despertar = threading.Event()
+
+
+def _conectar():
+    RUTA_COLA.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(RUTA_COLA, timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=FULL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS hoja_pendiente (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            creado TEXT NOT NULL,
+            hoja TEXT NOT NULL,
+            intentos INTEGER NOT NULL DEFAULT 0,
+            ultimo_error TEXT,
+            con_error INTEGER NOT NULL DEFAULT 0,
+            clave TEXT UNIQUE
+        )
+    """)
+    return conn
+
+
+def encolar_hoja(hoja):
+    """
+    Guarda la hoja (dict serializable) en la cola local y despierta al vaciador.
+    Devuelve su id, o None si ya había una hoja pendiente con la misma claveEnvio.
+    """
+    conn = _conectar()
+    try:
+        with conn:
+            cur = conn.execute("INSERT OR IGNORE INTO hoja_pendiente (creado, hoja, clave) VALUES (?, ?, ?)",
+                                (datetime.now().isoformat(timespec="seconds"), json.dumps(hoja, default=str),
+                                    hoja.get("claveEnvio")))
+        id_hoja = cur.lastrowid if cur.rowcount else None
+    finally:
+        conn.close()
+    _despertar.set()
+    return id_hoja
+
+
+def registrar_envio(cursor, clave, id_usuario, id_detalle, controles):
+    """
+    Reserva la clave del envío (una búsqueda por clave primaria). Devuelve False si
+    ya estaba registrada; una sesión concurrente con la misma clave espera el commit
+    de la primera y luego obtiene False.
+    """
+    cursor.execute("""
+        INSERT INTO envioformulario (claveEnvio, idUsuario, idDetalle, controles, recibido)
+        VALUES (%s, %s, %s, %s, NOW())
+        ON DUPLICATE KEY UPDATE claveEnvio = claveEnvio
+    """, (clave, id_usuario, id_detalle, controles))
+    return cursor.rowcount == 1
+
+
+def guardar_hoja(cursor, hoja):
+    """Controles, alertas y resumen de una hoja (sin commit). Devuelve False si era un reenvío."""
+    if hoja.get("claveEnvio") and not registrar_envio(
+            cursor, hoja["claveEnvio"], hoja["idUsuario"], hoja["idDetalle"], len(hoja["mediciones"])):
+        return False
+    fecha = datetime.fromisoformat(hoja["fechaControl"])
+    mediciones = []
+    for m in hoja["mediciones"]:
+        insert_control_record(
+            cursor, fecha, m["resultado"], hoja["observaciones"], hoja["idUsuario"], m["idParametro"],
+            hoja["idTipoControl"], hoja["idLinea"], hoja["idDetalle"], hoja["idOrdenTrabajo"], hoja["idPresentacion"]
+        )
+        mediciones.append(dict(m, idControl=cursor.lastrowid))
+
+    df_med = pd.DataFrame(mediciones).assign(
+        idOrdenTrabajo=hoja["idOrdenTrabajo"], idLinea=hoja["idLinea"], idPresentacion=hoja["idPresentacion"],
+        codigoOrden=hoja.get("codigoOrden"))
+    guardar_alertas(cursor, payloads_alerta(evaluar(df_med)))
+    refrescar_resumen_calidad(cursor, [hoja["idDetalle"]])
+    return True
+
+
+def _escribir(hojas):
+    """Escribe [(id, hoja)] en una transacción MySQL. Lanza la excepción si falla."""
+    conn = get_conn()
+    try:
+        cursor = conn.cursor()
+        try:
+            for _, hoja in hojas:
+                guardar_hoja(cursor, hoja)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+    finally:
+        conn.close()
+
+
+def vaciar_cola(tam_lote=TAM_LOTE_COLA):
+    """
+    Envía a MySQL las hojas pendientes. Devuelve (enviadas, falló_conexión).
+    Si un lote falla, se reintenta hoja por hoja para aislar la que tiene problemas.
+    """
+    enviadas = 0
+    local = _conectar()
+    try:
+        while True:
+            filas = local.execute(
+                "SELECT id, hoja FROM hoja_pendiente WHERE con_error = 0 ORDER BY id LIMIT ?", (tam_lote,)
+            ).fetchall()
+            if not filas:
+                return enviadas, False
+            hojas = [(i, json.loads(h)) for i, h in filas]
+            try:
+                _escribir(hojas)
+                ok = [i for i, _ in hojas]
+            except ERRORES_CONEXION:
+                return enviadas, True
+            except Exception:
+                ok = []
+                for i, hoja in hojas:
+                    try:
+                        _escribir([(i, hoja)])
+                        ok.append(i)
+                    except ERRORES_CONEXION:
+                        break
+                    except Exception as e:
+                        with local:
+                            local.execute("""
+                                UPDATE hoja_pendiente
+                                SET intentos = intentos + 1, ultimo_error = ?, con_error = (intentos + 1 >= ?)
+                                WHERE id = ?
+                            """, (str(e)[:500], MAX_INTENTOS, i))
+                if not ok:
+                    return enviadas, True
+            with local:
+                local.executemany("DELETE FROM hoja_pendiente WHERE id = ?", [(i,) for i in ok])
+            enviadas += len(ok)
+    finally:
+        local.close()
+
+
+def estado_cola():
+    """{'pendientes', 'con_error', 'mas_antigua', 'ultimo_error'} de la cola local."""
+    conn = _conectar()
+    try:
+        pendientes, mas_antigua = conn.execute(
+            "SELECT COUNT(*), MIN(creado) FROM hoja_pendiente WHERE con_error = 0").fetchone()
+        con_error, ultimo_error = conn.execute(
+            "SELECT COUNT(*), MAX(ultimo_error) FROM hoja_pendiente WHERE con_error = 1").fetchone()
+    finally:
+        conn.close()
+    return {"pendientes": pendientes, "con_error": con_error, "mas_antigua": mas_antigua, "ultimo_error": ultimo_error}
+
+
+def reintentar_con_error():
+    """Vuelve a poner en cola las hojas marcadas con error."""
+    conn = _conectar()
+    try:
+        with conn:
+            conn.execute("UPDATE hoja_pendiente SET con_error = 0, intentos = 0 WHERE con_error = 1")
+    finally:
+        conn.close()
+    _despertar.set()
+
+
+def _bucle_vaciado():
+    espera = INTERVALO_COLA
+    while True:
+        _despertar.wait(espera)
+        _despertar.clear()
+        try:
+            _, fallo = vaciar_cola()
+        except Exception:
+            fallo = True
+        espera = min(espera * 2, ESPERA_MAXIMA_COLA) if fallo else INTERVALO_COLA
+
+
+@st.cache_resource
+def iniciar_vaciado():
+    """Arranca (una vez por proceso) el hilo que vacía la cola hacia MySQL."""
+    hilo = threading.Thread(target=_bucle_vaciado, name="cola-controles", daemon=True)
+    hilo.start()
+    return hilo
+
+
+if __name__ == "__main__":
+    while True:
+        enviadas, fallo = vaciar_cola()
+        print(f"{datetime.now():%H:%M:%S} enviadas={enviadas} {estado_cola()}")
+        time.sleep(ESPERA_MAXIMA_COLA if fallo else INTERVALO_COLA * 5)
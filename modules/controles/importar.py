@@ -0,0 +1,356 @@
+import time
+import streamlit as st
+import pandas as pd
+from datetime import datetime
+from .utils import get_conn, insert_control_records, get_user_id_from_session
+from modules.catalogo import obtener_catalogo
+from modules.especificaciones import especificacion_efectiva
+from modules.fechas import parsear_fechas
+from modules.evaluacion import evaluar, payloads_alerta, guardar_alertas
+from modules.resumen_calidad import refrescar_resumen_calidad
+
+# IMPORTACIÓN MASIVA DE MEDICIONES (archivos de equipos de laboratorio)
+#
+# Formatos aceptados (CSV o XLSX, leídos por bloques):
+#   - ancho: lote, fechaControl, [observaciones], una columna por parámetro
+#   - largo: lote, fechaControl, parametro, resultado, [observaciones]
+# Cada bloque se valida de forma vectorizada contra la especificación efectiva de
+# la presentación del lote y se guarda en una transacción: controles con un
+# executemany, alertas con otro, y el resumen de calidad de los detalles tocados.
+
+TAM_BLOQUE_IMPORTACION = 20000
+COLUMNAS_LOTE = ["lote"]
+COLUMNAS_FECHA = ["fechacontrol", "fecha", "fecha_hora", "fechahora"]
+COLUMNAS_OBS = ["observaciones", "observacion"]
+COLUMNAS_CONTEXTO = ["idDetalle", "idPresentacion", "idOrdenTrabajo", "idLinea", "codigoOrden"]
+
+
+def leer_en_bloques(archivo, tam_bloque=TAM_BLOQUE_IMPORTACION):
+    """Genera DataFrames (texto) de hasta `tam_bloque` filas sin cargar el archivo completo."""
+    nombre = getattr(archivo, "name", str(archivo)).lower()
+    if nombre.endswith((".xlsx", ".xlsm")):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ValueError("Para importar Excel instala 'openpyxl' (pip install openpyxl) o use CSV.")
+        hoja = load_workbook(archivo, read_only=True, data_only=True).active
+        filas = hoja.iter_rows(values_only=True)
+        encabezado = [str(c).strip() if c is not None else "" for c in next(filas, [])]
+        bloque = []
+        for fila in filas:
+            bloque.append(fila)
+            if len(bloque) >= tam_bloque:
+                yield pd.DataFrame(bloque, columns=encabezado).astype(object)
+                bloque = []
+        if bloque:
+            yield pd.DataFrame(bloque, columns=encabezado).astype(object)
+    else:
+        # separador según el encabezado, para usar el lector C de pandas (mucho más rápido)
+        encabezado = archivo.readline()
+        archivo.seek(0)
+        if isinstance(encabezado, bytes):
+            encabezado = encabezado.decode("utf-8", errors="ignore")
+        sep = ";" if encabezado.count(";") > encabezado.count(",") else ","
+        for bloque in pd.read_csv(archivo, dtype=str, sep=sep, chunksize=tam_bloque):
+            bloque.columns = [str(c).strip() for c in bloque.columns]
+            yield bloque
+
+
+def _buscar_columna(columnas, candidatas):
+    for c in columnas:
+        if c.strip().lower() in candidatas:
+            return c
+    return None
+
+
+def detectar_formato(columnas):
+    """(formato, col_lote, col_fecha, col_obs, columnas de parámetros)."""
+    col_lote = _buscar_columna(columnas, COLUMNAS_LOTE)
+    col_fecha = _buscar_columna(columnas, COLUMNAS_FECHA)
+    col_obs = _buscar_columna(columnas, COLUMNAS_OBS)
+    if col_lote is None or col_fecha is None:
+        raise ValueError("El archivo debe tener columnas 'lote' y 'fechaControl'.")
+    col_param = _buscar_columna(columnas, ["parametro", "idparametro"])
+    col_res = _buscar_columna(columnas, ["resultado", "valor"])
+    if col_param and col_res:
+        return "largo", col_lote, col_fecha, col_obs, [col_param, col_res]
+    otras = [c for c in columnas if c not in (col_lote, col_fecha, col_obs) and c]
+    return "ancho", col_lote, col_fecha, col_obs, otras
+
+
+def sugerir_mapeo(columnas, catalogo):
+    """{columna: idParametro} por coincidencia exacta de nombre (sin mayúsculas)."""
+    nombres = {str(n).strip().lower(): int(i) for i, n in
+                zip(catalogo["parametros"]["idParametro"], catalogo["parametros"]["nombreParametro"])}
+    return {c: nombres[c.strip().lower()] for c in columnas if c.strip().lower() in nombres}
+
+
+def a_formato_largo(bloque, formato, col_lote, col_fecha, col_obs, columnas, mapeo, nombres_param):
+    """Bloque → filas (fila, lote, fechaControl, observaciones, idParametro, resultado)."""
+    bloque = bloque.reset_index(drop=True)
+    base = pd.DataFrame({
+        "fila": bloque.index,
+        "lote": bloque[col_lote].astype(str).str.strip(),
+        "fechaControl": bloque[col_fecha],
+        "observaciones": bloque[col_obs].fillna("").astype(str).str.strip() if col_obs else "",
+    })
+    if formato == "largo":
+        col_param, col_res = columnas
+        param = bloque[col_param].astype(str).str.strip()
+        id_param = pd.to_numeric(param, errors="coerce")
+        id_param = id_param.fillna(param.str.lower().map(nombres_param))
+        return base.assign(idParametro=id_param, resultado=bloque[col_res])
+    mapeadas = [c for c in columnas if c in mapeo]
+    largo = bloque[mapeadas].assign(fila=bloque.index).melt(id_vars="fila", var_name="columna", value_name="resultado")
+    largo = largo[largo["resultado"].notna() & (largo["resultado"].astype(str).str.strip() != "")]
+    largo["idParametro"] = largo["columna"].map(mapeo)
+    return largo.drop(columns="columna").merge(base, on="fila", how="left")
+
+
+def resolver_lotes(cursor, lotes, cache):
+    """Completa `cache` {lote: detalle o None si no existe/ambiguo} con una consulta IN."""
+    faltan = [l for l in lotes if l not in cache]
+    if not faltan:
+        return
+    cursor.execute(f"""
+        SELECT d.lote, d.idDetalle, d.idPresentacion, d.idOrdenTrabajo, o.idLinea, o.codigoOrden
+        FROM DetalleOrdenTrabajo d
+        INNER JOIN OrdenTrabajo o ON o.idOrdenTrabajo = d.idOrdenTrabajo
+        WHERE d.lote IN ({", ".join(["%s"] * len(faltan))})
+    """, tuple(faltan))
+    encontrados = {}
+    for lote, id_det, id_pres, id_orden, id_linea, codigo in cursor.fetchall():
+        encontrados.setdefault(lote, []).append(
+            {"idDetalle": id_det, "idPresentacion": id_pres, "idOrdenTrabajo": id_orden,
+                "idLinea": id_linea, "codigoOrden": codigo})
+    for lote in faltan:
+        candidatos = encontrados.get(lote, [])
+        cache[lote] = candidatos[0] if len(candidatos) == 1 else ("ambiguo" if candidatos else None)
+
+
+def validar_bloque(largo, lotes, espec, tipos_param):
+    """Devuelve (válidas, rechazadas[fila, motivo]) con reglas vectorizadas."""
+    df = largo.copy()
+    df["fechaControl"] = parsear_fechas(df["fechaControl"])
+    info = df["lote"].map(lotes)
+    motivo = pd.Series("", index=df.index)
+
+    def regla(mascara, texto):
+        nonlocal motivo
+        mascara = mascara.fillna(False).astype(bool) & (motivo == "")
+        motivo = motivo.where(~mascara, texto)
+
+    regla(info.isna(), "Lote no encontrado.")
+    regla(info == "ambiguo", "Lote con más de un detalle: registre desde la pantalla de controles.")
+    regla(df["idParametro"].isna(), "Parámetro no reconocido.")
+    regla(df["fechaControl"].isna(), "Fecha inválida.")
+    regla(df["fechaControl"] > pd.Timestamp(datetime.now()), "Fecha en el futuro.")
+
+    validas = info.map(lambda v: isinstance(v, dict))
+    contexto = pd.DataFrame(info[validas].tolist(), index=info[validas].index, columns=COLUMNAS_CONTEXTO)
+    df = df.join(contexto)
+    df["idParametro"] = pd.to_numeric(df["idParametro"], errors="coerce").astype("Int64")
+    df["idPresentacion"] = pd.to_numeric(df["idPresentacion"], errors="coerce").astype("Int64")
+    df = df.merge(espec, on=["idPresentacion", "idParametro"], how="left")
+    df.index = motivo.index
+    regla((motivo == "") & df["tipoParametro"].isna(), "Parámetro no asignado a la presentación del lote.")
+
+    texto = df["resultado"].astype(str).str.strip().str.replace(",", ".", regex=False)
+    es_check = df["tipoParametro"] == "check"
+    texto = texto.where(~es_check, texto.str.lower().map({"si": "1", "sí": "1", "ok": "1", "no": "0"}).fillna(texto))
+    df["resultado"] = pd.to_numeric(texto, errors="coerce")
+    regla(df["resultado"].isna(), "Resultado no numérico.")
+    regla(es_check & ~df["resultado"].isin([0, 1]), "Resultado de check debe ser 0/1.")
+    regla(df.duplicated(["idDetalle", "idParametro", "fechaControl"], keep="first"),
+            "Medición duplicada (mismo lote, parámetro y fecha).")
+
+    df["idTipoControl"] = df["idParametro"].map(tipos_param)
+    rechazadas = pd.DataFrame({"fila": df.loc[motivo != "", "fila"], "motivo": motivo[motivo != ""]})
+    return df[motivo == ""], rechazadas
+
+
+def _ultimo_id_control(cursor):
+    cursor.execute("SELECT COALESCE(MAX(idControl), 0) FROM controlcalidad")
+    return int(cursor.fetchone()[0])
+
+
+def _ids_insertados(cursor, id_previo, id_usuario, validas):
+    """
+    Recupera idControl de las filas recién insertadas, emparejando por
+    (idDetalle, idParametro, fechaControl) entre los ids > id_previo del usuario.
+    """
+    cursor.execute("""
+        SELECT idControl, idDetalle, idParametro, fechaControl
+        FROM controlcalidad
+        WHERE idControl > %s AND idUsuario = %s
+    """, (id_previo, id_usuario))
+    ids = pd.DataFrame(cursor.fetchall(), columns=["idControl", "idDetalle", "idParametro", "fechaControl"])
+    ids["fechaControl"] = pd.to_datetime(ids["fechaControl"])
+    ids = ids.drop_duplicates(["idDetalle", "idParametro", "fechaControl"], keep="last")
+    claves = validas[["idDetalle", "idParametro", "fechaControl"]].astype({"idDetalle": "int64", "idParametro": "int64"})
+    ids = ids.astype({"idDetalle": "int64", "idParametro": "int64"})
+    return claves.merge(ids, on=["idDetalle", "idParametro", "fechaControl"], how="left")["idControl"].to_numpy()
+
+
+def contexto_validacion(catalogo):
+    """(espec, nombres_param, tipos_param) para validar_bloque() a partir del catálogo."""
+    espec = especificacion_efectiva(catalogo)[["idPresentacion", "idParametro", "nombreParametro",
+                                                "tipoParametro", "limiteInferior", "limiteSuperior"]]
+    espec = espec.astype({"idPresentacion": "Int64", "idParametro": "Int64"})
+    nombres_param = {str(n).strip().lower(): int(i) for i, n in
+                        zip(catalogo["parametros"]["idParametro"], catalogo["parametros"]["nombreParametro"])}
+    tipos_param = catalogo["parametros"].set_index("idParametro")["idTipoControl"]
+    return espec, nombres_param, tipos_param
+
+
+def guardar_mediciones(cursor, validas, id_usuario, sufijo=" (importación)"):
+    """
+    Inserta las mediciones validadas (executemany), sus alertas y refresca el
+    resumen de los detalles tocados. No hace commit. Devuelve (insertadas, alertas).
+    """
+    if validas.empty:
+        return 0, 0
+    filas = [
+        (f.fechaControl.to_pydatetime(), float(f.resultado), f.observaciones or None, id_usuario,
+            int(f.idParametro), None if pd.isna(f.idTipoControl) else int(f.idTipoControl),
+            int(f.idLinea), int(f.idDetalle), int(f.idOrdenTrabajo), int(f.idPresentacion))
+        for f in validas.itertuples(index=False)
+    ]
+    id_previo = _ultimo_id_control(cursor)
+    insert_control_records(cursor, filas)
+    validas = validas.assign(idControl=_ids_insertados(cursor, id_previo, id_usuario, validas))
+    alertas = guardar_alertas(cursor, payloads_alerta(evaluar(validas), sufijo=sufijo))
+    refrescar_resumen_calidad(cursor, validas["idDetalle"].unique().tolist())
+    return len(filas), alertas
+
+
+def importar_mediciones(archivo, mapeo=None, id_usuario=None, tam_bloque=TAM_BLOQUE_IMPORTACION, progreso=None):
+    """
+    Importa el archivo por bloques. `mapeo` {columna: idParametro} para el formato ancho.
+    Devuelve (estadísticas, DataFrame de filas rechazadas con número de fila del archivo).
+    """
+    catalogo = obtener_catalogo()
+    espec, nombres_param, tipos_param = contexto_validacion(catalogo)
+
+    stats = {"filas": 0, "mediciones": 0, "insertadas": 0, "rechazadas": 0, "alertas": 0, "segundos": 0.0}
+    rechazos = []
+    lotes = {}
+    inicio = time.perf_counter()
+    offset = 0
+    formato = None
+
+    conn = get_conn()
+    try:
+        cursor = conn.cursor()
+        for bloque in leer_en_bloques(archivo, tam_bloque):
+            if formato is None:
+                formato, col_lote, col_fecha, col_obs, columnas = detectar_formato(list(bloque.columns))
+                if formato == "ancho":
+                    mapeo = mapeo if mapeo is not None else sugerir_mapeo(columnas, catalogo)
+                    if not mapeo:
+                        raise ValueError("Ninguna columna del archivo corresponde a un parámetro.")
+
+            largo = a_formato_largo(bloque, formato, col_lote, col_fecha, col_obs, columnas, mapeo or {}, nombres_param)
+            resolver_lotes(cursor, largo["lote"].unique().tolist(), lotes)
+            validas, rechazadas = validar_bloque(largo, lotes, espec, tipos_param)
+            rechazadas = rechazadas.assign(fila=rechazadas["fila"] + offset + 2)  # fila del archivo (con encabezado)
+            rechazos.append(rechazadas)
+
+            if not validas.empty:
+                try:
+                    _, alertas = guardar_mediciones(cursor, validas, id_usuario)
+                    stats["alertas"] += alertas
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+
+            offset += len(bloque)
+            stats["filas"] += len(bloque)
+            stats["mediciones"] += len(largo)
+            stats["insertadas"] += len(validas)
+            stats["rechazadas"] += len(rechazadas)
+            if progreso:
+                progreso(stats)
+        cursor.close()
+    finally:
+        conn.close()
+    stats["segundos"] = time.perf_counter() - inicio
+    rechazos = pd.concat(rechazos, ignore_index=True) if rechazos else pd.DataFrame(columns=["fila", "motivo"])
+    return stats, rechazos
+
+
+def importar_mediciones_ui():
+    st.title("Importar Mediciones desde Archivo")
+    st.markdown("---")
+    st.caption("CSV o Excel. Formato ancho: lote, fechaControl, [observaciones] y una columna por parámetro. "
+                "Formato largo: lote, fechaControl, parametro, resultado.")
+
+    id_usuario = get_user_id_from_session()
+    if not id_usuario:
+        st.error("No hay usuario autenticado. Por favor inicie sesión.")
+        return
+
+    archivo = st.file_uploader("Archivo del equipo", type=["csv", "txt", "xlsx"])
+    if archivo is None:
+        return
+
+    try:
+        primer_bloque = next(leer_en_bloques(archivo, 50), None)
+        archivo.seek(0)
+        if primer_bloque is None:
+            st.info("El archivo está vacío.")
+            return
+        formato, _, _, _, columnas = detectar_formato(list(primer_bloque.columns))
+    except ValueError as ve:
+        st.error(f"Validación: {ve}")
+        return
+
+    st.dataframe(primer_bloque.head(10), use_container_width=True)
+
+    mapeo = None
+    if formato == "ancho":
+        catalogo = obtener_catalogo()
+        sugerido = sugerir_mapeo(columnas, catalogo)
+        nombres = dict(zip(catalogo["parametros"]["idParametro"], catalogo["parametros"]["nombreParametro"]))
+        opciones = ["— Ignorar —"] + [f"{n} (ID {i})" for i, n in nombres.items()]
+        st.markdown("#### Columnas → parámetros")
+        mapeo = {}
+        cols = st.columns(3)
+        for k, col in enumerate(columnas):
+            actual = sugerido.get(col)
+            indice = opciones.index(f"{nombres[actual]} (ID {actual})") if actual in nombres else 0
+            sel = cols[k % 3].selectbox(col, opciones, index=indice, key=f"map_{col}")
+            if sel != "— Ignorar —":
+                mapeo[col] = int(sel.rsplit("ID ", 1)[-1].rstrip(")"))
+
+    if not st.button("Importar mediciones"):
+        return
+
+    estado = st.empty()
+
+    def progreso(stats):
+        estado.info(f"Procesadas {stats['filas']} filas · {stats['insertadas']} mediciones guardadas · "
+                    f"{stats['rechazadas']} rechazadas · {stats['alertas']} alertas")
+
+    try:
+        stats, rechazos = importar_mediciones(archivo, mapeo, id_usuario, progreso=progreso)
+    except ValueError as ve:
+        st.error(f"Validación: {ve}")
+        return
+    except Exception as e:
+        st.error(f"Error importando (el bloque en curso no se guardó): {e}")
+        return
+
+    velocidad = stats["mediciones"] / stats["segundos"] if stats["segundos"] else 0
+    st.success(f"Importación terminada: {stats['insertadas']} mediciones guardadas, {stats['alertas']} alertas, "
+                f"{stats['rechazadas']} rechazadas ({velocidad:,.0f} mediciones/s).")
+    if not rechazos.empty:
+        st.markdown("#### Filas rechazadas")
+        st.dataframe(rechazos, use_container_width=True)
+        st.download_button("Descargar rechazos (CSV)", rechazos.to_csv(index=False).encode("utf-8"),
+                            file_name="mediciones_rechazadas.csv", mime="text/csv")
+
+
+if __name__ == "__main__":
+    importar_mediciones_ui()
@@ -1,32 +1,55 @@
+import hashlib
+import json
+import uuid
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-from .utils import get_conn, insert_control_record, save_alert, get_user_id_from_session
-from modules.ordenes import obtener_ordenes, obtener_detalles, obtener_orden_por_id
-from modules.estandares import obtener_parametros_por_presentacion, obtener_lineas_produccion
+from .utils import get_user_id_from_session
+from .cola_local import encolar_hoja, estado_cola, iniciar_vaciado, reintentar_con_error
+from modules.ordenes import buscar_ordenes, buscar_por_lote, obtener_detalles, obtener_orden_por_id
+from modules.estandares import obtener_parametros_por_presentacion, obtener_tipos_por_linea
 
-def registrar_control():
-    st.title("Registro de Controles de Calidad")
-    st.markdown("---")
+def _seleccionar_por_lote(lote, exacto):
+    """Resuelve el lote en una consulta; devuelve la fila elegida o None."""
+    coincidencias = buscar_por_lote(lote, exacto=exacto)
+    if not coincidencias:
+        st.warning("No se encontró ningún detalle con ese lote.")
+        return None
+    if len(coincidencias) == 1:
+        return coincidencias[0]
+    etiquetas = {
+        f"{c['lote']} | {c['codigoOrden']} | {c['nombrePresentacion']} | {c['nombreLinea']} | {c['fecha']}": c
+        for c in coincidencias
+    }
+    sel = st.selectbox("Varios detalles coinciden con el lote", ["— Seleccionar Detalle —"] + list(etiquetas.keys()))
+    if sel == "— Seleccionar Detalle —":
+        return None
+    return etiquetas[sel]
 
-    # 1) Seleccionar orden
-    df_ordenes = obtener_ordenes()
-    if df_ordenes.empty:
-        st.info("No hay órdenes registradas.")
-        return
-    df_ordenes["fecha"] = pd.to_datetime(df_ordenes["fecha"]).dt.date
-    opciones = ["— Seleccionar Orden —"] + [
-        f"{row.codigoOrden} | {row.Linea} | {row.fecha} | ID:{int(row.ID)}"
-        for _, row in df_ordenes.iterrows()
-    ]
-    sel = st.selectbox("Seleccione la Orden de Trabajo", opciones)
-    if sel == "— Seleccionar Orden —":
+
+def _seleccionar_por_orden():
+    """Ruta orden → detalle; devuelve (orden, fila de detalle) o detiene la página."""
+    # Buscar orden (código, línea o fecha); por defecto turno actual y anterior
+    col_txt, col_todas = st.columns([3, 1])
+    with col_txt:
+        texto = st.text_input("Buscar Orden de Trabajo (código, línea o fecha AAAA-MM-DD)")
+    with col_todas:
+        todas = st.checkbox("Buscar en todo el histórico", value=False)
+    if todas and not texto.strip():
+        st.info("Escriba parte del código, la línea o la fecha para buscar en el histórico.")
         st.stop()
-    try:
-        id_orden = int(sel.split("ID:")[-1])
-    except Exception:
-        st.error("No se pudo interpretar la orden seleccionada.")
+    coincidencias = buscar_ordenes(texto, solo_turnos_recientes=not todas)
+    if not coincidencias:
+        st.info("No hay órdenes que coincidan" + ("." if todas else " en el turno actual ni en el anterior."))
+        st.stop()
+    etiquetas = {
+        f"{o['codigoOrden']} | {o['Linea']} | {o['fecha']} | {o['turno']}": int(o["ID"])
+        for o in coincidencias
+    }
+    sel = st.selectbox("Seleccione la Orden de Trabajo", ["— Seleccionar Orden —"] + list(etiquetas.keys()))
+    if sel == "— Seleccionar Orden —":
         st.stop()
+    id_orden = etiquetas[sel]
 
     orden = obtener_orden_por_id(id_orden)
     if not orden:
@@ -35,7 +58,7 @@ def registrar_control():
 
     st.subheader(f"Orden: {orden.get('codigoOrden')} — Línea: {orden.get('nombreLinea')}")
 
-    # 2) Detalle (producto) dentro de la orden
+    # Detalle (producto) dentro de la orden
     detalles_df = obtener_detalles(id_orden)
     if detalles_df.empty:
         st.info("La orden no contiene detalles (productos).")
@@ -51,26 +74,81 @@ def registrar_control():
     except Exception:
         st.error("Detalle seleccionado inválido.")
         st.stop()
-    fila_det = detalles_df[detalles_df["idDetalle"] == id_detalle].iloc[0]
+    return orden, detalles_df[detalles_df["idDetalle"] == id_detalle].iloc[0]
+
+
+def _mostrar_estado_cola():
+    """Aviso de hojas aún no enviadas a la base de datos (cola local)."""
+    try:
+        estado = estado_cola()
+    except Exception:
+        return
+    if estado["pendientes"]:
+        st.caption(f"{estado['pendientes']} hoja(s) pendiente(s) de sincronizar desde {estado['mas_antigua']}.")
+    if estado["con_error"]:
+        st.warning(f"{estado['con_error']} hoja(s) no se pudieron guardar: {estado['ultimo_error']}")
+        if st.button("Reintentar hojas con error"):
+            reintentar_con_error()
+            st.rerun()
+
+
+def clave_envio(hoja):
+    """
+    Clave de idempotencia del envío: token de la sesión + contenido de la hoja.
+    Un doble clic o un reintento del navegador repiten la misma clave; otra
+    sesión, u otra hoja con cualquier dato distinto, obtiene una clave nueva.
+    """
+    token = st.session_state.setdefault("token_envio_control", uuid.uuid4().hex)
+    contenido = json.dumps(hoja, sort_keys=True, default=str)
+    return hashlib.sha256(f"{token}|{contenido}".encode("utf-8")).hexdigest()
+
+
+def registrar_control():
+    st.title("Registro de Controles de Calidad")
+    st.markdown("---")
+    iniciar_vaciado()
+    _mostrar_estado_cola()
+
+    # 1) Lote (escáner o teclado) o búsqueda por orden
+    col_lote, col_exacto = st.columns([3, 1])
+    with col_lote:
+        lote = st.text_input("Lote (escanee o escriba el lote del envase)", key="lote_registro")
+    with col_exacto:
+        exacto = not st.checkbox("Buscar por prefijo", value=False)
+
+    if lote.strip():
+        encontrado = _seleccionar_por_lote(lote, exacto)
+        if encontrado is None:
+            st.stop()
+        id_orden = int(encontrado["idOrdenTrabajo"])
+        id_detalle = int(encontrado["idDetalle"])
+        id_presentacion = int(encontrado["idPresentacion"])
+        nombre_presentacion = encontrado["nombrePresentacion"]
+        orden = {
+            "codigoOrden": encontrado["codigoOrden"],
+            "nombreLinea": encontrado["nombreLinea"],
+            "idLinea": encontrado["idLinea"],
+        }
+        st.subheader(f"Orden: {orden['codigoOrden']} — Línea: {orden['nombreLinea']} — Lote: {encontrado['lote']}")
+    else:
+        # 2) Orden → detalle
+        orden, fila_det = _seleccionar_por_orden()
+        id_orden = int(orden["idOrdenTrabajo"])
+        id_detalle = int(fila_det["idDetalle"])
+        id_presentacion = int(fila_det["idPresentacion"])
+        nombre_presentacion = fila_det["Producto"]
 
     # 3) Presentación y línea
-    id_presentacion = int(fila_det["idPresentacion"])
-    nombre_presentacion = fila_det["Producto"]
     id_linea = int(orden.get("idLinea"))
     st.write(f"Presentación seleccionada: **{nombre_presentacion}**")
     st.write(f"Línea: **{orden.get('nombreLinea')}**")
 
     # 4) Tipo de control (filtrado por línea)
-    conn = get_conn()
-    cur = conn.cursor(dictionary=True)
-    cur.execute("SELECT idTipoControl, nombreTipo FROM tipocontrol WHERE idLinea = %s ORDER BY nombreTipo", (id_linea,))
-    tipos_control = cur.fetchall()
-    cur.close()
-    conn.close()
+    tipos_control = obtener_tipos_por_linea(id_linea)
     if not tipos_control:
         st.warning("No hay tipos de control configurados para esta línea.")
         st.stop()
-    tipos_dict = {t["nombreTipo"]: t["idTipoControl"] for t in tipos_control}
+    tipos_dict = {t[1]: t[0] for t in tipos_control}
     tipo_sel = st.selectbox("Seleccione Tipo de Control", ["— Seleccionar Tipo —"] + list(tipos_dict.keys()))
     if tipo_sel == "— Seleccionar Tipo —":
         st.stop()
@@ -209,61 +287,38 @@ def registrar_control():
                 st.error(e)
             st.stop()
 
-        # Si llegamos aquí, todo validado -> insertar
-        conn = get_conn()
-        cur = conn.cursor()
+        # Si llegamos aquí, todo validado -> cola local (el vaciador la envía a MySQL)
+        hoja = {
+            "fechaControl": fecha_hora_control.isoformat(),
+            "observaciones": observaciones,
+            "idUsuario": int(id_usuario),
+            "idTipoControl": int(id_tipo),
+            "idLinea": id_linea,
+            "idDetalle": id_detalle,
+            "idOrdenTrabajo": id_orden,
+            "idPresentacion": id_presentacion,
+            "codigoOrden": orden.get("codigoOrden"),
+            "mediciones": [
+                {
+                    "idParametro": int(id_param),
+                    "nombreParametro": data["nombre"],
+                    "tipoParametro": data["tipo"],
+                    "resultado": data["valor"],
+                    "limiteInferior": data.get("lim_inf"),
+                    "limiteSuperior": data.get("lim_sup"),
+                }
+                for id_param, data in entradas_parsed.items()
+            ],
+        }
+        hoja["claveEnvio"] = clave_envio(hoja)
         try:
-            for id_param, data in entradas_parsed.items():
-                # Insertar control (usando data["valor"])
-                if data["tipo"] == "numerico":
-                    valor_a_guardar = data["valor"]
-                else:
-                    valor_a_guardar = data["valor"]
-
-                insert_control_record(
-                    cur,
-                    fecha_hora_control,
-                    valor_a_guardar,
-                    observaciones,
-                    id_usuario,
-                    id_param,
-                    id_tipo,
-                    id_linea,
-                    id_detalle,
-                    id_orden,
-                    id_presentacion
-                )
-                conn.commit()
-                id_control = cur.lastrowid
-
-                # Alertas (misma lógica que tenías)
-                if data["tipo"] == "numerico" and data.get("lim_inf") is not None and data.get("lim_sup") is not None:
-                    try:
-                        if valor_a_guardar < float(data["lim_inf"]) or valor_a_guardar > float(data["lim_sup"]):
-                            descripcion = (f"Parámetro '{data['nombre']}' fuera de rango: {valor_a_guardar} "
-                                            f"(permitido {data['lim_inf']} - {data['lim_sup']}) — Orden {orden.get('codigoOrden')}")
-                            save_alert(cur, "Fuera de Rango", descripcion, id_control, id_orden, id_linea, id_param, id_presentacion, valor_a_guardar, data["lim_inf"], data["lim_sup"])
-                            conn.commit()
-                    except Exception:
-                        # no interrumpir por errores en chequeo de alerta
-                        pass
-                elif data["tipo"] == "check":
-                    if valor_a_guardar == 0:
-                        descripcion = f"Check NO cumplido — parámetro '{data['nombre']}' en orden {orden.get('codigoOrden')}"
-                        save_alert(cur, "Check NO cumplido", descripcion, id_control, id_orden, id_linea, id_param, id_presentacion, 0, None, None)
-                        conn.commit()
-
-            st.success("Controles registrados correctamente.")
-            st.rerun()
+            id_hoja = encolar_hoja(hoja)
         except Exception as e:
             # Mostrar error claro y no enmascarar
             st.error(f"Error guardando controles: {e}")
-        finally:
-            try:
-                cur.close()
-            except Exception:
-                pass
-            try:
-                conn.close()
-            except Exception:
-                pass
\ No newline at end of file
+            st.stop()
+        if id_hoja is None:
+            st.info("Esta hoja ya fue enviada; no se registró de nuevo.")
+            st.stop()
+        st.success("Controles registrados correctamente.")
+        st.rerun()
@@ -23,6 +23,17 @@ def insert_control_record(cursor, fecha_hora, resultado, observaciones, id_usuar
     """, (fecha_hora, resultado, observaciones, id_usuario, id_param, id_tipo,
             id_linea, id_detalle, id_orden, id_presentacion))
 
+def insert_control_records(cursor, filas):
+    """Igual que insert_control_record para muchas filas, con un solo executemany (sin commit)."""
+    if filas:
+        cursor.executemany("""
+            INSERT INTO controlcalidad
+            (fechaControl, resultado, observaciones, idUsuario, idParametro, idTipoControl,
+                idLinea, idDetalle, idOrdenTrabajo, idPresentacion)
+            VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+        """, filas)
+    return len(filas)
+
 def save_alert(cursor, tipo, descripcion, id_control=None, id_orden=None, id_linea=None,
                 id_param=None, id_presentacion=None, valor=None, lim_inf=None, lim_sup=None, estado="pendiente"):
     try:
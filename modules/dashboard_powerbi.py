@@ -3,6 +3,11 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 from database.db_connection import get_connection
+from modules.catalogo import obtener_catalogo, version_catalogo
+from modules.datos_control import cargar_controles, adjuntar_nombres
+from modules.especificaciones import obtener_versiones, adjuntar_limites_vigentes
+from modules.cascada import indice_cascada, opciones
+from modules.filtros import filtro, condicion, aplicar
 import plotly.express as px
 import plotly.graph_objects as go
 from io import BytesIO
@@ -12,26 +17,8 @@ from io import BytesIO
 def cargar_tablas_dashboard():
     conn = get_connection()
     tablas = {}
-    try:
-        tablas['controles'] = pd.read_sql("""
-            SELECT cc.*, p.nombreParametro, p.unidadMedida, p.limiteInferior, p.limiteSuperior,
-                    pr.nombrePresentacion, pr.idLinea AS pres_idLinea,
-                    tc.nombreTipo AS nombreTipoControl, l.nombreLinea,
-                    d.lote
-            FROM controlcalidad cc
-            LEFT JOIN parametrocalidad p ON cc.idParametro = p.idParametro
-            LEFT JOIN presentacionproducto pr ON cc.idPresentacion = pr.idPresentacion
-            LEFT JOIN tipocontrol tc ON cc.idTipoControl = tc.idTipoControl
-            LEFT JOIN lineaproduccion l ON cc.idLinea = l.idLinea
-            LEFT JOIN detalleordentrabajo d ON cc.idDetalle = d.idDetalle
-        """, conn, parse_dates=['fechaControl'])
-    except Exception:
-        # Estructura mínima si falla
-        tablas['controles'] = pd.DataFrame(columns=[
-            'idControl','fechaControl','idOrdenTrabajo','resultado','observaciones','idUsuario',
-            'idParametro','idPresentacion','idTipoControl','idLinea','idDetalle','sabor',
-            'nombreParametro','unidadMedida','limiteInferior','limiteSuperior','nombrePresentacion','pres_idLinea','nombreTipoControl','nombreLinea','lote'
-        ])
+    # controles compactos: los nombres se adjuntan desde el catálogo al mostrar
+    tablas['controles'] = cargar_controles(conn)
 
     # presentacionproducto
     try:
@@ -73,6 +60,14 @@ def cargar_tablas_dashboard():
     return tablas
 
 
+@st.cache_resource(ttl=300, max_entries=1)
+def cargar_indice_dashboard(version):
+    """Índice en cascada sobre el catálogo + combinaciones observadas (ver modules.cascada)."""
+    tablas = cargar_tablas_dashboard()
+    return indice_cascada(obtener_catalogo(), tablas['controles'],
+                            rel_pres_tipo=tablas['presentaciontipocontrol'])
+
+
 # Utilidades
 def safe_str(v):
     return "" if pd.isna(v) else str(v)
@@ -93,97 +88,40 @@ def dashboard_powerbi_module():
 
     tablas = cargar_tablas_dashboard()
     df_ctrl = tablas['controles']
-    pres_prod = tablas['presentacionproducto']
-    rel_pres_tipo = tablas['presentaciontipocontrol']
-    params = tablas['parametrocalidad']
-    tipos = tablas['tipocontrol']
-    lineas = tablas['lineaproduccion']
     df_alertas = tablas.get('alerta', pd.DataFrame())
 
     # Sidebar: filtros en cascada
     with st.sidebar:
         st.header("Filtros (cascada)")
 
-        # Línea
-        if not lineas.empty:
-            opciones_linea = {row.idLinea: row.nombreLinea for row in lineas.itertuples()}
-        else:
-            # fallback desde controles
-            tmp = df_ctrl[['idLinea','nombreLinea']].drop_duplicates().dropna() if not df_ctrl.empty else pd.DataFrame()
-            opciones_linea = {int(r.idLinea): r.nombreLinea for r in tmp.itertuples()} if not tmp.empty else {}
+        indice = cargar_indice_dashboard(version_catalogo())
+        nombres = indice['etiquetas']
 
-        linea_keys = [None] + list(opciones_linea.keys())
+        # Línea
+        opciones_linea = nombres.get('idLinea', {})
+        linea_keys = [None] + opciones(indice, 'idLinea')
         linea_sel = st.selectbox("Línea", options=linea_keys, format_func=lambda x: "Todas" if x is None else opciones_linea.get(x, str(x)))
 
-        # Presentación filtrada por línea (desde presentacionproducto)
-        if linea_sel is not None and not pres_prod.empty:
-            pres_df = pres_prod[pres_prod['idLinea'] == int(linea_sel)]
-        else:
-            pres_df = pres_prod.copy() if not pres_prod.empty else pd.DataFrame()
-
-        # fallback: si no hay presentaciones con esa linea, tomar presentaciones presentes en controles/parametros
-        if pres_df.empty:
-            ids1 = df_ctrl[['idPresentacion']].drop_duplicates().dropna() if not df_ctrl.empty else pd.DataFrame()
-            ids2 = params[['idPresentacion']].drop_duplicates().dropna() if not params.empty else pd.DataFrame()
-            pres_ids = pd.concat([ids1, ids2]).drop_duplicates() if not ids1.empty or not ids2.empty else pd.DataFrame()
-            pres_df = pd.DataFrame({'idPresentacion': pres_ids['idPresentacion'].astype('Int64')}) if not pres_ids.empty else pd.DataFrame()
-
-        pres_opts = pres_df['idPresentacion'].dropna().astype(int).unique().tolist() if not pres_df.empty else []
-        pres_map = dict(zip(pres_prod['idPresentacion'].astype(int).tolist(), pres_prod['nombrePresentacion'].tolist())) if not pres_prod.empty else {}
-        pres_keys = [None] + pres_opts
+        # Presentación filtrada por línea
+        pres_map = nombres.get('idPresentacion', {})
+        pres_keys = [None] + opciones(indice, 'idPresentacion', {'idLinea': linea_sel})
         pres_sel = st.selectbox("Presentación", options=pres_keys, format_func=lambda x: "Todas" if x is None else pres_map.get(int(x), str(x)))
 
         # Tipo de control filtrado por presentación o por línea
-        tipo_opts = []
-        if pres_sel is not None and not rel_pres_tipo.empty:
-            tipo_opts = rel_pres_tipo[rel_pres_tipo['idPresentacion'] == int(pres_sel)]['idTipoControl'].drop_duplicates().astype(int).tolist()
-        elif pres_sel is not None:
-            # fallback: tipos en controles o parametros para esa presentacion
-            t1 = df_ctrl[df_ctrl['idPresentacion'] == int(pres_sel)]['idTipoControl'].dropna().astype(int).unique().tolist() if not df_ctrl.empty else []
-            t2 = params[params['idPresentacion'] == int(pres_sel)]['idTipoControl'].dropna().astype(int).unique().tolist() if not params.empty else []
-            tipo_opts = sorted(set(t1 + t2))
-        else:
-            # si no presentacion, preferir tipos por linea
-            if linea_sel is not None and not tipos.empty:
-                tipo_opts = tipos[tipos['idLinea'] == int(linea_sel)]['idTipoControl'].drop_duplicates().astype(int).tolist()
-                if not tipo_opts:
-                    tipo_opts = tipos['idTipoControl'].drop_duplicates().astype(int).tolist()
-            else:
-                tipo_opts = tipos['idTipoControl'].drop_duplicates().astype(int).tolist() if not tipos.empty else df_ctrl['idTipoControl'].drop_duplicates().dropna().astype(int).tolist()
+        tipo_opts = opciones(indice, 'idTipoControl', {'idLinea': linea_sel, 'idPresentacion': pres_sel})
+        if not tipo_opts:
+            tipo_opts = opciones(indice, 'idTipoControl', {'idLinea': linea_sel}) or opciones(indice, 'idTipoControl')
 
-        tipo_map = dict(zip(tipos['idTipoControl'].tolist(), tipos['nombreTipo'].tolist())) if not tipos.empty else {}
-        tipo_keys = [None] + (tipo_opts if tipo_opts else [])
+        tipo_map = nombres.get('idTipoControl', {})
+        tipo_keys = [None] + tipo_opts
         tipo_sel = st.selectbox("Tipo de control", options=tipo_keys, format_func=lambda x: "Todos" if x is None else tipo_map.get(int(x), str(x)))
 
-        # Parámetros filtrados por (presentación OR tipo) preferentemente
-        param_candidates = pd.DataFrame()
-        if not params.empty:
-            tmp = params.copy()
-            if pres_sel is not None:
-                tmp_pres = tmp[tmp['idPresentacion'] == int(pres_sel)]
-            else:
-                tmp_pres = pd.DataFrame()
-            if tipo_sel is not None:
-                tmp_tipo = tmp[tmp['idTipoControl'] == int(tipo_sel)]
-            else:
-                tmp_tipo = pd.DataFrame()
+        # Parámetros filtrados por (presentación, tipo); si queda vacío se amplía
+        param_ids = (opciones(indice, 'idParametro', {'idPresentacion': pres_sel, 'idTipoControl': tipo_sel})
+                        or opciones(indice, 'idParametro', {'idTipoControl': tipo_sel})
+                        or opciones(indice, 'idParametro'))
 
-            # preferir la intersección, si está vacía usar la unión
-            inter = pd.merge(tmp_pres, tmp_tipo, how='inner', on=list(tmp.columns)) if (not tmp_pres.empty and not tmp_tipo.empty) else pd.DataFrame()
-            if not inter.empty:
-                param_candidates = inter
-            else:
-                union = pd.concat([tmp_pres, tmp_tipo]).drop_duplicates() if (not tmp_pres.empty or not tmp_tipo.empty) else tmp
-                param_candidates = union
-        else:
-            # fallback desde controles
-            param_candidates = df_ctrl[['idParametro','nombreParametro']].drop_duplicates()
-
-        # ultimo fallback: todos los parametros conocidos
-        if param_candidates.empty and not params.empty:
-            param_candidates = params[['idParametro','nombreParametro']].drop_duplicates()
-
-        param_map = {int(r.idParametro): r.nombreParametro for r in param_candidates.itertuples()} if not param_candidates.empty else {}
+        param_map = {pid: nombres.get('idParametro', {}).get(pid, str(pid)) for pid in param_ids}
         param_keys = list(param_map.keys())
         param_sel = st.multiselect("Parámetro(s)", options=param_keys, format_func=lambda x: param_map.get(x, str(x)), default=(param_keys[:3] if len(param_keys)>0 else []))
 
@@ -208,23 +146,22 @@ def dashboard_powerbi_module():
             # simple workaround: recargar la página para limpiar widget states
             st.experimental_rerun()
 
-    # Aplicar filtros sobre df_ctrl
-    df_f = df_ctrl.copy()
-
-    # fecha
+    # Aplicar filtros sobre df_ctrl (una sola máscara)
+    start = end = None
     if isinstance(date_range, (list, tuple)) and len(date_range) == 2:
         start = pd.to_datetime(date_range[0])
         end = pd.to_datetime(date_range[1]) + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
-        df_f = df_f[(df_f['fechaControl'] >= start) & (df_f['fechaControl'] <= end)]
-
-    if linea_sel is not None:
-        df_f = df_f[df_f['idLinea'] == int(linea_sel)]
-    if pres_sel is not None:
-        df_f = df_f[df_f['idPresentacion'] == int(pres_sel)]
-    if tipo_sel is not None:
-        df_f = df_f[df_f['idTipoControl'] == int(tipo_sel)]
-    if param_sel:
-        df_f = df_f[df_f['idParametro'].isin(param_sel)]
+
+    spec = filtro(
+        condicion('fechaControl', '>=', start),
+        condicion('fechaControl', '<=', end),
+        condicion('idLinea', '=', linea_sel),
+        condicion('idPresentacion', '=', pres_sel),
+        condicion('idTipoControl', '=', tipo_sel),
+        condicion('idParametro', 'in', param_sel or None),
+    )
+    df_f = adjuntar_nombres(aplicar(spec, df_ctrl), obtener_catalogo())
+    df_f = adjuntar_limites_vigentes(df_f, obtener_versiones())
 
     # KPIs (fila superior) - 5 tarjetas
     total_mediciones = len(df_f)
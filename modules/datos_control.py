@@ -0,0 +1,110 @@
+import pandas as pd
+
+# TABLA DE HECHOS COMPACTA PARA controlcalidad
+#
+# Las filas de controles sólo guardan ids, fecha y resultado con tipos reducidos
+# (enteros con downcast, categóricas para textos repetidos); resultado y límites
+# quedan en float64, la misma precisión con la que se evalúan las alertas. Los nombres
+# (parámetro, línea, tipo, presentación, lote) viven una sola vez en el catálogo
+# y se adjuntan con adjuntar_nombres() sólo sobre el subconjunto que se muestra.
+
+COLUMNAS_ID = ['idControl', 'idOrdenTrabajo', 'idUsuario', 'idParametro', 'idPresentacion',
+                'idTipoControl', 'idLinea', 'idDetalle']
+COLUMNAS_CATEGORICAS = ['observaciones', 'sabor']
+COLUMNAS_HECHOS = ['idControl', 'fechaControl', 'idOrdenTrabajo', 'resultado', 'observaciones', 'idUsuario',
+                    'idParametro', 'idPresentacion', 'idTipoControl', 'idLinea', 'idDetalle', 'sabor']
+
+Q_CONTROLES = """
+    SELECT cc.idControl, cc.fechaControl, cc.idOrdenTrabajo, cc.resultado, cc.observaciones,
+            cc.idUsuario, cc.idParametro, cc.idPresentacion, cc.idTipoControl, cc.idLinea,
+            cc.idDetalle, cc.sabor
+    FROM controlcalidad cc
+"""
+
+
+def _compactar_id(serie):
+    if serie.isna().any():
+        return serie.astype('Int32')
+    return pd.to_numeric(serie, downcast='integer')
+
+
+def compactar_controles(df):
+    """Reduce tipos de la tabla de hechos (no modifica el DataFrame recibido)."""
+    df = df.copy()
+    for col in COLUMNAS_ID:
+        if col in df.columns:
+            df[col] = _compactar_id(df[col])
+    if 'resultado' in df.columns:
+        df['resultado'] = pd.to_numeric(df['resultado'], errors='coerce').astype('float64')
+    for col in COLUMNAS_CATEGORICAS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    if 'fechaControl' in df.columns:
+        df['fechaControl'] = pd.to_datetime(df['fechaControl'])
+    return df
+
+
+def cargar_controles(conn):
+    """Controles sin joins de nombres, ya compactados."""
+    try:
+        df = pd.read_sql(Q_CONTROLES, conn, parse_dates=['fechaControl'])
+    except Exception:
+        df = pd.DataFrame(columns=COLUMNAS_HECHOS)
+    return compactar_controles(df)
+
+
+def adjuntar_nombres(df, catalogo, detalles=None):
+    """
+    Agrega columnas descriptivas (nombres, unidad, límites, lote) a partir del
+    catálogo. Pensado para el subconjunto filtrado que se va a mostrar.
+    """
+    df = df.copy()
+    params = catalogo['parametros'].set_index('idParametro')
+    df['nombreParametro'] = df['idParametro'].map(params['nombreParametro'])
+    df['unidadMedida'] = df['idParametro'].map(params['unidadMedida'])
+    df['limiteInferior'] = df['idParametro'].map(pd.to_numeric(params['limiteInferior'], errors='coerce')).astype('float64')
+    df['limiteSuperior'] = df['idParametro'].map(pd.to_numeric(params['limiteSuperior'], errors='coerce')).astype('float64')
+    df['nombreTipoControl'] = df['idTipoControl'].map(catalogo['tipos'].set_index('idTipoControl')['nombreTipo'])
+    df['nombreLinea'] = df['idLinea'].map(catalogo['lineas'].set_index('idLinea')['nombreLinea'])
+    df['nombrePresentacion'] = df['idPresentacion'].map(
+        catalogo['presentaciones'].set_index('idPresentacion')['nombrePresentacion'])
+    if detalles is not None:
+        lotes = detalles.drop_duplicates('idDetalle').set_index('idDetalle')['lote'] if not detalles.empty else {}
+        df['lote'] = df['idDetalle'].map(lotes)
+    return df
+
+
+def bytes_por_fila(df):
+    if len(df) == 0:
+        return 0.0
+    return float(df.memory_usage(deep=True, index=False).sum()) / len(df)
+
+
+def reporte_memoria(df_compacto, catalogo, detalles=None):
+    """
+    Compara el DataFrame compacto contra su equivalente "ancho" (ids int64,
+    resultado float64, nombres como object en cada fila, como el antiguo join).
+    """
+    ancho = df_compacto.copy()
+    for col in COLUMNAS_ID:
+        if col in ancho.columns:
+            ancho[col] = ancho[col].astype('float64' if ancho[col].isna().any() else 'int64')
+    ancho['resultado'] = ancho['resultado'].astype('float64')
+    for col in COLUMNAS_CATEGORICAS:
+        if col in ancho.columns:
+            ancho[col] = ancho[col].astype(object)
+    ancho = adjuntar_nombres(ancho, catalogo, detalles)
+    for col in ['limiteInferior', 'limiteSuperior']:
+        ancho[col] = ancho[col].astype('float64')
+    for col in ancho.columns:
+        if isinstance(ancho[col].dtype, pd.CategoricalDtype):
+            ancho[col] = ancho[col].astype(object)
+
+    antes = bytes_por_fila(ancho)
+    despues = bytes_por_fila(df_compacto)
+    return pd.DataFrame({
+        'Filas': [len(ancho), len(df_compacto)],
+        'Columnas': [ancho.shape[1], df_compacto.shape[1]],
+        'Bytes por fila': [round(antes, 1), round(despues, 1)],
+        'Total (MB)': [round(antes * len(ancho) / 1e6, 2), round(despues * len(df_compacto) / 1e6, 2)],
+    }, index=['Antes (join con nombres)', 'Después (compacto)'])
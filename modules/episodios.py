@@ -0,0 +1,300 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+from database.db_connection import get_connection
+from modules.filtros import a_sql
+from modules.resumen_calidad import ESTADO_ALERTA_DESCARTADA, ESTADOS_ALERTA_ABIERTA
+
+# EPISODIOS DE ALERTAS (tabla episodioalerta)
+#
+# Las alertas consecutivas de una misma clave (línea, presentación, parámetro,
+# lote) separadas por menos de VENTANA_EPISODIO se agrupan en un episodio con
+# contador, peor valor y primera/última fecha. Se mantiene al escribir alertas
+# (guardar_alertas), con un costo fijo por clave y por lote de alertas:
+#   1) cerrar el episodio abierto de la clave si su última alerta quedó fuera de la ventana
+#   2) INSERT ... ON DUPLICATE KEY UPDATE sobre claveAbierta (único; NULL = cerrado)
+# Un tramo que termina más de una ventana antes del inicio del episodio abierto
+# (alertas de controles atrasados) se guarda como episodio cerrado propio, en lugar
+# de estirar el abierto hacia atrás por encima de episodios ya cerrados.
+# Las alertas descartadas (re-evaluación) se descuentan de su episodio; si no le
+# queda ninguna, el episodio se cierra como descartado.
+# Las vistas de alertas leen decenas de episodios en lugar de miles de filas.
+
+VENTANA_EPISODIO = pd.Timedelta(minutes=30)
+ESTADO_EPISODIO_ABIERTO = "abierto"
+ESTADO_EPISODIO_CERRADO = "cerrado"
+ESTADO_EPISODIO_RESUELTO = "resuelto"
+ESTADO_EPISODIO_DESCARTADO = "descartado"
+TAM_BLOQUE_CONTROLES = 5000
+
+COLUMNAS_PAYLOAD = ["tipoAlerta", "descripcion", "idControl", "idOrdenTrabajo", "idLinea", "idParametro",
+                    "idPresentacion", "valorFuera", "limiteInferior", "limiteSuperior", "estado"]
+
+COLUMNAS_EPISODIOS = {
+    "fechaAlerta": "e.ultimaAlerta",
+    "idLinea": "e.idLinea",
+    "idPresentacion": "e.idPresentacion",
+    "idTipoControl": "par.idTipoControl",
+    "idParametro": "e.idParametro",
+    "estado": "e.estado",
+}
+
+Q_CERRAR_VENCIDO = """
+    UPDATE episodioalerta
+    SET claveAbierta = NULL, estado = %s
+    WHERE claveAbierta = %s AND ultimaAlerta < %s
+"""
+
+Q_DESCONTAR_EPISODIO = """
+    UPDATE episodioalerta
+    SET claveAbierta = IF(alertas <= %s, NULL, claveAbierta),
+        estado = IF(alertas <= %s, %s, estado),
+        alertas = GREATEST(alertas - %s, 0)
+    WHERE idEpisodio = %s
+"""
+
+COLUMNAS_UPSERT = ["clave", "idLinea", "idPresentacion", "idParametro", "idDetalle", "tipoAlerta", "alertas",
+                    "peorValor", "peorDesviacion", "limiteInferior", "limiteSuperior", "primeraAlerta",
+                    "ultimaAlerta", "idUltimoControl", "estado"]
+
+Q_UPSERT_EPISODIO = """
+    INSERT INTO episodioalerta
+    (claveAbierta, idLinea, idPresentacion, idParametro, idDetalle, tipoAlerta, alertas,
+        peorValor, peorDesviacion, limiteInferior, limiteSuperior, primeraAlerta, ultimaAlerta,
+        idUltimoControl, estado)
+    VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+    ON DUPLICATE KEY UPDATE
+        peorValor = IF(VALUES(peorDesviacion) > peorDesviacion, VALUES(peorValor), peorValor),
+        peorDesviacion = GREATEST(peorDesviacion, VALUES(peorDesviacion)),
+        alertas = alertas + VALUES(alertas),
+        tipoAlerta = VALUES(tipoAlerta),
+        limiteInferior = VALUES(limiteInferior),
+        limiteSuperior = VALUES(limiteSuperior),
+        primeraAlerta = LEAST(primeraAlerta, VALUES(primeraAlerta)),
+        idUltimoControl = IF(VALUES(ultimaAlerta) >= ultimaAlerta, VALUES(idUltimoControl), idUltimoControl),
+        ultimaAlerta = GREATEST(ultimaAlerta, VALUES(ultimaAlerta))
+"""
+
+
+def _contexto_controles(cursor, ids_control):
+    """idDetalle y fechaControl de los controles alertados (consultas IN por bloques)."""
+    filas = []
+    for i in range(0, len(ids_control), TAM_BLOQUE_CONTROLES):
+        bloque = ids_control[i:i + TAM_BLOQUE_CONTROLES]
+        cursor.execute(
+            f"SELECT idControl, idDetalle, fechaControl FROM controlcalidad "
+            f"WHERE idControl IN ({', '.join(['%s'] * len(bloque))})", tuple(bloque))
+        filas.extend(cursor.fetchall())
+    return pd.DataFrame(filas, columns=["idControl", "idDetalle", "fechaControl"])
+
+
+def _inicio_abiertos(cursor, claves):
+    """{claveAbierta: primeraAlerta} de los episodios abiertos de las claves dadas."""
+    inicio = {}
+    for i in range(0, len(claves), TAM_BLOQUE_CONTROLES):
+        bloque = claves[i:i + TAM_BLOQUE_CONTROLES]
+        cursor.execute(
+            f"SELECT claveAbierta, primeraAlerta FROM episodioalerta "
+            f"WHERE claveAbierta IN ({', '.join(['%s'] * len(bloque))})", tuple(bloque))
+        inicio.update(cursor.fetchall())
+    return inicio
+
+
+def agrupar_episodios(alertas, ventana=VENTANA_EPISODIO):
+    """
+    `alertas` con idLinea, idPresentacion, idParametro, idDetalle, fecha, idControl,
+    tipoAlerta, valorFuera, limiteInferior, limiteSuperior → un registro por tramo
+    (clave, segmento): alertas separadas más que `ventana` abren un tramo nuevo.
+    """
+    df = alertas.copy()
+    claves = ["idLinea", "idPresentacion", "idParametro", "idDetalle"]
+    for c in claves:
+        df[c] = pd.to_numeric(df[c], errors="coerce").astype("Int64")
+    df["clave"] = df[claves].fillna(0).astype(str).agg("-".join, axis=1)
+    df["fecha"] = pd.to_datetime(df["fecha"])
+    valor = pd.to_numeric(df["valorFuera"], errors="coerce").astype("float32")
+    li = pd.to_numeric(df["limiteInferior"], errors="coerce").astype("float32")
+    ls = pd.to_numeric(df["limiteSuperior"], errors="coerce").astype("float32")
+    desv = np.fmax(np.fmax(li - valor, valor - ls), 0).fillna(0)
+    # checks sin límites: desviación fija
+    df["desviacion"] = desv.where(li.notna() | ls.notna(), 1.0).astype("float32")
+
+    df = df.sort_values(["clave", "fecha", "idControl"], kind="stable")
+    nuevo = df["clave"].ne(df["clave"].shift()) | (df["fecha"].diff() > ventana)
+    df["tramo"] = nuevo.cumsum()
+    df["orden"] = nuevo.groupby(df["clave"]).cumsum() - 1
+
+    g = df.groupby("tramo", sort=False)
+    peor = df.loc[g["desviacion"].idxmax()].set_index("tramo")
+    ultimo = g.tail(1).set_index("tramo")
+    return pd.DataFrame({
+        "clave": ultimo["clave"],
+        "orden": ultimo["orden"],
+        "idLinea": ultimo["idLinea"],
+        "idPresentacion": ultimo["idPresentacion"],
+        "idParametro": ultimo["idParametro"],
+        "idDetalle": ultimo["idDetalle"],
+        "tipoAlerta": ultimo["tipoAlerta"],
+        "alertas": g.size(),
+        "peorValor": peor["valorFuera"],
+        "peorDesviacion": peor["desviacion"],
+        "limiteInferior": ultimo["limiteInferior"],
+        "limiteSuperior": ultimo["limiteSuperior"],
+        "primeraAlerta": g["fecha"].min(),
+        "ultimaAlerta": g["fecha"].max(),
+        "idUltimoControl": ultimo["idControl"],
+    }).reset_index(drop=True)
+
+
+def _nativos(df, columnas):
+    sub = df[columnas].astype(object)
+    sub = sub.where(sub.notna(), None)
+    return [tuple(v.to_pydatetime() if isinstance(v, pd.Timestamp) else
+                    (v.item() if isinstance(v, np.generic) else v) for v in fila)
+            for fila in sub.itertuples(index=False, name=None)]
+
+
+def actualizar_episodios(cursor, filas, ventana=VENTANA_EPISODIO):
+    """
+    Incorpora a episodioalerta las alertas recién insertadas (filas de payloads_alerta).
+    La fecha del episodio es la fechaControl del control alertado. No hace commit.
+    """
+    alertas = pd.DataFrame(filas, columns=COLUMNAS_PAYLOAD)
+    alertas = alertas[alertas["idControl"].notna()]
+    if alertas.empty:
+        return 0
+    contexto = _contexto_controles(cursor, sorted({int(i) for i in alertas["idControl"]}))
+    alertas = alertas.astype({"idControl": "int64"}).merge(contexto, on="idControl", how="inner")
+    if alertas.empty:
+        return 0
+    tramos = agrupar_episodios(alertas.rename(columns={"fechaControl": "fecha"}), ventana)
+
+    for orden in sorted(tramos["orden"].unique()):
+        t = tramos[tramos["orden"] == orden]
+        inicio = pd.to_datetime(t["clave"].map(_inicio_abiertos(cursor, t["clave"].unique().tolist())))
+        atrasado = t["ultimaAlerta"] < inicio - ventana
+        if atrasado.any():
+            cursor.executemany(Q_UPSERT_EPISODIO, _nativos(
+                t[atrasado].assign(clave=None, estado=ESTADO_EPISODIO_CERRADO), COLUMNAS_UPSERT))
+            t = t[~atrasado]
+        cursor.executemany(Q_CERRAR_VENCIDO, _nativos(
+            t.assign(estado=ESTADO_EPISODIO_CERRADO, limite=t["primeraAlerta"] - ventana),
+            ["estado", "clave", "limite"]))
+        cursor.executemany(Q_UPSERT_EPISODIO, _nativos(t.assign(estado=ESTADO_EPISODIO_ABIERTO), COLUMNAS_UPSERT))
+    return len(tramos)
+
+
+def descartar_en_episodios(cursor, ids_alerta):
+    """
+    Descuenta las alertas descartadas de los episodios que las contienen y cierra
+    como descartados los que quedan sin alertas. No hace commit.
+    """
+    ids_alerta = [int(i) for i in ids_alerta]
+    if not ids_alerta:
+        return 0
+    cursor.execute(f"""
+        SELECT e.idEpisodio, COUNT(*) AS n
+        FROM alerta a
+        INNER JOIN controlcalidad c ON c.idControl = a.idControl
+        INNER JOIN episodioalerta e
+            ON a.idLinea <=> e.idLinea AND a.idPresentacion <=> e.idPresentacion
+            AND a.idParametro <=> e.idParametro AND c.idDetalle <=> e.idDetalle
+            AND c.fechaControl BETWEEN e.primeraAlerta AND e.ultimaAlerta
+        WHERE a.idAlerta IN ({", ".join(["%s"] * len(ids_alerta))})
+        GROUP BY e.idEpisodio
+    """, tuple(ids_alerta))
+    descuentos = cursor.fetchall()
+    # MySQL aplica el SET de izquierda a derecha: `alertas` se descuenta al final
+    cursor.executemany(Q_DESCONTAR_EPISODIO, [
+        (int(n), int(n), ESTADO_EPISODIO_DESCARTADO, int(n), int(id_episodio)) for id_episodio, n in descuentos])
+    return len(descuentos)
+
+
+def reconstruir_episodios(ventana=VENTANA_EPISODIO):
+    """Vuelve a generar episodioalerta desde todas las alertas (carga inicial o tras cambiar la ventana)."""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT a.idControl, a.idLinea, a.idPresentacion, a.idParametro, c.idDetalle,
+                    COALESCE(c.fechaControl, a.fechaAlerta) AS fecha, a.tipoAlerta,
+                    a.valorFuera, a.limiteInferior, a.limiteSuperior
+            FROM alerta a
+            LEFT JOIN controlcalidad c ON c.idControl = a.idControl
+            WHERE a.estado <> %s
+        """, (ESTADO_ALERTA_DESCARTADA,))
+        columnas = [c[0] for c in cursor.description]
+        alertas = pd.DataFrame(cursor.fetchall(), columns=columnas)
+        try:
+            cursor.execute("DELETE FROM episodioalerta")
+            if not alertas.empty:
+                tramos = agrupar_episodios(alertas.assign(idControl=alertas["idControl"].fillna(0)), ventana)
+                # sólo el último tramo de cada clave queda abierto (si sigue dentro de la ventana)
+                ultimo = tramos["orden"] == tramos.groupby("clave")["orden"].transform("max")
+                vigente = ultimo & (tramos["ultimaAlerta"] >= pd.Timestamp.now() - ventana)
+                tramos["estado"] = np.where(vigente, ESTADO_EPISODIO_ABIERTO, ESTADO_EPISODIO_CERRADO)
+                tramos["clave"] = tramos["clave"].where(vigente, None)
+                cursor.executemany(Q_UPSERT_EPISODIO, _nativos(tramos, COLUMNAS_UPSERT))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        cursor.close()
+    finally:
+        conn.close()
+    return len(alertas)
+
+
+@st.cache_data(ttl=60)
+def obtener_episodios(filtros, limite=500):
+    """Episodios del filtro (ver COLUMNAS_EPISODIOS), más recientes primero, con nombres."""
+    where, params = a_sql(filtros, COLUMNAS_EPISODIOS)
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT e.idEpisodio, e.estado, e.alertas, e.tipoAlerta, e.primeraAlerta, e.ultimaAlerta,
+                    e.peorValor, e.limiteInferior, e.limiteSuperior, e.peorDesviacion,
+                    l.nombreLinea, p.nombrePresentacion, par.nombreParametro, d.lote,
+                    e.idLinea, e.idPresentacion, e.idParametro, e.idDetalle, e.idUltimoControl
+            FROM episodioalerta e
+            LEFT JOIN lineaproduccion l ON l.idLinea = e.idLinea
+            LEFT JOIN presentacionproducto p ON p.idPresentacion = e.idPresentacion
+            LEFT JOIN parametrocalidad par ON par.idParametro = e.idParametro
+            LEFT JOIN DetalleOrdenTrabajo d ON d.idDetalle = e.idDetalle
+            {where}
+            ORDER BY e.ultimaAlerta DESC
+            LIMIT %s
+        """, params + (int(limite),))
+        columnas = [c[0] for c in cursor.description]
+        df = pd.DataFrame(cursor.fetchall(), columns=columnas)
+        cursor.close()
+    finally:
+        conn.close()
+    return df
+
+
+def resolver_episodio(cursor, id_episodio, nuevo_estado):
+    """
+    Aplica `nuevo_estado` a las alertas abiertas del episodio (no a las descartadas ni
+    a las ya decididas) y lo marca resuelto (la próxima alerta de la clave abre un
+    episodio nuevo). Devuelve las alertas actualizadas.
+    """
+    cursor.execute("""
+        UPDATE alerta a
+        INNER JOIN controlcalidad c ON c.idControl = a.idControl
+        INNER JOIN episodioalerta e ON e.idEpisodio = %s
+        SET a.estado = %s
+        WHERE a.idLinea <=> e.idLinea AND a.idPresentacion <=> e.idPresentacion
+            AND a.idParametro <=> e.idParametro AND c.idDetalle <=> e.idDetalle
+            AND c.fechaControl BETWEEN e.primeraAlerta AND e.ultimaAlerta
+            AND a.estado IN (%s, %s)
+    """, (int(id_episodio), nuevo_estado) + ESTADOS_ALERTA_ABIERTA)
+    actualizadas = cursor.rowcount
+    cursor.execute("UPDATE episodioalerta SET claveAbierta = NULL, estado = %s WHERE idEpisodio = %s",
+                    (ESTADO_EPISODIO_RESUELTO, int(id_episodio)))
+    return actualizadas
+
+
+if __name__ == "__main__":
+    print(f"Episodios reconstruidos a partir de {reconstruir_episodios()} alertas.")
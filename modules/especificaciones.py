@@ -0,0 +1,164 @@
+import streamlit as st
+import numpy as np
+import pandas as pd
+from database.db_connection import get_connection
+from modules.catalogo import obtener_catalogo, version_catalogo
+
+# VERSIONES DE ESPECIFICACIÓN (tabla versionespecificacion)
+#
+# Cada cambio de límites en parametrocalidad (idPresentacion NULL = límite
+# general) o en presentacionparametro deja una fila con su vigenteDesde. Los
+# resultados históricos se comparan contra el límite vigente en su fechaControl
+# con un merge_asof ordenado (una pasada vectorizada, sin bucles por fila):
+#   1) versión por presentación y parámetro
+#   2) si no hay, versión general del parámetro (igual que el COALESCE de las consultas)
+#   3) si no hay ninguna anterior a la fecha, el límite actual ya adjuntado
+
+COLUMNAS_ESPEC_EFECTIVA = ["idPresentacionParametro", "idParametro", "nombreParametro", "idTipoControl",
+                            "tipoParametro", "limiteInferior", "limiteSuperior", "unidadMedida"]
+
+Q_VERSIONES = """
+    SELECT idVersion, idParametro, idPresentacion, limiteInferior, limiteSuperior,
+            tipoParametro, vigenteDesde
+    FROM versionespecificacion
+    ORDER BY vigenteDesde, idVersion
+"""
+
+
+def registrar_version(cursor, id_parametro, id_presentacion, lim_inf, lim_sup, tipo_parametro):
+    """Agrega una versión vigente desde ahora. Usar dentro de la transacción del cambio."""
+    cursor.execute("""
+        INSERT INTO versionespecificacion
+        (idParametro, idPresentacion, limiteInferior, limiteSuperior, tipoParametro, vigenteDesde)
+        VALUES (%s, %s, %s, %s, %s, NOW())
+    """, (id_parametro, id_presentacion, lim_inf, lim_sup, tipo_parametro))
+
+
+def registrar_versiones(cursor, filas):
+    """Igual que registrar_version para varias filas (idParametro, idPresentacion, inf, sup, tipo)."""
+    if filas:
+        cursor.executemany("""
+            INSERT INTO versionespecificacion
+            (idParametro, idPresentacion, limiteInferior, limiteSuperior, tipoParametro, vigenteDesde)
+            VALUES (%s, %s, %s, %s, %s, NOW())
+        """, filas)
+
+
+@st.cache_resource(max_entries=1)
+def _cargar_versiones(version):
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(Q_VERSIONES)
+        columnas = [c[0] for c in cursor.description]
+        df = pd.DataFrame(cursor.fetchall(), columns=columnas)
+        cursor.close()
+    except Exception:
+        df = pd.DataFrame(columns=["idVersion", "idParametro", "idPresentacion", "limiteInferior",
+                                    "limiteSuperior", "tipoParametro", "vigenteDesde"])
+    finally:
+        conn.close()
+    df["vigenteDesde"] = pd.to_datetime(df["vigenteDesde"])
+    for col in ["limiteInferior", "limiteSuperior"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+    df["idParametro"] = df["idParametro"].astype("int64")
+    df["idPresentacion"] = pd.to_numeric(df["idPresentacion"], errors="coerce").fillna(-1).astype("int64")
+    return df
+
+
+def obtener_versiones():
+    """Historial de versiones (compartido, sólo lectura). Se recarga con el catálogo."""
+    return _cargar_versiones(version_catalogo())
+
+
+def _asof(izq, versiones, por):
+    der = versiones[por + ["vigenteDesde", "limiteInferior", "limiteSuperior"]]
+    if der.empty:
+        return pd.DataFrame({"limiteInferior": np.nan, "limiteSuperior": np.nan, "vigenteDesde": pd.NaT},
+                            index=izq.index).astype({"limiteInferior": "float64", "limiteSuperior": "float64"})
+    r = pd.merge_asof(izq, der, left_on="_fecha", right_on="vigenteDesde", by=por, direction="backward")
+    r.index = izq.index
+    return r[["limiteInferior", "limiteSuperior", "vigenteDesde"]]
+
+
+def adjuntar_limites_vigentes(df, versiones, columna_fecha="fechaControl", columna_vigencia=None):
+    """
+    Reemplaza limiteInferior/limiteSuperior de `df` por los vigentes en cada
+    `columna_fecha`. Requiere idParametro e idPresentacion en `df`; las filas sin
+    versión anterior conservan el límite que ya tenían (el actual).
+    Con `columna_vigencia` agrega además la fecha desde la que rige ese límite
+    (NaT si no hay versión anterior).
+    """
+    df = df.copy()
+    for col in ["limiteInferior", "limiteSuperior"]:
+        if col not in df.columns:
+            df[col] = np.float64(np.nan)
+    if columna_vigencia:
+        df[columna_vigencia] = pd.NaT
+    if df.empty or versiones.empty:
+        return df
+
+    izq = pd.DataFrame({
+        "_fecha": pd.to_datetime(df[columna_fecha]).to_numpy(),
+        "idParametro": pd.to_numeric(df["idParametro"], errors="coerce").fillna(-1).astype("int64").to_numpy(),
+        "idPresentacion": pd.to_numeric(df["idPresentacion"], errors="coerce").fillna(-1).astype("int64").to_numpy(),
+    })
+    izq = izq[izq["_fecha"].notna()].sort_values("_fecha", kind="stable")
+    if izq.empty:
+        return df
+
+    por_presentacion = _asof(izq, versiones[versiones["idPresentacion"] >= 0], ["idParametro", "idPresentacion"])
+    generales = _asof(izq, versiones[versiones["idPresentacion"] < 0], ["idParametro"])
+
+    posiciones = izq.index.to_numpy()
+    for col in ["limiteInferior", "limiteSuperior"]:
+        vigente = por_presentacion[col].fillna(generales[col]).astype("float64").to_numpy()
+        actual = df[col].astype("float64").to_numpy(copy=True)
+        con_version = ~np.isnan(vigente)
+        actual[posiciones[con_version]] = vigente[con_version]
+        df[col] = actual
+    if columna_vigencia:
+        # versión por presentación si tiene límites; si no (sin versión o override
+        # eliminado), rige el general desde la más reciente de las dos fechas
+        propia = por_presentacion["limiteInferior"].notna() | por_presentacion["limiteSuperior"].notna()
+        desde = pd.concat([por_presentacion["vigenteDesde"], generales["vigenteDesde"]], axis=1).max(axis=1)
+        desde = por_presentacion["vigenteDesde"].where(propia, desde)
+        vigencia = df[columna_vigencia].to_numpy(dtype="datetime64[ns]", copy=True)
+        vigencia[posiciones] = desde.to_numpy(dtype="datetime64[ns]")
+        df[columna_vigencia] = vigencia
+    return df
+
+
+# ESPECIFICACIÓN EFECTIVA POR PRESENTACIÓN
+# Resuelve en memoria, a partir del catálogo, el mismo COALESCE entre
+# presentacionparametro y parametrocalidad que hacía la consulta por presentación.
+# Se reconstruye sólo cuando cambia la versión del catálogo (cualquier escritura
+# en esas tablas llama a invalidar_catalogo()).
+
+def especificacion_efectiva(catalogo):
+    """DataFrame con idPresentacion + COLUMNAS_ESPEC_EFECTIVA, ordenado por presentación y nombre."""
+    esp = catalogo["especificaciones"]
+    par = catalogo["parametros"][["idParametro", "nombreParametro", "idTipoControl", "tipoParametro",
+                                    "limiteInferior", "limiteSuperior", "unidadMedida"]]
+    df = esp.merge(par, on="idParametro", how="inner", suffixes=("", "_par"))
+    for col in ["tipoParametro", "limiteInferior", "limiteSuperior", "unidadMedida"]:
+        df[col] = df[col].where(df[col].notna(), df[f"{col}_par"])
+    return df[["idPresentacion"] + COLUMNAS_ESPEC_EFECTIVA].sort_values(
+        ["idPresentacion", "nombreParametro"], kind="stable").reset_index(drop=True)
+
+
+@st.cache_resource(max_entries=1)
+def _mapa_especificacion(version):
+    ef = especificacion_efectiva(obtener_catalogo())
+    return {
+        int(id_pres): grupo[COLUMNAS_ESPEC_EFECTIVA].reset_index(drop=True)
+        for id_pres, grupo in ef.groupby("idPresentacion", sort=False)
+    }
+
+
+def especificacion_presentacion(id_presentacion):
+    """Especificación efectiva de una presentación (copia; lookup en memoria)."""
+    df = _mapa_especificacion(version_catalogo()).get(int(id_presentacion))
+    if df is None:
+        return pd.DataFrame(columns=COLUMNAS_ESPEC_EFECTIVA)
+    return df.copy()
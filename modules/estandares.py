@@ -2,50 +2,26 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 from database.db_connection import get_connection
+from modules.catalogo import obtener_catalogo, invalidar_catalogo, como_tuplas
+from modules.especificaciones import registrar_version, registrar_versiones, especificacion_presentacion
+from modules.resumen_calidad import refrescar_requeridos
 
 # FUNCIONES DE BASE DE DATOS
 
 def obtener_lineas_produccion():
-    conn = get_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute("SELECT idLinea, nombreLinea FROM lineaproduccion ORDER BY nombreLinea;")
-        return cursor.fetchall()
-    finally:
-        cursor.close()
-        conn.close()
+    return como_tuplas(obtener_catalogo()["lineas"], ["idLinea", "nombreLinea"])
 
 
 def obtener_tipos_control():
-    conn = get_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute("""
-            SELECT t.idTipoControl, t.nombreTipo, t.descripcion, l.nombreLinea, t.idLinea
-            FROM tipocontrol t
-            LEFT JOIN lineaproduccion l ON t.idLinea = l.idLinea
-            ORDER BY l.nombreLinea, t.nombreTipo;
-        """)
-        return cursor.fetchall()
-    finally:
-        cursor.close()
-        conn.close()
+    catalogo = obtener_catalogo()
+    df = catalogo["tipos"].merge(catalogo["lineas"], on="idLinea", how="left")
+    df = df.sort_values(["nombreLinea", "nombreTipo"], na_position="first")
+    return como_tuplas(df, ["idTipoControl", "nombreTipo", "descripcion", "nombreLinea", "idLinea"])
 
 
 def obtener_tipos_por_linea(id_linea):
-    conn = get_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute("""
-            SELECT idTipoControl, nombreTipo, descripcion, idLinea
-            FROM tipocontrol
-            WHERE idLinea = %s
-            ORDER BY nombreTipo;
-        """, (id_linea,))
-        return cursor.fetchall()
-    finally:
-        cursor.close()
-        conn.close()
+    df = obtener_catalogo()["tipos"]
+    return como_tuplas(df[df["idLinea"] == id_linea], ["idTipoControl", "nombreTipo", "descripcion", "idLinea"])
 
 
 def insertar_tipo_control(nombre, descripcion, id_linea):
@@ -57,6 +33,7 @@ def insertar_tipo_control(nombre, descripcion, id_linea):
             VALUES (%s, %s, %s)
         """, (nombre, descripcion, id_linea))
         conn.commit()
+        invalidar_catalogo()
     finally:
         cursor.close()
         conn.close()
@@ -72,6 +49,7 @@ def actualizar_tipo_control(id_tipo, nombre, descripcion, id_linea):
             WHERE idTipoControl = %s
         """, (nombre, descripcion, id_linea, id_tipo))
         conn.commit()
+        invalidar_catalogo()
     finally:
         cursor.close()
         conn.close()
@@ -83,25 +61,15 @@ def eliminar_tipo_control(id_tipo):
     try:
         cursor.execute("DELETE FROM tipocontrol WHERE idTipoControl = %s", (id_tipo,))
         conn.commit()
+        invalidar_catalogo()
     finally:
         cursor.close()
         conn.close()
 
 
 def obtener_parametros_por_tipo(id_tipo):
-    conn = get_connection()
-    query = """
-        SELECT idParametro, nombreParametro, descripcion, unidadMedida,
-                limiteInferior, limiteSuperior, tipoParametro, idTipoControl
-        FROM parametrocalidad
-        WHERE idTipoControl = %s
-        ORDER BY nombreParametro;
-    """
-    try:
-        df = pd.read_sql(query, conn, params=(id_tipo,))
-        return df
-    finally:
-        conn.close()
+    df = obtener_catalogo()["parametros"]
+    return df[df["idTipoControl"] == id_tipo].reset_index(drop=True)
 
 
 def insertar_parametro(nombre, descripcion, unidad, lim_inf, lim_sup, tipo_parametro, id_tipo):
@@ -113,12 +81,11 @@ def insertar_parametro(nombre, descripcion, unidad, lim_inf, lim_sup, tipo_param
             (nombreParametro, descripcion, unidadMedida, limiteInferior, limiteSuperior, tipoParametro, idTipoControl)
             VALUES (%s, %s, %s, %s, %s, %s, %s)
         """, (nombre, descripcion, unidad, lim_inf, lim_sup, tipo_parametro, id_tipo))
+        id_parametro = cursor.lastrowid
+        registrar_version(cursor, id_parametro, None, lim_inf, lim_sup, tipo_parametro)
         conn.commit()
-
-        cursor.execute("SELECT LAST_INSERT_ID()")
-        row = cursor.fetchone()
-        if row:
-            return int(row[0])
+        invalidar_catalogo()
+        return int(id_parametro)
     finally:
         cursor.close()
         conn.close()
@@ -130,6 +97,7 @@ def eliminar_parametro(id_parametro):
     try:
         cursor.execute("DELETE FROM parametrocalidad WHERE idParametro = %s", (id_parametro,))
         conn.commit()
+        invalidar_catalogo()
     finally:
         cursor.close()
         conn.close()
@@ -162,7 +130,9 @@ def actualizar_parametro(id_parametro, nombre, descripcion, unidad, lim_inf, lim
                     tipoParametro = %s
                 WHERE idParametro = %s
             """, (nombre, descripcion, unidad, lim_inf, lim_sup, tipo_parametro, id_parametro))
+        registrar_version(cursor, id_parametro, None, lim_inf, lim_sup, tipo_parametro)
         conn.commit()
+        invalidar_catalogo()
     finally:
         cursor.close()
         conn.close()
@@ -171,19 +141,8 @@ def actualizar_parametro(id_parametro, nombre, descripcion, unidad, lim_inf, lim
 # PRESENTACIONES
 
 def obtener_presentaciones_por_linea(id_linea):
-    conn = get_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute("""
-            SELECT idPresentacion, nombrePresentacion
-            FROM presentacionproducto
-            WHERE idLinea = %s
-            ORDER BY nombrePresentacion;
-        """, (id_linea,))
-        return cursor.fetchall()
-    finally:
-        cursor.close()
-        conn.close()
+    df = obtener_catalogo()["presentaciones"]
+    return como_tuplas(df[df["idLinea"] == id_linea], ["idPresentacion", "nombrePresentacion"])
 
 
 def insertar_parametro_presentacion(id_presentacion, id_parametro, tipo_parametro, lim_inf, lim_sup, unidad):
@@ -199,34 +158,17 @@ def insertar_parametro_presentacion(id_presentacion, id_parametro, tipo_parametr
             (idPresentacion, idParametro, limiteInferior, limiteSuperior, tipoParametro, unidadMedida)
             VALUES (%s, %s, %s, %s, %s, %s)
         """, (id_presentacion, id_parametro, lim_inf, lim_sup, tipo_parametro, unidad))
+        registrar_version(cursor, id_parametro, id_presentacion, lim_inf, lim_sup, tipo_parametro)
+        refrescar_requeridos(cursor, [id_presentacion])
         conn.commit()
+        invalidar_catalogo()
     finally:
         cursor.close()
         conn.close()
 
 
 def obtener_parametros_por_presentacion(id_presentacion):
-    conn = get_connection()
-    query = """
-        SELECT 
-            pp.idPresentacionParametro,
-            p.idParametro,
-            p.nombreParametro,
-            p.idTipoControl,
-            COALESCE(pp.tipoParametro, p.tipoParametro) AS tipoParametro,
-            COALESCE(pp.limiteInferior, p.limiteInferior) AS limiteInferior,
-            COALESCE(pp.limiteSuperior, p.limiteSuperior) AS limiteSuperior,
-            COALESCE(pp.unidadMedida, p.unidadMedida) AS unidadMedida
-        FROM presentacionparametro pp
-        INNER JOIN parametrocalidad p ON p.idParametro = pp.idParametro
-        WHERE pp.idPresentacion = %s
-        ORDER BY p.nombreParametro;
-    """
-    try:
-        df = pd.read_sql(query, conn, params=(id_presentacion,))
-        return df
-    finally:
-        conn.close()
+    return especificacion_presentacion(id_presentacion)
 
 
 def actualizar_parametro_presentacion(id_pp, tipo_parametro, lim_inf, lim_sup):
@@ -244,18 +186,193 @@ def actualizar_parametro_presentacion(id_pp, tipo_parametro, lim_inf, lim_sup):
                 limiteSuperior = %s
             WHERE idPresentacionParametro = %s
         """, (tipo_parametro, lim_inf, lim_sup, id_pp))
+        cursor.execute("SELECT idParametro, idPresentacion FROM presentacionparametro WHERE idPresentacionParametro = %s", (id_pp,))
+        fila = cursor.fetchone()
+        if fila:
+            registrar_version(cursor, fila[0], fila[1], lim_inf, lim_sup, tipo_parametro)
         conn.commit()
+        invalidar_catalogo()
     finally:
         cursor.close()
         conn.close()
 
 
+# EDICIÓN MASIVA (grilla): sólo las filas modificadas, en una transacción
+
+COLUMNAS_EDITABLES_ESPEC = ["tipoParametro", "unidadMedida", "limiteInferior", "limiteSuperior"]
+
+
+def _normalizar_especificacion(df):
+    df = df.copy()
+    for col in ["limiteInferior", "limiteSuperior"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    df["unidadMedida"] = df["unidadMedida"].fillna("").astype(str).str.strip()
+    # los parámetros tipo check no llevan límites
+    es_check = df["tipoParametro"] == "check"
+    df.loc[es_check, ["limiteInferior", "limiteSuperior"]] = np.nan
+    return df
+
+
+def diferencias_especificacion(original, editado):
+    """Filas de `editado` cuyo tipo, unidad o límites difieren de `original` (por idPresentacionParametro)."""
+    a = _normalizar_especificacion(original).set_index("idPresentacionParametro")[COLUMNAS_EDITABLES_ESPEC]
+    b = _normalizar_especificacion(editado).set_index("idPresentacionParametro")
+    a = a.reindex(b.index)
+    distinto = pd.Series(False, index=b.index)
+    for col in COLUMNAS_EDITABLES_ESPEC:
+        distinto |= ~((a[col] == b[col]) | (a[col].isna() & b[col].isna()))
+    return b[distinto].reset_index()
+
+
+def validar_cambios_especificacion(cambios):
+    """Lista de mensajes de error (vacía si todo es válido)."""
+    errores = []
+    tipo_invalido = ~cambios["tipoParametro"].isin(["numerico", "check"])
+    invertidos = cambios["limiteInferior"] > cambios["limiteSuperior"]
+    for fila in cambios[tipo_invalido].itertuples(index=False):
+        errores.append(f"'{fila.nombreParametro}': tipo de parámetro inválido.")
+    for fila in cambios[invertidos].itertuples(index=False):
+        errores.append(f"'{fila.nombreParametro}': el límite inferior no puede ser mayor al superior.")
+    return errores
+
+
+def actualizar_especificaciones_lote(cambios):
+    """Aplica todas las filas cambiadas (y sus versiones) en una sola transacción."""
+    if cambios.empty:
+        return 0
+    def nativo(v):
+        return None if pd.isna(v) else float(v)
+    filas = [
+        (f.tipoParametro, nativo(f.limiteInferior), nativo(f.limiteSuperior), f.unidadMedida or None,
+            int(f.idPresentacionParametro))
+        for f in cambios.itertuples(index=False)
+    ]
+    versiones = [
+        (int(f.idParametro), int(f.idPresentacion), nativo(f.limiteInferior), nativo(f.limiteSuperior), f.tipoParametro)
+        for f in cambios.itertuples(index=False)
+    ]
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.executemany("""
+            UPDATE presentacionparametro
+            SET tipoParametro = %s,
+                limiteInferior = %s,
+                limiteSuperior = %s,
+                unidadMedida = %s
+            WHERE idPresentacionParametro = %s
+        """, filas)
+        registrar_versiones(cursor, versiones)
+        conn.commit()
+        invalidar_catalogo()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+    return len(filas)
+
+
+# CLONAR ESPECIFICACIÓN: origen → varias presentaciones, con ajustes opcionales
+
+def _tabla_derivada(filas, columnas):
+    """SELECT %s AS c1, ... UNION ALL SELECT %s, ... y sus parámetros (filas no vacías)."""
+    primera = "SELECT " + ", ".join(f"%s AS {c}" for c in columnas)
+    resto = " UNION ALL SELECT " + ", ".join(["%s"] * len(columnas))
+    sql = primera + resto * (len(filas) - 1)
+    return sql, tuple(v for fila in filas for v in fila)
+
+
+def clonar_especificacion(id_origen, destinos, ajustes=None):
+    """
+    Copia los parámetros de la presentación `id_origen` a cada presentación de
+    `destinos` con un INSERT ... SELECT (los ya asignados en el destino se omiten).
+    `ajustes`: {idParametro: {"tipoParametro", "limiteInferior", "limiteSuperior", "unidadMedida"}}
+    reemplaza valores del origen (None = conservar). Versiones en la misma transacción.
+    Devuelve la cantidad de filas creadas.
+    """
+    destinos = sorted({int(d) for d in destinos if int(d) != int(id_origen)})
+    if not destinos:
+        return 0
+    ajustes = ajustes or {}
+    for id_param, a in ajustes.items():
+        li, ls = a.get("limiteInferior"), a.get("limiteSuperior")
+        if li is not None and ls is not None and float(li) > float(ls):
+            raise ValueError(f"Parámetro {id_param}: el límite inferior no puede ser mayor al superior.")
+
+    sql_dest, params_dest = _tabla_derivada([(d,) for d in destinos], ["idDestino"])
+    filas_aj = [
+        (int(k), a.get("tipoParametro"), a.get("limiteInferior"), a.get("limiteSuperior"), a.get("unidadMedida"))
+        for k, a in ajustes.items()
+    ] or [(None, None, None, None, None)]
+    sql_aj, params_aj = _tabla_derivada(filas_aj, ["idParametro", "tipo", "inf", "sup", "unidad"])
+
+    seleccion = f"""
+        SELECT t.idDestino AS idPresentacion, src.idParametro AS idParametro,
+                CASE WHEN COALESCE(aj.tipo, src.tipoParametro) = 'check' THEN NULL
+                    ELSE COALESCE(aj.inf, src.limiteInferior) END AS limiteInferior,
+                CASE WHEN COALESCE(aj.tipo, src.tipoParametro) = 'check' THEN NULL
+                    ELSE COALESCE(aj.sup, src.limiteSuperior) END AS limiteSuperior,
+                COALESCE(aj.tipo, src.tipoParametro) AS tipoParametro,
+                COALESCE(aj.unidad, src.unidadMedida) AS unidadMedida
+        FROM presentacionparametro src
+        CROSS JOIN ({sql_dest}) t
+        LEFT JOIN ({sql_aj}) aj ON aj.idParametro = src.idParametro
+        WHERE src.idPresentacion = %s
+            AND NOT EXISTS (
+                SELECT 1 FROM presentacionparametro x
+                WHERE x.idPresentacion = t.idDestino AND x.idParametro = src.idParametro
+            )
+    """
+    params = params_dest + params_aj + (int(id_origen),)
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        # versiones primero: el NOT EXISTS aún ve los destinos sin las filas nuevas
+        cursor.execute(f"""
+            INSERT INTO versionespecificacion
+            (idPresentacion, idParametro, limiteInferior, limiteSuperior, tipoParametro, vigenteDesde)
+            SELECT c.idPresentacion, c.idParametro, c.limiteInferior, c.limiteSuperior, c.tipoParametro, NOW()
+            FROM ({seleccion}) c
+        """, params)
+        cursor.execute(f"""
+            INSERT INTO presentacionparametro
+            (idPresentacion, idParametro, limiteInferior, limiteSuperior, tipoParametro, unidadMedida)
+            SELECT c.idPresentacion, c.idParametro, c.limiteInferior, c.limiteSuperior, c.tipoParametro, c.unidadMedida
+            FROM ({seleccion}) c
+        """, params)
+        creadas = cursor.rowcount
+        refrescar_requeridos(cursor, destinos)
+        conn.commit()
+        invalidar_catalogo()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+    return creadas
+
+
 def eliminar_parametro_presentacion(id_pp):
     conn = get_connection()
     cursor = conn.cursor()
     try:
+        cursor.execute("SELECT idParametro, idPresentacion FROM presentacionparametro WHERE idPresentacionParametro = %s",
+                        (id_pp,))
+        fila = cursor.fetchone()
         cursor.execute("DELETE FROM presentacionparametro WHERE idPresentacionParametro = %s", (id_pp,))
+        if fila:
+            # versión sin límites: desde ahora rige el límite general del parámetro
+            registrar_version(cursor, fila[0], fila[1], None, None, None)
+            refrescar_requeridos(cursor, [fila[1]])
         conn.commit()
+        invalidar_catalogo()
+    except Exception:
+        conn.rollback()
+        raise
     finally:
         cursor.close()
         conn.close()
@@ -454,47 +571,60 @@ def configurar_parametros():
                     st.write("Unidades:", ", ".join(map(str, unidades[:6])))
 
                 st.markdown("---")
-                st.markdown("### Lista y acciones (editar / eliminar)")
-
-                # Iterar y mostrar cada parámetro como un 'card' (expander) con formulario de edición y botón eliminar
-                for i, row in df_assigned.reset_index(drop=True).iterrows():
-                    pid = int(row["idParametro"])
-                    id_pp = int(row["idPresentacionParametro"])
-                    nombre_p = row["nombreParametro"]
-                    tipo_p = row["tipoParametro"]
-                    unidad_p = row["unidadMedida"] if pd.notna(row["unidadMedida"]) else ""
-                    lim_inf_p = None if pd.isna(row["limiteInferior"]) else float(row["limiteInferior"])
-                    lim_sup_p = None if pd.isna(row["limiteSuperior"]) else float(row["limiteSuperior"])
-
-                    with st.expander(f"{nombre_p}  —  tipo: {tipo_p}"):
-                        colL, colR = st.columns([3,1])
-                        with colL:
-                            st.write(f"Unidad: **{unidad_p or '—'}**")
-                            st.write(f"Límite inferior: **{lim_inf_p if lim_inf_p is not None else '—'}**")
-                            st.write(f"Límite superior: **{lim_sup_p if lim_sup_p is not None else '—'}**")
-                            st.write("---")
-                            # Form de edición en línea
-                            with st.form(key=f"form_edit_pp_{id_pp}", clear_on_submit=False):
-                                nuevo_tipo = st.selectbox("Tipo de parámetro", ["numerico", "check"], index=0 if tipo_p == "numerico" else 1, key=f"tipo_{id_pp}")
-                                if nuevo_tipo == "numerico":
-                                    new_inf = st.number_input("Límite inferior", value=lim_inf_p if lim_inf_p is not None else 0.0, format="%.4f", key=f"inf_{id_pp}")
-                                    new_sup = st.number_input("Límite superior", value=lim_sup_p if lim_sup_p is not None else 0.0, format="%.4f", key=f"sup_{id_pp}")
-                                else:
-                                    new_inf = None
-                                    new_sup = None
-                                submitted = st.form_submit_button("Guardar cambios", use_container_width=True, key=f"guardar_pp_{id_pp}")
-                                if submitted:
-                                    if nuevo_tipo == "numerico" and new_inf is not None and new_sup is not None and new_inf > new_sup:
-                                        st.warning("Límite inferior no puede ser mayor al superior.")
-                                    else:
-                                        actualizar_parametro_presentacion(id_pp, nuevo_tipo, new_inf, new_sup)
-                                        st.success("Parámetro actualizado.")
-                                        st.rerun()
-                        with colR:
-                            if st.button("Eliminar parámetro", key=f"del_pp_{id_pp}"):
-                                eliminar_parametro_presentacion(id_pp)
-                                st.success("Parámetro eliminado.")
-                                st.rerun()
+                st.markdown("### Editar especificación (todas las filas, un solo guardado)")
+
+                df_edit = df_assigned.reset_index(drop=True)
+                df_edit = df_edit.assign(idPresentacion=id_presentacion)[
+                    ["idPresentacionParametro", "idParametro", "idPresentacion", "nombreParametro"] + COLUMNAS_EDITABLES_ESPEC]
+                with st.form(f"form_editor_espec_{id_presentacion}_{id_tipo}"):
+                    editado = st.data_editor(
+                        df_edit,
+                        key=f"editor_espec_{id_presentacion}_{id_tipo}",
+                        hide_index=True,
+                        use_container_width=True,
+                        num_rows="fixed",
+                        disabled=["idPresentacionParametro", "idParametro", "idPresentacion", "nombreParametro"],
+                        column_config={
+                            "idPresentacionParametro": None,
+                            "idParametro": None,
+                            "idPresentacion": None,
+                            "nombreParametro": st.column_config.TextColumn("Parámetro"),
+                            "tipoParametro": st.column_config.SelectboxColumn("Tipo", options=["numerico", "check"], required=True),
+                            "unidadMedida": st.column_config.TextColumn("Unidad"),
+                            "limiteInferior": st.column_config.NumberColumn("Límite inferior", format="%.4f"),
+                            "limiteSuperior": st.column_config.NumberColumn("Límite superior", format="%.4f"),
+                        },
+                    )
+                    guardar_grilla = st.form_submit_button("Guardar cambios", use_container_width=True)
+
+                if guardar_grilla:
+                    cambios = diferencias_especificacion(df_edit, editado)
+                    errores = validar_cambios_especificacion(cambios)
+                    if cambios.empty:
+                        st.info("No hay cambios para guardar.")
+                    elif errores:
+                        for e in errores:
+                            st.warning(e)
+                    else:
+                        try:
+                            n = actualizar_especificaciones_lote(cambios)
+                            st.success(f"{n} parámetro(s) actualizados.")
+                            st.rerun()
+                        except Exception as e:
+                            st.error(f"Error guardando cambios (no se aplicó ninguno): {e}")
+
+                # Eliminar parámetro asignado
+                col_del, col_btn = st.columns([3, 1])
+                with col_del:
+                    opciones_del = {f"{r.nombreParametro} (ID {int(r.idPresentacionParametro)})": int(r.idPresentacionParametro)
+                                    for r in df_edit.itertuples(index=False)}
+                    sel_del = st.selectbox("Eliminar parámetro de la presentación", ["— Seleccionar —"] + list(opciones_del.keys()),
+                                            key=f"del_pp_sel_{id_presentacion}_{id_tipo}")
+                with col_btn:
+                    if st.button("Eliminar parámetro", key=f"del_pp_{id_presentacion}_{id_tipo}") and sel_del != "— Seleccionar —":
+                        eliminar_parametro_presentacion(opciones_del[sel_del])
+                        st.success("Parámetro eliminado.")
+                        st.rerun()
 
                 st.markdown("---")
                 st.markdown("### Exportar / Tabla completa")
@@ -505,5 +635,60 @@ def configurar_parametros():
                 csv = df_assigned.to_csv(index=False).encode('utf-8')
                 st.download_button("Descargar CSV (asignados)", data=csv, file_name="parametros_asignados.csv", mime="text/csv")
 
+            # Clonar la especificación completa (todos los tipos) a otras presentaciones
+            otras = {p[1]: p[0] for p in presentaciones if p[0] != id_presentacion}
+            if not df_assigned_full.empty and otras:
+                with st.expander("Clonar especificación de esta presentación a otras"):
+                    with st.form(f"form_clonar_{id_presentacion}"):
+                        destinos_sel = st.multiselect("Presentaciones destino", list(otras.keys()))
+                        st.caption("Opcional: ajuste valores para los destinos (sólo se aplican las celdas modificadas).")
+                        df_origen = df_assigned_full.reset_index(drop=True)[
+                            ["idPresentacionParametro", "idParametro", "nombreParametro"] + COLUMNAS_EDITABLES_ESPEC]
+                        ajustado = st.data_editor(
+                            df_origen,
+                            key=f"editor_clonar_{id_presentacion}",
+                            hide_index=True,
+                            use_container_width=True,
+                            num_rows="fixed",
+                            disabled=["idPresentacionParametro", "idParametro", "nombreParametro"],
+                            column_config={
+                                "idPresentacionParametro": None,
+                                "idParametro": None,
+                                "nombreParametro": st.column_config.TextColumn("Parámetro"),
+                                "tipoParametro": st.column_config.SelectboxColumn("Tipo", options=["numerico", "check"], required=True),
+                                "unidadMedida": st.column_config.TextColumn("Unidad"),
+                                "limiteInferior": st.column_config.NumberColumn("Límite inferior", format="%.4f"),
+                                "limiteSuperior": st.column_config.NumberColumn("Límite superior", format="%.4f"),
+                            },
+                        )
+                        clonar = st.form_submit_button("Clonar especificación")
+                    if clonar:
+                        if not destinos_sel:
+                            st.warning("Seleccione al menos una presentación destino.")
+                        else:
+                            cambios = diferencias_especificacion(df_origen, ajustado)
+                            errores = validar_cambios_especificacion(cambios)
+                            if errores:
+                                for e in errores:
+                                    st.warning(e)
+                            else:
+                                ajustes = {
+                                    int(f.idParametro): {
+                                        "tipoParametro": f.tipoParametro,
+                                        "limiteInferior": None if pd.isna(f.limiteInferior) else float(f.limiteInferior),
+                                        "limiteSuperior": None if pd.isna(f.limiteSuperior) else float(f.limiteSuperior),
+                                        "unidadMedida": f.unidadMedida or None,
+                                    }
+                                    for f in cambios.itertuples(index=False)
+                                }
+                                try:
+                                    n = clonar_especificacion(id_presentacion, [otras[d] for d in destinos_sel], ajustes)
+                                    st.success(f"Se crearon {n} asignaciones en {len(destinos_sel)} presentación(es). "
+                                                "Los parámetros ya asignados en el destino no se modificaron.")
+                                except ValueError as ve:
+                                    st.warning(str(ve))
+                                except Exception as e:
+                                    st.error(f"Error clonando la especificación (no se aplicó ningún cambio): {e}")
+
 if __name__ == "__main__":
     configurar_parametros()
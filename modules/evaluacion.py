@@ -0,0 +1,145 @@
+import numpy as np
+import pandas as pd
+from modules.episodios import actualizar_episodios
+
+# MOTOR DE EVALUACIÓN DE ESPECIFICACIONES
+#
+# Una sola llamada vectorizada para cualquier cantidad de mediciones, usada por
+# el registro manual, las importaciones masivas y la re-evaluación:
+#   - numérico: fuera de rango si resultado < limiteInferior o > limiteSuperior
+#     (sólo cuando ambos límites existen, como en el registro original)
+#   - check: no cumplido si resultado == 0
+# Las comparaciones se hacen en float64, con los límites tal como están en la
+# base (igual que las vistas); desviacion/desviacion_relativa se devuelven en float32.
+
+ALERTA_FUERA_RANGO = "Fuera de Rango"
+ALERTA_CHECK = "Check NO cumplido"
+TIPOS_ALERTA_ESPEC = (ALERTA_FUERA_RANGO, ALERTA_CHECK)
+
+Q_INSERTAR_ALERTA = """
+    INSERT INTO alerta
+    (tipoAlerta, descripcion, idControl, idOrdenTrabajo, idLinea, idParametro, idPresentacion,
+        valorFuera, limiteInferior, limiteSuperior, fechaAlerta, estado)
+    VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,NOW(),%s)
+"""
+
+
+def evaluar_mediciones(resultado, tipo_parametro, limite_inferior, limite_superior):
+    """
+    Arrays (o Series) alineados → DataFrame con:
+      cumple (bool), desviacion (cuánto excede el límite más cercano, 0 si cumple),
+      desviacion_relativa (desviacion / ancho del rango) y tipoAlerta (None si cumple).
+    """
+    valor = pd.to_numeric(pd.Series(resultado, copy=False), errors="coerce").to_numpy(dtype="float64")
+    li = pd.to_numeric(pd.Series(limite_inferior, copy=False), errors="coerce").to_numpy(dtype="float64")
+    ls = pd.to_numeric(pd.Series(limite_superior, copy=False), errors="coerce").to_numpy(dtype="float64")
+    es_check = pd.Series(tipo_parametro, copy=False).to_numpy() == "check"
+
+    con_limites = ~es_check & ~np.isnan(li) & ~np.isnan(ls)
+    with np.errstate(invalid="ignore"):
+        bajo = con_limites & (valor < li)
+        alto = con_limites & (valor > ls)
+        check_fallido = es_check & (valor == 0)
+        desviacion = np.where(bajo, li - valor, np.where(alto, valor - ls, 0)).astype("float32")
+        ancho = ls - li
+        relativa = np.where(con_limites & (ancho > 0), desviacion / np.where(ancho > 0, ancho, 1), np.nan)
+    no_cumple = bajo | alto | check_fallido
+
+    tipo_alerta = np.full(len(valor), None, dtype=object)
+    tipo_alerta[bajo | alto] = ALERTA_FUERA_RANGO
+    tipo_alerta[check_fallido] = ALERTA_CHECK
+    return pd.DataFrame({
+        "cumple": ~no_cumple,
+        "desviacion": desviacion,
+        "desviacion_relativa": relativa.astype("float32"),
+        "tipoAlerta": tipo_alerta,
+    })
+
+
+def evaluar(df):
+    """`df` con resultado, tipoParametro, limiteInferior, limiteSuperior → copia con las columnas de evaluación."""
+    ev = evaluar_mediciones(df["resultado"], df["tipoParametro"], df["limiteInferior"], df["limiteSuperior"])
+    ev.index = df.index
+    return df.drop(columns=[c for c in ev.columns if c in df.columns]).join(ev)
+
+
+def _nativo(v, decimales=None):
+    if v is None or (not isinstance(v, str) and pd.isna(v)):
+        return None
+    if isinstance(v, (float, np.floating)):
+        return round(float(v), decimales) if decimales is not None else float(v)
+    if isinstance(v, (int, np.integer)):
+        return int(v)
+    return v
+
+
+def _formato(v):
+    return "-" if v is None else f"{v:g}"
+
+
+def payloads_alerta(evaluado, sufijo="", estado="pendiente"):
+    """
+    Filas para Q_INSERTAR_ALERTA a partir de las mediciones que no cumplen.
+    Requiere idControl, idOrdenTrabajo, idLinea, idParametro, idPresentacion,
+    nombreParametro y codigoOrden además de las columnas de evaluar().
+    """
+    fallidas = evaluado[~evaluado["cumple"]]
+    filas = []
+    for f in fallidas.itertuples(index=False):
+        valor = _nativo(f.resultado)
+        li, ls = _nativo(f.limiteInferior, 4), _nativo(f.limiteSuperior, 4)
+        if f.tipoAlerta == ALERTA_CHECK:
+            descripcion = f"Check NO cumplido — parámetro '{f.nombreParametro}' en orden {f.codigoOrden}{sufijo}"
+            valor, li, ls = 0, None, None
+        else:
+            descripcion = (f"Parámetro '{f.nombreParametro}' fuera de rango: {valor} "
+                            f"(permitido {_formato(li)} - {_formato(ls)}) — Orden {f.codigoOrden}{sufijo}")
+        filas.append((f.tipoAlerta, descripcion, _nativo(f.idControl), _nativo(f.idOrdenTrabajo), _nativo(f.idLinea),
+                        _nativo(f.idParametro), _nativo(f.idPresentacion), valor, li, ls, estado))
+    return filas
+
+
+def guardar_alertas(cursor, filas):
+    """
+    Inserta las filas de payloads_alerta() con un solo executemany y actualiza
+    los episodios de alerta (sin commit).
+    """
+    if filas:
+        cursor.executemany(Q_INSERTAR_ALERTA, filas)
+        actualizar_episodios(cursor, filas)
+    return len(filas)
+
+
+def _benchmark(n=100_000, repeticiones=5):
+    import time
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "idControl": np.arange(1, n + 1),
+        "idOrdenTrabajo": rng.integers(1, 500, n),
+        "idLinea": rng.integers(1, 5, n),
+        "idParametro": rng.integers(1, 60, n),
+        "idPresentacion": rng.integers(1, 40, n),
+        "nombreParametro": "Parámetro",
+        "codigoOrden": "OT-0001",
+        "resultado": rng.normal(10, 1.2, n).astype("float32"),
+        "tipoParametro": np.where(rng.random(n) < 0.2, "check", "numerico"),
+        "limiteInferior": 8.0,
+        "limiteSuperior": 12.0,
+    })
+    df.loc[df["tipoParametro"] == "check", "resultado"] = rng.integers(0, 2, (df["tipoParametro"] == "check").sum())
+
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        evaluado = evaluar(df)
+        tiempos.append(time.perf_counter() - t0)
+    t0 = time.perf_counter()
+    filas = payloads_alerta(evaluado)
+    t_payload = time.perf_counter() - t0
+    mejor = min(tiempos)
+    print(f"evaluar(): {n} mediciones en {mejor * 1000:.1f} ms ({n / mejor:,.0f} mediciones/s, mejor de {repeticiones})")
+    print(f"payloads_alerta(): {len(filas)} alertas en {t_payload * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    _benchmark()
@@ -0,0 +1,20 @@
+import pandas as pd
+
+# FECHAS DE ARCHIVOS IMPORTADOS
+#
+# Los equipos de laboratorio y las celdas de fecha de Excel (leídas como texto)
+# entregan ISO 8601 ("2024-05-01 10:00:03", "2024-05-01T10:00:03"); los planes
+# cargados a mano, dd/mm/aaaa. Con dayfirst=True pandas también invierte día y
+# mes en las fechas ISO, así que primero se interpreta ISO y sólo lo que no lo es
+# se lee como dd/mm.
+
+
+def parsear_fechas(valores):
+    """Serie de fechas (texto, datetime o nulos) → datetime64; NaT si no se reconoce."""
+    valores = pd.Series(valores, copy=False)
+    fechas = pd.to_datetime(valores, errors="coerce", format="ISO8601")
+    pendientes = fechas.isna() & valores.notna()
+    if pendientes.any():
+        # format="mixed": cada valor por separado (no se infiere un único formato del primero)
+        fechas[pendientes] = pd.to_datetime(valores[pendientes], errors="coerce", format="mixed", dayfirst=True)
+    return fechas
@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+
+# FILTROS DECLARATIVOS
+#
+# Un filtro es una tupla de condiciones (columna, operador, valor). La misma
+# especificación se traduce a:
+#   - a_sql(...)     -> un único WHERE parametrizado (para empujar el filtro a MySQL)
+#   - a_mascara(...) -> una única máscara booleana (para datos ya en memoria)
+#   - aplicar(...)   -> df[mascara], una sola copia en lugar de una por filtro
+# "contiene" e "igual_texto" no distinguen mayúsculas (como el resto de la
+# aplicación al comparar textos ingresados a mano, p. ej. el día de la orden).
+# Las condiciones con valor None se ignoran ("Todas"/"Todos"). Al ser tuplas,
+# las especificaciones son hashables y sirven como clave de st.cache_data.
+
+OPERADORES = ("=", "!=", "in", ">=", "<=", ">", "<", "contiene", "igual_texto", "fecha")
+
+
+def condicion(columna, operador, valor):
+    if operador not in OPERADORES:
+        raise ValueError(f"Operador de filtro no soportado: {operador}")
+    if operador == "in" and valor is not None:
+        valor = tuple(valor)
+    return (columna, operador, valor)
+
+
+def filtro(*condiciones):
+    """Arma la especificación descartando las condiciones sin valor."""
+    return tuple(c for c in condiciones if c is not None and c[2] is not None)
+
+
+def _escapar_like(texto):
+    return str(texto).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def a_sql(spec, columnas=None):
+    """
+    Devuelve (where, params). `columnas` traduce nombres lógicos a expresiones
+    SQL (p. ej. {"idTipoControl": "c.idTipoControl"}).
+    """
+    columnas = columnas or {}
+    partes = []
+    params = []
+    for columna, operador, valor in spec:
+        if valor is None:
+            continue
+        expr = columnas.get(columna, columna)
+        if operador == "in":
+            if len(valor) == 0:
+                partes.append("1 = 0")
+                continue
+            partes.append(f"{expr} IN ({', '.join(['%s'] * len(valor))})")
+            params.extend(valor)
+        elif operador == "contiene":
+            partes.append(f"{expr} LIKE %s")
+            params.append(f"%{_escapar_like(valor)}%")
+        elif operador == "igual_texto":
+            partes.append(f"LOWER({expr}) = LOWER(%s)")
+            params.append(str(valor))
+        elif operador == "fecha":
+            partes.append(f"DATE({expr}) = %s")
+            params.append(valor)
+        else:
+            partes.append(f"{expr} {'<>' if operador == '!=' else operador} %s")
+            params.append(valor)
+    where = ("WHERE " + " AND ".join(partes)) if partes else ""
+    return where, tuple(params)
+
+
+def a_mascara(spec, df):
+    """Máscara booleana combinada (numpy) para todas las condiciones de `spec`."""
+    mascara = np.ones(len(df), dtype=bool)
+    for columna, operador, valor in spec:
+        if valor is None:
+            continue
+        serie = df[columna]
+        if operador == "=":
+            m = serie == valor
+        elif operador == "!=":
+            m = serie.notna() & (serie != valor)
+        elif operador == "in":
+            m = serie.notna() & serie.isin(valor)
+        elif operador == "contiene":
+            m = serie.astype("string").str.contains(str(valor), case=False, regex=False)
+        elif operador == "igual_texto":
+            m = serie.astype("string").str.lower() == str(valor).lower()
+        elif operador == "fecha":
+            m = pd.to_datetime(serie).dt.date == valor
+        else:
+            comparar = {">=": serie.ge, "<=": serie.le, ">": serie.gt, "<": serie.lt}[operador]
+            m = comparar(valor)
+        # NULL nunca cumple una condición, igual que en SQL
+        mascara &= m.to_numpy(dtype=bool, na_value=False)
+    return mascara
+
+
+def aplicar(spec, df):
+    """Filtra `df` con una sola pasada y una sola copia."""
+    if not spec:
+        return df
+    return df[a_mascara(spec, df)]
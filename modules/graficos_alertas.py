@@ -2,62 +2,83 @@ import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
 from database.db_connection import get_connection
-from datetime import datetime
+from modules.cascada import obtener_indice_catalogo, opciones
+from modules.filtros import filtro, condicion, a_sql
+from modules.episodios import obtener_episodios
+from datetime import datetime, timedelta
 
 #   CONSULTAS A BASE DE DATOS
 
-def obtener_alertas():
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("""
-        SELECT a.idAlerta, a.tipoAlerta, a.descripcion, a.idControl, a.idParametro,
-                a.idLinea, a.idDetalle, a.valorFuera, a.limiteInferior, a.limiteSuperior,
-                a.fechaAlerta, a.estado, a.idOrdenTrabajo, a.idPresentacion,
-                c.resultado, c.fechaControl, c.idTipoControl
-        FROM alerta a
-        LEFT JOIN controlcalidad c ON a.idControl = c.idControl
-        ORDER BY a.fechaAlerta DESC;
-    """)
-    data = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return pd.DataFrame(data)
+# Nombres lógicos de filtro -> columnas SQL de la consulta de alertas
+COLUMNAS_ALERTAS = {
+    "fechaAlerta": "a.fechaAlerta",
+    "idLinea": "a.idLinea",
+    "idPresentacion": "a.idPresentacion",
+    "idTipoControl": "c.idTipoControl",
+    "idParametro": "a.idParametro",
+}
 
-def obtener_lineas():
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT idLinea, nombreLinea FROM lineaproduccion ORDER BY nombreLinea;")
-    data = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return data
 
-def obtener_presentaciones():
+@st.cache_data(ttl=60)
+def obtener_rango_fechas_alertas():
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT idPresentacion, nombrePresentacion, idLinea FROM presentacionproducto ORDER BY nombrePresentacion;")
-    data = cursor.fetchall()
+    cursor.execute("SELECT MIN(fechaAlerta), MAX(fechaAlerta) FROM alerta;")
+    data = cursor.fetchone()
     cursor.close()
     conn.close()
     return data
 
-def obtener_tipos_control():
+
+@st.cache_data(ttl=60)
+def obtener_resumen_alertas(filtros):
+    """
+    Conteos agrupados por día, línea, parámetro y estado en una sola consulta.
+    Los KPIs y los gráficos de barras se derivan de este resultado (pequeño).
+    El cache se indexa por la especificación de filtros (ver modules.filtros).
+    """
+    where, params = a_sql(filtros, COLUMNAS_ALERTAS)
     conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT idTipoControl, nombreTipo, idLinea FROM tipocontrol ORDER BY nombreTipo;")
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(f"""
+        SELECT DATE(a.fechaAlerta) AS dia, a.idLinea, a.idParametro, a.estado,
+                COUNT(*) AS total,
+                SUM(a.valorFuera IS NOT NULL) AS fueraLimite
+        FROM alerta a
+        LEFT JOIN controlcalidad c ON a.idControl = c.idControl
+        {where}
+        GROUP BY DATE(a.fechaAlerta), a.idLinea, a.idParametro, a.estado;
+    """, params)
     data = cursor.fetchall()
     cursor.close()
     conn.close()
-    return data
+    df = pd.DataFrame(data, columns=["dia", "idLinea", "idParametro", "estado", "total", "fueraLimite"])
+    df["total"] = df["total"].astype(int)
+    df["fueraLimite"] = df["fueraLimite"].fillna(0).astype(int)
+    return df
+
 
-def obtener_parametros():
+@st.cache_data(ttl=60)
+def obtener_alertas(filtros, limite=1000):
+    """Sólo las `limite` alertas más recientes del filtro (para dispersión y detalle)."""
+    where, params = a_sql(filtros, COLUMNAS_ALERTAS)
     conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT idParametro, nombreParametro, idTipoControl FROM parametrocalidad ORDER BY nombreParametro;")
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(f"""
+        SELECT a.idAlerta, a.tipoAlerta, a.descripcion, a.idControl, a.idParametro,
+                a.idLinea, a.idDetalle, a.valorFuera, a.limiteInferior, a.limiteSuperior,
+                a.fechaAlerta, a.estado, a.idOrdenTrabajo, a.idPresentacion,
+                c.resultado, c.fechaControl, c.idTipoControl
+        FROM alerta a
+        LEFT JOIN controlcalidad c ON a.idControl = c.idControl
+        {where}
+        ORDER BY a.fechaAlerta DESC
+        LIMIT %s;
+    """, params + (int(limite),))
     data = cursor.fetchall()
     cursor.close()
     conn.close()
-    return data
+    return pd.DataFrame(data)
 
 #   MÓDULO PRINCIPAL DE GRÁFICOS
 
@@ -67,78 +88,71 @@ def ver_graficos_alertas():
     st.caption("Monitoreo de desviaciones fuera de límites")
     st.markdown("---")
 
-    df = obtener_alertas()
-    if df.empty:
+    min_fecha, max_fecha = obtener_rango_fechas_alertas()
+    if min_fecha is None:
         st.warning("No hay alertas registradas.")
         return
 
-    df["fechaAlerta"] = pd.to_datetime(df["fechaAlerta"])
-
     # Sidebar: Filtros en cascada
     st.sidebar.header("Filtros de Alertas")
 
-    min_fecha = df["fechaAlerta"].min()
-    max_fecha = df["fechaAlerta"].max()
-
-    rango = st.sidebar.date_input("Rango de fechas", [min_fecha, max_fecha])
+    rango = st.sidebar.date_input("Rango de fechas", [pd.to_datetime(min_fecha).date(), pd.to_datetime(max_fecha).date()])
+    ini, fin = None, None
     if len(rango) == 2:
-        ini, fin = rango
-        df = df[(df["fechaAlerta"] >= pd.to_datetime(ini)) & (df["fechaAlerta"] <= pd.to_datetime(fin))]
+        ini = datetime.combine(rango[0], datetime.min.time())
+        fin = datetime.combine(rango[1], datetime.min.time()) + timedelta(days=1)
 
-    # Línea
-    lineas = obtener_lineas()
-    opciones_linea = {nombre: id for id, nombre in lineas}
-    linea = st.sidebar.selectbox("Línea", ["Todas"] + list(opciones_linea.keys()))
-    linea_id = opciones_linea.get(linea) if linea != "Todas" else None
+    indice = obtener_indice_catalogo()
+    nombres = indice["etiquetas"]
+    nombres_linea = nombres.get("idLinea", {})
+    nombres_pres = nombres.get("idPresentacion", {})
+    nombres_tipo = nombres.get("idTipoControl", {})
+    nombres_param = nombres.get("idParametro", {})
 
-    if linea_id:
-        df = df[df["idLinea"] == linea_id]
+    # Línea
+    linea_id = st.sidebar.selectbox("Línea", [None] + opciones(indice, "idLinea"),
+                                    format_func=lambda x: "Todas" if x is None else nombres_linea.get(x, str(x)))
 
     # Presentación
-    presentaciones = obtener_presentaciones()
-    if linea_id:
-        presentaciones = [p for p in presentaciones if p[2] == linea_id]
-
-    opciones_pres = {nombre: id for id, nombre, _ in presentaciones}
-    presentacion = st.sidebar.selectbox("Presentación", ["Todas"] + list(opciones_pres.keys()))
-    pres_id = opciones_pres.get(presentacion) if presentacion != "Todas" else None
-
-    if pres_id:
-        df = df[df["idPresentacion"] == pres_id]
+    pres_id = st.sidebar.selectbox("Presentación", [None] + opciones(indice, "idPresentacion", {"idLinea": linea_id}),
+                                    format_func=lambda x: "Todas" if x is None else nombres_pres.get(x, str(x)))
 
     # Tipo de Control
-    tipos = obtener_tipos_control()
-    if linea_id:
-        tipos = [t for t in tipos if t[2] == linea_id]
-
-    opciones_tipo = {nombre: id for id, nombre, _ in tipos}
-    tipo_control = st.sidebar.selectbox("Tipo de Control", ["Todos"] + list(opciones_tipo.keys()))
-    tipo_id = opciones_tipo.get(tipo_control) if tipo_control != "Todos" else None
-
-    if tipo_id:
-        df = df[df["idTipoControl"] == tipo_id]
+    tipo_id = st.sidebar.selectbox("Tipo de Control", [None] + opciones(indice, "idTipoControl", {"idLinea": linea_id}),
+                                    format_func=lambda x: "Todos" if x is None else nombres_tipo.get(x, str(x)))
 
     # Parámetro
-    parametros = obtener_parametros()
-    if tipo_id:
-        parametros = [p for p in parametros if p[2] == tipo_id]
-
-    opciones_param = {nombre: id for id, nombre, _ in parametros}
-    parametro = st.sidebar.selectbox("Parámetro", ["Todos"] + list(opciones_param.keys()))
-
-    if parametro != "Todos":
-        df = df[df["idParametro"] == opciones_param[parametro]]
+    param_id = st.sidebar.selectbox("Parámetro", [None] + opciones(indice, "idParametro", {"idTipoControl": tipo_id}),
+                                    format_func=lambda x: "Todos" if x is None else nombres_param.get(x, str(x)))
+
+    limite = st.sidebar.number_input("Máx. alertas en detalle", min_value=100, max_value=20000, value=1000, step=100)
+
+    # fin es inclusivo: se compara contra el inicio del día siguiente
+    filtros = filtro(
+        condicion("fechaAlerta", ">=", ini),
+        condicion("fechaAlerta", "<", fin),
+        condicion("idLinea", "=", linea_id),
+        condicion("idPresentacion", "=", pres_id),
+        condicion("idTipoControl", "=", tipo_id),
+        condicion("idParametro", "=", param_id),
+    )
+    resumen = obtener_resumen_alertas(filtros)
 
     #          KPIs SUPERIORES
+    total = int(resumen["total"].sum())
+    cerradas = int(resumen.loc[resumen["estado"] == "Cerrada", "total"].sum())
+
     col1, col2, col3, col4 = st.columns(4)
 
-    col1.metric("Total Alertas", len(df))
-    col2.metric("Fuera de Límite", df["valorFuera"].notna().sum())
-    col3.metric("Cerradas", df[df["estado"] == "Cerrada"].shape[0] if "estado" in df else 0)
-    col4.metric("Pendientes", df[df["estado"] != "Cerrada"].shape[0] if "estado" in df else 0)
+    col1.metric("Total Alertas", total)
+    col2.metric("Fuera de Límite", int(resumen["fueraLimite"].sum()))
+    col3.metric("Cerradas", cerradas)
+    col4.metric("Pendientes", total - cerradas)
 
     st.markdown("---")
 
+    df = obtener_alertas(filtros, int(limite))
+
     #        GRÁFICOS EN 2 COLUMNAS
     colA, colB = st.columns(2)
 
@@ -146,18 +160,19 @@ def ver_graficos_alertas():
     with colA:
         st.subheader("Alertas fuera de límites")
         fig, ax = plt.subplots()
-        ax.scatter(df["fechaAlerta"], df["valorFuera"])
+        if not df.empty:
+            ax.scatter(pd.to_datetime(df["fechaAlerta"]), df["valorFuera"])
         ax.set_xlabel("Fecha")
         ax.set_ylabel("Valor fuera de rango")
         plt.xticks(rotation=45)
         st.pyplot(fig)
+        if total > len(df):
+            st.caption(f"Mostrando las {len(df)} alertas más recientes de {total}.")
 
     # GRÁFICO BARRAS
     with colB:
         st.subheader("Alertas por día")
-        df_bar = df.copy()
-        df_bar["dia"] = df_bar["fechaAlerta"].dt.date
-        conteo = df_bar.groupby("dia").size()
+        conteo = resumen.groupby("dia")["total"].sum()
 
         fig2, ax2 = plt.subplots()
         ax2.bar(conteo.index, conteo.values)
@@ -166,8 +181,36 @@ def ver_graficos_alertas():
         plt.xticks(rotation=45)
         st.pyplot(fig2)
 
+    colC, colD = st.columns(2)
+
+    with colC:
+        st.subheader("Alertas por línea")
+        por_linea = resumen.groupby("idLinea")["total"].sum().sort_values(ascending=False)
+        fig3, ax3 = plt.subplots()
+        ax3.barh([nombres_linea.get(i, str(i)) for i in por_linea.index], por_linea.values)
+        ax3.set_xlabel("Cantidad")
+        st.pyplot(fig3)
+
+    with colD:
+        st.subheader("Alertas por parámetro")
+        por_param = resumen.groupby("idParametro")["total"].sum().sort_values(ascending=False).head(15)
+        fig4, ax4 = plt.subplots()
+        ax4.barh([nombres_param.get(i, str(i)) for i in por_param.index], por_param.values)
+        ax4.set_xlabel("Cantidad")
+        st.pyplot(fig4)
+
     st.markdown("---")
 
+    #      EPISODIOS (alertas consecutivas agrupadas)
+    st.subheader("Episodios de Alertas")
+    episodios = obtener_episodios(filtros)
+    if episodios.empty:
+        st.info("Sin episodios para el filtro.")
+    else:
+        st.caption(f"{len(episodios)} episodios agrupan {int(episodios['alertas'].sum())} alertas.")
+        st.dataframe(episodios.drop(columns=["idLinea", "idPresentacion", "idParametro", "idDetalle"]),
+                        use_container_width=True)
+
     #      TABLA DE DETALLE
     st.subheader("Detalle de Alertas")
     st.dataframe(df, use_container_width=True)
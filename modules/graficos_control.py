@@ -3,6 +3,11 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 from database.db_connection import get_connection
+from modules.catalogo import obtener_catalogo, version_catalogo
+from modules.datos_control import cargar_controles, adjuntar_nombres, reporte_memoria
+from modules.especificaciones import obtener_versiones, adjuntar_limites_vigentes
+from modules.cascada import indice_cascada, opciones
+from modules.filtros import filtro, condicion, aplicar
 import plotly.graph_objects as go
 from io import BytesIO
 
@@ -16,31 +21,8 @@ D3_N2 = 0.0
 def cargar_tablas():
     conn = get_connection()
     tablas = {}
-    # controles (join parcial para nombres)
-    q_ctrl = """
-    SELECT
-        cc.idControl, cc.fechaControl, cc.idOrdenTrabajo, cc.resultado, cc.observaciones,
-        cc.idUsuario, cc.idParametro, cc.idPresentacion, cc.idTipoControl, cc.idLinea,
-        cc.idDetalle, cc.sabor,
-        p.nombreParametro, p.unidadMedida, p.limiteInferior, p.limiteSuperior,
-        tp.nombreTipo AS nombreTipoControl,
-        l.nombreLinea,
-        d.lote
-    FROM controlcalidad cc
-    LEFT JOIN parametrocalidad p ON cc.idParametro = p.idParametro
-    LEFT JOIN tipocontrol tp ON cc.idTipoControl = tp.idTipoControl
-    LEFT JOIN lineaproduccion l ON cc.idLinea = l.idLinea
-    LEFT JOIN detalleordentrabajo d ON cc.idDetalle = d.idDetalle
-    ;
-    """
-    try:
-        tablas['controles'] = pd.read_sql(q_ctrl, conn, parse_dates=['fechaControl'])
-    except Exception:
-        tablas['controles'] = pd.DataFrame(columns=[
-            'idControl','fechaControl','idOrdenTrabajo','resultado','observaciones','idUsuario',
-            'idParametro','idPresentacion','idTipoControl','idLinea','idDetalle','sabor',
-            'nombreParametro','unidadMedida','limiteInferior','limiteSuperior','nombreTipoControl','nombreLinea','lote'
-        ])
+    # controles: sólo ids/fecha/resultado con tipos compactos (nombres desde el catálogo)
+    tablas['controles'] = cargar_controles(conn)
 
     # presentacionproducto
     try:
@@ -81,6 +63,15 @@ def cargar_tablas():
     conn.close()
     return tablas
 
+@st.cache_resource(ttl=300, max_entries=1)
+def cargar_indice(version):
+    """Índice en cascada sobre el catálogo + combinaciones observadas (ver modules.cascada)."""
+    tablas = cargar_tablas()
+    detalles = tablas['detalleordentrabajo']
+    observados = tablas['controles'][['idLinea', 'idPresentacion', 'idTipoControl', 'idParametro', 'idDetalle']].drop_duplicates()
+    observados['lote'] = observados['idDetalle'].map(detalles.drop_duplicates('idDetalle').set_index('idDetalle')['lote'])
+    return indice_cascada(obtener_catalogo(), observados, detalles, tablas['presentaciontipocontrol'])
+
 # Helper statistics
 def calcular_limits_I_MR(series):
     x = np.array(series.dropna(), dtype=float)
@@ -119,14 +110,21 @@ def plot_I_MR(df_subset, titulo, limite_inf=None, limite_sup=None):
 
     ooc_mask, ooc_indices = detectar_fuera_de_control(y_vals, stats)
 
-    # spec detection
-    spec_mask = np.zeros(len(y_vals), dtype=bool)
-    spec_indices = []
-    if (limite_inf is not None) or (limite_sup is not None):
-        li = -np.inf if limite_inf is None else float(limite_inf)
-        ls = np.inf if limite_sup is None else float(limite_sup)
-        spec_mask = (y_vals < li) | (y_vals > ls)
-        spec_indices = list(np.where(spec_mask)[0])
+    # spec detection: límites por fila (columnas limiteInferior/limiteSuperior, versión
+    # vigente en cada fecha) o, si no vienen, los límites escalares recibidos
+    n = len(y_vals)
+    if 'limiteInferior' in df_subset.columns:
+        li_serie = df_subset['limiteInferior'].astype('float64').to_numpy()
+    else:
+        li_serie = np.full(n, np.nan if limite_inf is None else limite_inf, dtype='float64')
+    if 'limiteSuperior' in df_subset.columns:
+        ls_serie = df_subset['limiteSuperior'].astype('float64').to_numpy()
+    else:
+        ls_serie = np.full(n, np.nan if limite_sup is None else limite_sup, dtype='float64')
+    # misma precisión (float64) que modules.evaluacion, para que gráfico y alertas coincidan
+    y = y_vals.to_numpy()
+    spec_mask = (y < np.where(np.isnan(li_serie), -np.inf, li_serie)) | (y > np.where(np.isnan(ls_serie), np.inf, ls_serie))
+    spec_indices = list(np.where(spec_mask)[0])
 
     # I chart
     fig_i = go.Figure()
@@ -151,13 +149,15 @@ def plot_I_MR(df_subset, titulo, limite_inf=None, limite_sup=None):
     fig_i.add_hline(y=stats['LCL_I'], line=dict(color='red'),
                     annotation_text=f"LCL = {stats['LCL_I']:.3f}", annotation_position="bottom right")
 
-    # spec lines
-    if limite_inf is not None:
-        fig_i.add_hline(y=float(limite_inf), line=dict(color='green', dash='dot'),
-                        annotation_text=f"Spec Límite inferior = {float(limite_inf):.3f}", annotation_position="bottom left")
-    if limite_sup is not None:
-        fig_i.add_hline(y=float(limite_sup), line=dict(color='green', dash='dot'),
-                        annotation_text=f"Spec Límite superior = {float(limite_sup):.3f}", annotation_position="top left")
+    # spec lines (escalón si la especificación cambió dentro del periodo)
+    for serie, nombre, posicion in [(li_serie, "inferior", "bottom left"), (ls_serie, "superior", "top left")]:
+        valores = pd.unique(serie[~np.isnan(serie)])
+        if len(valores) == 1:
+            fig_i.add_hline(y=float(valores[0]), line=dict(color='green', dash='dot'),
+                            annotation_text=f"Spec Límite {nombre} = {float(valores[0]):.3f}", annotation_position=posicion)
+        elif len(valores) > 1:
+            fig_i.add_trace(go.Scatter(x=x_vals, y=serie.astype(float), mode='lines', line_shape='hv',
+                                        line=dict(color='green', dash='dot'), name=f"Spec Límite {nombre} (vigente)"))
 
     fig_i.update_layout(title=f"I Chart — {titulo}", xaxis_title="Fecha", yaxis_title="Valor",
                         height=420, margin=dict(l=50, r=20, t=70, b=60))
@@ -191,11 +191,8 @@ def app_graficos_control():
     tablas = cargar_tablas()
     df = tablas['controles']
     pres_prod = tablas['presentacionproducto']
-    rel_pres_tipo = tablas['presentaciontipocontrol']
     parametros_all = tablas['parametrocalidad']
-    tipocontrol_all = tablas['tipocontrol']
     detalle_ot = tablas['detalleordentrabajo']
-    lineas_all = tablas['lineaproduccion']
 
     if df.empty and parametros_all.empty and pres_prod.empty:
         st.warning("No hay datos ni definiciones en la base de datos.")
@@ -205,105 +202,38 @@ def app_graficos_control():
     with st.sidebar:
         st.header("Filtros")
 
+        indice = cargar_indice(version_catalogo())
+        nombres = indice['etiquetas']
+
         # 1) Línea
-        line_map = {}
-        if not lineas_all.empty:
-            line_map = dict(zip(lineas_all['idLinea'].tolist(), lineas_all['nombreLinea'].tolist()))
-        else:
-            # fallback from controls
-            if not df.empty:
-                tmp = df[['idLinea','nombreLinea']].drop_duplicates().dropna()
-                line_map = dict(zip(tmp['idLinea'].tolist(), tmp['nombreLinea'].tolist()))
-        linea_sel = st.selectbox("1) Línea de producción", options=[None] + list(line_map.keys()),
+        line_map = nombres.get('idLinea', {})
+        linea_sel = st.selectbox("1) Línea de producción", options=[None] + opciones(indice, 'idLinea'),
                                     format_func=lambda x: "Todas" if x is None else line_map.get(x, str(x)),
                                     key="f_linea")
 
-        # 2) Presentación (filtrada por línea si hay datos)
-        if linea_sel is not None and not pres_prod.empty:
-            pres_df = pres_prod[pres_prod['idLinea'] == int(linea_sel)].copy()
-        else:
-            pres_df = pres_prod.copy() if not pres_prod.empty else pd.DataFrame()
-
-        # fallback to presentaciones found in controls or parametros
-        if pres_df.empty:
-            ids_ctrl = df[['idPresentacion']].drop_duplicates().dropna()['idPresentacion'] if not df.empty else pd.Series(dtype='int')
-            ids_param = parametros_all[['idPresentacion']].drop_duplicates().dropna()['idPresentacion'] if not parametros_all.empty else pd.Series(dtype='int')
-            pres_ids = pd.concat([ids_ctrl, ids_param]).drop_duplicates()
-            pres_df = pd.DataFrame({'idPresentacion': pres_ids.astype('Int64')})
-
-        present_options = pres_df['idPresentacion'].dropna().astype(int).unique().tolist()
-        present_map = {}
-        if not pres_prod.empty:
-            present_map = dict(zip(pres_prod['idPresentacion'].astype(int).tolist(), pres_prod['nombrePresentacion'].tolist()))
-        present_sel = st.selectbox("2) Presentación", options=[None] + present_options,
+        # 2) Presentación (filtrada por línea)
+        present_map = nombres.get('idPresentacion', {})
+        present_sel = st.selectbox("2) Presentación", options=[None] + opciones(indice, 'idPresentacion', {'idLinea': linea_sel}),
                                     format_func=lambda x: "Todas" if x is None else present_map.get(int(x), str(x)),
                                     key="f_present")
 
         # 3) Tipo de control (filtrado por presentación o línea)
-        tipo_ids = []
-        if present_sel is not None and not rel_pres_tipo.empty:
-            tipo_ids = rel_pres_tipo[rel_pres_tipo['idPresentacion'] == int(present_sel)]['idTipoControl'].drop_duplicates().astype(int).tolist()
-        elif present_sel is not None:
-            # fallback: tipos presentes en controles o en parametrocalidad para esa presentacion
-            t1 = df[df['idPresentacion'] == int(present_sel)]['idTipoControl'].dropna().astype(int).unique().tolist() if not df.empty else []
-            t2 = parametros_all[parametros_all['idPresentacion'] == int(present_sel)]['idTipoControl'].dropna().astype(int).unique().tolist() if not parametros_all.empty else []
-            tipo_ids = sorted(set(t1 + t2))
-        else:
-            # no present selected: preferir tipos de la línea
-            if linea_sel is not None and not tipocontrol_all.empty:
-                tipo_ids = tipocontrol_all[tipocontrol_all['idLinea'] == int(linea_sel)]['idTipoControl'].drop_duplicates().astype(int).tolist()
-                if not tipo_ids:
-                    tipo_ids = tipocontrol_all['idTipoControl'].drop_duplicates().astype(int).tolist()
-            else:
-                tipo_ids = tipocontrol_all['idTipoControl'].drop_duplicates().astype(int).tolist() if not tipocontrol_all.empty else df['idTipoControl'].drop_duplicates().dropna().astype(int).tolist()
+        tipo_ids = opciones(indice, 'idTipoControl', {'idLinea': linea_sel, 'idPresentacion': present_sel})
+        if not tipo_ids:
+            tipo_ids = opciones(indice, 'idTipoControl', {'idLinea': linea_sel}) or opciones(indice, 'idTipoControl')
 
-        tipo_map = {}
-        if not tipocontrol_all.empty:
-            tipo_map = dict(zip(tipocontrol_all['idTipoControl'].tolist(), tipocontrol_all['nombreTipo'].tolist()))
+        tipo_map = nombres.get('idTipoControl', {})
         tipo_sel = st.selectbox("3) Tipo de control", options=[None] + tipo_ids,
                                 format_func=lambda x: "Todos" if x is None else tipo_map.get(int(x), str(x)),
                                 key="f_tipo")
 
-        # 4) Parámetros filtrados: lógica flexible (OR) para evitar selects vacíos
-        # Primero intentar filtrar por (presentación OR tipo), si queda vacío dar fallback
-        param_candidates = pd.DataFrame()
-        if not parametros_all.empty:
-            tmp = parametros_all.copy()
-            # apply filters if selected
-            mask = pd.Series(True, index=tmp.index)
-            if present_sel is not None:
-                mask_pres = tmp['idPresentacion'] == int(present_sel)
-            else:
-                mask_pres = pd.Series(False, index=tmp.index)
-            if tipo_sel is not None:
-                mask_tipo = tmp['idTipoControl'] == int(tipo_sel)
-            else:
-                mask_tipo = pd.Series(False, index=tmp.index)
-
-            # If both filters present -> accept rows that match either (OR)
-            if present_sel is not None or tipo_sel is not None:
-                mask_or = mask_pres | mask_tipo
-                tmp = tmp[mask_or]
-            # if no filters, tmp = all
-            param_candidates = tmp[['idParametro','nombreParametro']].drop_duplicates()
-        else:
-            # fallback from controls
-            param_candidates = df[['idParametro','nombreParametro']].drop_duplicates()
-
-        # If still empty, widen the search: parameters for the same line, or from controls for same present/tipo
-        if param_candidates.empty:
-            # from controles
-            tmpc = df.copy()
-            if present_sel is not None:
-                tmpc = tmpc[tmpc['idPresentacion'] == int(present_sel)]
-            if tipo_sel is not None:
-                tmpc = tmpc[tmpc['idTipoControl'] == int(tipo_sel)]
-            param_candidates = tmpc[['idParametro','nombreParametro']].drop_duplicates()
-        # final fallback: all parametros
-        if param_candidates.empty and not parametros_all.empty:
-            param_candidates = parametros_all[['idParametro','nombreParametro']].drop_duplicates()
-
-        param_map = {int(r.idParametro): r.nombreParametro for r in param_candidates.itertuples()} if not param_candidates.empty else {}
+        # 4) Parámetros: si la combinación completa queda vacía, se amplía la búsqueda
+        seleccion = {'idLinea': linea_sel, 'idPresentacion': present_sel, 'idTipoControl': tipo_sel}
+        param_ids = (opciones(indice, 'idParametro', seleccion)
+                        or opciones(indice, 'idParametro', {'idPresentacion': present_sel, 'idTipoControl': tipo_sel})
+                        or opciones(indice, 'idParametro'))
+
+        param_map = {pid: nombres.get('idParametro', {}).get(pid, f"Param {pid}") for pid in param_ids}
         param_defaults = list(param_map.keys())[:3] if len(param_map) > 0 else []
         param_sel = st.multiselect("4) Parámetro(s)", options=list(param_map.keys()),
                                     format_func=lambda x: param_map.get(x, str(x)),
@@ -311,14 +241,7 @@ def app_graficos_control():
                                     key="f_param")
 
         # 5) Lote (filtrado)
-        lote_options = []
-        if not detalle_ot.empty:
-            lotes = detalle_ot.copy()
-            if present_sel is not None:
-                lotes = lotes[lotes['idPresentacion'] == int(present_sel)]
-            lote_options = lotes['lote'].dropna().unique().tolist()
-        if not lote_options:
-            lote_options = df['lote'].dropna().unique().tolist() if not df.empty else []
+        lote_options = opciones(indice, 'lote', {'idPresentacion': present_sel}) or opciones(indice, 'lote')
         lote_sel = st.selectbox("Lote", options=[None] + lote_options, format_func=lambda x: "Todos" if x is None else str(x), key="f_lote")
 
         # fecha
@@ -336,29 +259,35 @@ def app_graficos_control():
         agrupar = st.checkbox("Generar gráfico por presentación+línea automáticamente", value=True, key="f_agrupar")
         mostrar_todo = st.checkbox("Mostrar tabla de datos filtrada", value=False, key="f_mostrar")
         download_csv = st.checkbox("Añadir botón para descargar CSV", value=True, key="f_csv")
+        mostrar_memoria = st.checkbox("Mostrar uso de memoria (bytes por fila)", value=False, key="f_memoria")
 
-    # Aplicar filtros a df
-    df_f = df.copy()
+    if not param_sel:
+        st.warning("Selecciona al menos un parámetro para graficar.")
+        return
 
-    # fecha
+    # Aplicar filtros a df (una sola máscara)
+    start = end = None
     if isinstance(date_range, (list, tuple)) and len(date_range) == 2:
         start = pd.to_datetime(date_range[0])
         end = pd.to_datetime(date_range[1]) + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
-        df_f = df_f[(df_f['fechaControl'] >= start) & (df_f['fechaControl'] <= end)]
-
-    if linea_sel is not None:
-        df_f = df_f[df_f['idLinea'] == int(linea_sel)]
-    if present_sel is not None:
-        df_f = df_f[df_f['idPresentacion'] == int(present_sel)]
-    if tipo_sel is not None:
-        df_f = df_f[df_f['idTipoControl'] == int(tipo_sel)]
-    if lote_sel is not None:
-        df_f = df_f[df_f['lote'] == lote_sel]
-    if param_sel:
-        df_f = df_f[df_f['idParametro'].isin(param_sel)]
-    else:
-        st.warning("Selecciona al menos un parámetro para graficar.")
-        return
+
+    spec = filtro(
+        condicion('fechaControl', '>=', start),
+        condicion('fechaControl', '<=', end),
+        condicion('idLinea', '=', linea_sel),
+        condicion('idPresentacion', '=', present_sel),
+        condicion('idTipoControl', '=', tipo_sel),
+        condicion('idDetalle', 'in', detalle_ot.loc[detalle_ot['lote'] == lote_sel, 'idDetalle'].tolist() if lote_sel is not None else None),
+        condicion('idParametro', 'in', param_sel),
+    )
+    # nombres sólo para las filas que se van a mostrar
+    df_f = adjuntar_nombres(aplicar(spec, df), obtener_catalogo(), detalle_ot)
+    # límites vigentes en la fecha de cada control (no los actuales)
+    df_f = adjuntar_limites_vigentes(df_f, obtener_versiones())
+
+    if mostrar_memoria:
+        st.markdown("#### Uso de memoria de la tabla de controles")
+        st.table(reporte_memoria(df, obtener_catalogo(), detalle_ot))
 
     if mostrar_todo:
         st.markdown("#### Datos filtrados")
@@ -388,21 +317,15 @@ def app_graficos_control():
         pres = combo.get('idPresentacion')
         lid = combo.get('idLinea')
 
-        sel_df = df_f[df_f['idParametro'] == pid]
-        if pres is not None:
-            sel_df = sel_df[sel_df['idPresentacion'] == pres]
-        if lid is not None:
-            sel_df = sel_df[sel_df['idLinea'] == lid]
+        sel_df = aplicar(filtro(
+            condicion('idParametro', '=', pid),
+            condicion('idPresentacion', '=', pres),
+            condicion('idLinea', '=', lid),
+        ), df_f)
         if sel_df.empty:
             continue
 
-        # obtener limites desde parametrocalidad si existen
-        limite_inf = None
-        limite_sup = None
-        if not parametros_all.empty and pid in parametros_all['idParametro'].values:
-            row = parametros_all[parametros_all['idParametro'] == pid].iloc[0]
-            limite_inf = row['limiteInferior'] if not pd.isna(row.get('limiteInferior')) else None
-            limite_sup = row['limiteSuperior'] if not pd.isna(row.get('limiteSuperior')) else None
+        # límites de especificación: los vigentes por fila (versionados) van en sel_df
 
         # titulo
         param_name = sel_df['nombreParametro'].iloc[0] if 'nombreParametro' in sel_df.columns else (param_map.get(pid, f"Parametro {pid}"))
@@ -417,7 +340,7 @@ def app_graficos_control():
         st.markdown(f"### {titulo}")
         st.write(f"Registros: {len(sel_df)} · Lotes: {', '.join(map(str, sel_df['lote'].dropna().unique()[:6]))}{'...' if len(sel_df['lote'].dropna().unique())>6 else ''}")
 
-        fig_i, fig_mr, ooc_indices, stats, spec_indices = plot_I_MR(sel_df[['fechaControl','resultado']].copy(), titulo, limite_inf, limite_sup)
+        fig_i, fig_mr, ooc_indices, stats, spec_indices = plot_I_MR(sel_df[['fechaControl','resultado','limiteInferior','limiteSuperior']].copy(), titulo)
 
         # unique key
         def safe(v): return str(v).replace(" ", "_").replace("/", "_").replace(":", "_")
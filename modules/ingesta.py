@@ -0,0 +1,455 @@
+import argparse
+import json
+import random
+import socket
+import socketserver
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+from database.db_connection import get_connection
+from database.esquema import asegurar_esquema
+from modules.catalogo import obtener_catalogo, invalidar_catalogo
+from modules.controles.importar import resolver_lotes, validar_bloque, contexto_validacion, guardar_mediciones
+from modules.controles.cola_local import ERRORES_CONEXION, MAX_INTENTOS
+
+# SERVICIO DE INGESTA (balanzas de control y sensores en línea)
+#
+# Proceso aparte de Streamlit:  python -m modules.ingesta servir --usuario <idUsuario>
+#   - HTTP:   POST /lecturas (objeto o lista JSON), GET /metricas, GET /salud
+#   - socket: TCP local, una lectura JSON por línea; responde OK / SATURADO / ERROR
+# Lectura: {"lote": "L-001", "parametro": 12 | "Peso neto", "resultado": 501.2,
+#           "fechaControl": "2024-05-01 10:00:03" (opcional, por defecto la hora de recepción),
+#           "observaciones": "..."}
+#
+# Las lecturas se acumulan en BufferIngesta y se escriben en micro-lotes cuando
+# se juntan `tam_lote` o pasan `intervalo` segundos: un executemany de controles,
+# evaluación vectorizada y alertas en bloque (mismo camino que la importación de
+# archivos). Si el buffer llega a `capacidad` se rechazan lecturas nuevas (HTTP 503
+# con Retry-After / SATURADO en el socket) en lugar de crecer sin límite.
+# Si un micro-lote falla por los datos (no por la conexión) se reescribe por
+# mitades hasta aislar las lecturas que fallan; una lectura que falla sola
+# MAX_INTENTOS veces pasa a descartadas (visibles en /metricas) y deja de
+# bloquear la cola.
+
+PUERTO_HTTP = 8765
+PUERTO_SOCKET = 8766
+TAM_LOTE_INGESTA = 500
+INTERVALO_INGESTA = 2.0
+CAPACIDAD_INGESTA = 20000
+TTL_CONTEXTO = 300
+MAX_RECHAZOS_GUARDADOS = 200
+FORMATO_FECHA_LECTURA = "%Y-%m-%d %H:%M:%S.%f"
+
+
+class BufferIngesta:
+    """
+    Cola en memoria con vaciado por tamaño o por tiempo en un hilo propio.
+    `escribir(lecturas)` recibe una lista de dicts y devuelve (insertadas, alertas, rechazos).
+    Si falla por la conexión, el micro-lote vuelve al frente de la cola y se reintenta en
+    el siguiente ciclo; si falla por los datos, se aíslan las lecturas culpables (_aislar).
+    """
+
+    def __init__(self, escribir, tam_lote=TAM_LOTE_INGESTA, intervalo=INTERVALO_INGESTA,
+                    capacidad=CAPACIDAD_INGESTA):
+        self._escribir = escribir
+        self.tam_lote = tam_lote
+        self.intervalo = intervalo
+        self.capacidad = capacidad
+        self._cola = deque()
+        self._lock = threading.Lock()
+        self._hay_lote = threading.Event()
+        self._detener = threading.Event()
+        self._hilo = None
+        self._inicio = time.monotonic()
+        self._rechazos = deque(maxlen=MAX_RECHAZOS_GUARDADOS)
+        self._descartadas = deque(maxlen=MAX_RECHAZOS_GUARDADOS)
+        self._intentos = {}  # id(lectura) → intentos fallidos escribiéndola sola
+        self._ultima_recepcion = datetime.min
+        self.contadores = {
+            "recibidas": 0, "saturadas": 0, "insertadas": 0, "rechazadas": 0, "alertas": 0,
+            "micro_lotes": 0, "errores": 0, "descartadas": 0, "ultimo_error": None, "ultimo_lote_ms": 0.0,
+        }
+
+    def agregar(self, lecturas):
+        """Encola las lecturas. Devuelve False (sin encolar ninguna) si superarían la capacidad."""
+        with self._lock:
+            if len(self._cola) + len(lecturas) > self.capacidad:
+                self.contadores["saturadas"] += len(lecturas)
+                return False
+            self._sellar(lecturas)
+            self._cola.extend(lecturas)
+            self.contadores["recibidas"] += len(lecturas)
+            if len(self._cola) >= self.tam_lote:
+                self._hay_lote.set()
+        return True
+
+    def _sellar(self, lecturas):
+        """
+        Completa fechaControl con la hora de recepción, distinta para cada lectura
+        (si no, dos lecturas del mismo lote y parámetro serían una medición duplicada).
+        """
+        for lectura in lecturas:
+            if lectura.get("fechaControl") in (None, ""):
+                ahora = max(datetime.now(), self._ultima_recepcion + timedelta(microseconds=1))
+                self._ultima_recepcion = ahora
+                lectura["fechaControl"] = ahora.strftime(FORMATO_FECHA_LECTURA)
+
+    def pendientes(self):
+        return len(self._cola)
+
+    def _tomar(self):
+        with self._lock:
+            return [self._cola.popleft() for _ in range(min(self.tam_lote, len(self._cola)))]
+
+    def _devolver(self, lote):
+        with self._lock:
+            self._cola.extendleft(reversed(lote))
+
+    def _registrar_error(self, e):
+        self.contadores["errores"] += 1
+        self.contadores["ultimo_error"] = f"{datetime.now():%Y-%m-%d %H:%M:%S} {e}"
+
+    def _escribir_lote(self, lote):
+        t0 = time.perf_counter()
+        insertadas, alertas, rechazos = self._escribir(lote)
+        for lectura in lote:
+            self._intentos.pop(id(lectura), None)
+        self.contadores["micro_lotes"] += 1
+        self.contadores["insertadas"] += insertadas
+        self.contadores["alertas"] += alertas
+        self.contadores["rechazadas"] += len(rechazos)
+        self.contadores["ultimo_lote_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        self._rechazos.extend(rechazos)
+
+    def _contar_intento(self, lectura, error):
+        """Lectura que falló sola: vuelve a la cola o, tras MAX_INTENTOS, pasa a descartadas."""
+        intentos = self._intentos.pop(id(lectura), 0) + 1
+        if intentos < MAX_INTENTOS:
+            self._intentos[id(lectura)] = intentos
+            return [lectura]
+        self.contadores["descartadas"] += 1
+        self._descartadas.append({"lectura": lectura, "error": str(error)[:500], "intentos": intentos})
+        return []
+
+    def _aislar(self, lote, error):
+        """
+        Reescribe por mitades un micro-lote que falló por los datos.
+        Devuelve (lecturas que vuelven a la cola, si se perdió la conexión).
+        """
+        if len(lote) == 1:
+            return self._contar_intento(lote[0], error), False
+        mitad = len(lote) // 2
+        partes = [lote[:mitad], lote[mitad:]]
+        devolver = []
+        for i, parte in enumerate(partes):
+            try:
+                self._escribir_lote(parte)
+            except ERRORES_CONEXION as e:
+                self._registrar_error(e)
+                return devolver + [l for p in partes[i:] for l in p], True
+            except Exception as e:
+                pendientes, sin_conexion = self._aislar(parte, e)
+                devolver.extend(pendientes)
+                if sin_conexion:
+                    return devolver + [l for p in partes[i + 1:] for l in p], True
+        return devolver, False
+
+    def vaciar(self):
+        """Escribe micro-lotes hasta dejar la cola vacía o hasta que algo vuelva a la cola."""
+        while self._cola:
+            lote = self._tomar()
+            try:
+                self._escribir_lote(lote)
+                continue
+            except ERRORES_CONEXION as e:
+                self._registrar_error(e)
+                self._devolver(lote)
+                return False
+            except Exception as e:
+                self._registrar_error(e)
+                devolver, _ = self._aislar(lote, e)
+            if devolver:
+                # se reintentan en el próximo ciclo, no en este mismo
+                self._devolver(devolver)
+                return False
+        return True
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            self._hay_lote.wait(self.intervalo)
+            self._hay_lote.clear()
+            self.vaciar()
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self._bucle, name="ingesta-buffer", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        """Detiene el hilo y escribe lo que quede en la cola."""
+        self._detener.set()
+        self._hay_lote.set()
+        if self._hilo:
+            self._hilo.join()
+        self.vaciar()
+
+    def metricas(self):
+        segundos = max(time.monotonic() - self._inicio, 1e-9)
+        m = dict(self.contadores)
+        m.update({
+            "pendientes": self.pendientes(),
+            "capacidad": self.capacidad,
+            "ocupacion": round(self.pendientes() / self.capacidad, 3),
+            "saturado": self.pendientes() >= self.capacidad,
+            "insertadas_por_segundo": round(m["insertadas"] / segundos, 1),
+            "recibidas_por_segundo": round(m["recibidas"] / segundos, 1),
+            "segundos_activo": round(segundos, 1),
+            "ultimos_rechazos": list(self._rechazos)[-20:],
+            "ultimas_descartadas": list(self._descartadas)[-20:],
+        })
+        return m
+
+
+class EscritorMediciones:
+    """
+    Valida y guarda un micro-lote de lecturas en una transacción.
+    El catálogo y los lotes conocidos se refrescan cada TTL_CONTEXTO segundos, porque
+    los cambios hechos desde la aplicación ocurren en otro proceso.
+    """
+
+    def __init__(self, id_usuario):
+        self.id_usuario = id_usuario
+        self._cargado = 0.0
+        self._contexto = None
+        self._lotes = {}
+
+    def _refrescar(self):
+        if self._contexto is None or time.monotonic() - self._cargado > TTL_CONTEXTO:
+            invalidar_catalogo()
+            self._contexto = contexto_validacion(obtener_catalogo())
+            self._lotes = {}
+            self._cargado = time.monotonic()
+        return self._contexto
+
+    def __call__(self, lecturas):
+        espec, nombres_param, tipos_param = self._refrescar()
+        largo = lecturas_a_largo(lecturas, nombres_param)
+        conn = get_connection()
+        try:
+            cursor = conn.cursor()
+            resolver_lotes(cursor, largo["lote"].unique().tolist(), self._lotes)
+            validas, rechazadas = validar_bloque(largo, self._lotes, espec, tipos_param)
+            try:
+                insertadas, alertas = guardar_mediciones(cursor, validas, self.id_usuario, sufijo=" (sensor)")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            cursor.close()
+        finally:
+            conn.close()
+        rechazos = [{"lectura": lecturas[int(f)], "motivo": m}
+                    for f, m in zip(rechazadas["fila"], rechazadas["motivo"])]
+        return insertadas, alertas, rechazos
+
+
+def lecturas_a_largo(lecturas, nombres_param):
+    """Lista de lecturas → DataFrame con las columnas que espera validar_bloque()."""
+    df = pd.DataFrame.from_records(lecturas)
+    for col in ["lote", "parametro", "resultado", "fechaControl", "observaciones"]:
+        if col not in df.columns:
+            df[col] = None
+    param = df["parametro"].astype(str).str.strip()
+    id_param = pd.to_numeric(param, errors="coerce").fillna(param.str.lower().map(nombres_param))
+    return pd.DataFrame({
+        "fila": range(len(df)),
+        "lote": df["lote"].astype(str).str.strip(),
+        "fechaControl": df["fechaControl"],
+        "observaciones": df["observaciones"].fillna("").astype(str).str.strip(),
+        "idParametro": id_param,
+        "resultado": df["resultado"].astype(str),
+    })
+
+
+def normalizar_lecturas(cuerpo):
+    """Objeto o lista JSON → lista de dicts. Lanza ValueError si falta lote/parametro/resultado."""
+    lecturas = cuerpo if isinstance(cuerpo, list) else [cuerpo]
+    for i, l in enumerate(lecturas):
+        if not isinstance(l, dict):
+            raise ValueError(f"Lectura {i}: se esperaba un objeto JSON.")
+        faltan = [c for c in ("lote", "parametro", "resultado") if l.get(c) in (None, "")]
+        if faltan:
+            raise ValueError(f"Lectura {i}: faltan {', '.join(faltan)}.")
+    return lecturas
+
+
+def crear_servidor_http(buffer, puerto=PUERTO_HTTP, host="0.0.0.0"):
+    class Manejador(BaseHTTPRequestHandler):
+        def _responder(self, codigo, datos, cabeceras=None):
+            cuerpo = json.dumps(datos, default=str).encode("utf-8")
+            self.send_response(codigo)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(cuerpo)))
+            for k, v in (cabeceras or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def do_GET(self):
+            if self.path == "/metricas":
+                self._responder(200, buffer.metricas())
+            elif self.path == "/salud":
+                self._responder(200, {"ok": True, "pendientes": buffer.pendientes()})
+            else:
+                self._responder(404, {"error": "Ruta no encontrada."})
+
+        def do_POST(self):
+            if self.path != "/lecturas":
+                self._responder(404, {"error": "Ruta no encontrada."})
+                return
+            try:
+                largo = int(self.headers.get("Content-Length", 0))
+                lecturas = normalizar_lecturas(json.loads(self.rfile.read(largo) or b"null"))
+            except ValueError as ve:
+                self._responder(400, {"error": str(ve)})
+                return
+            if not buffer.agregar(lecturas):
+                self._responder(503, {"error": "Buffer saturado, reintente.", "pendientes": buffer.pendientes()},
+                                {"Retry-After": str(max(1, int(buffer.intervalo)))})
+                return
+            self._responder(202, {"aceptadas": len(lecturas), "pendientes": buffer.pendientes()})
+
+        def log_message(self, formato, *args):
+            pass
+
+    return ThreadingHTTPServer((host, puerto), Manejador)
+
+
+def crear_servidor_socket(buffer, puerto=PUERTO_SOCKET, host="127.0.0.1"):
+    class Manejador(socketserver.StreamRequestHandler):
+        def handle(self):
+            for linea in self.rfile:
+                if not linea.strip():
+                    continue
+                try:
+                    lecturas = normalizar_lecturas(json.loads(linea))
+                    respuesta = "OK" if buffer.agregar(lecturas) else "SATURADO"
+                except ValueError as ve:
+                    respuesta = f"ERROR {ve}"
+                self.wfile.write((respuesta + "\n").encode("utf-8"))
+
+    socketserver.ThreadingTCPServer.allow_reuse_address = True
+    servidor = socketserver.ThreadingTCPServer((host, puerto), Manejador)
+    servidor.daemon_threads = True
+    return servidor
+
+
+def servir(id_usuario, puerto_http=PUERTO_HTTP, puerto_socket=PUERTO_SOCKET,
+            tam_lote=TAM_LOTE_INGESTA, intervalo=INTERVALO_INGESTA, capacidad=CAPACIDAD_INGESTA):
+    for error in asegurar_esquema():
+        print(error)
+    buffer = BufferIngesta(EscritorMediciones(id_usuario), tam_lote, intervalo, capacidad)
+    buffer.iniciar()
+    http = crear_servidor_http(buffer, puerto_http)
+    sock = crear_servidor_socket(buffer, puerto_socket)
+    threading.Thread(target=sock.serve_forever, name="ingesta-socket", daemon=True).start()
+    print(f"Ingesta: HTTP :{puerto_http}  socket :{puerto_socket}  (lote {tam_lote}, {intervalo}s, capacidad {capacidad})")
+    try:
+        http.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        http.server_close()
+        sock.shutdown()
+        sock.server_close()
+        buffer.detener()
+        print(json.dumps(buffer.metricas(), default=str, indent=2))
+
+
+# SIMULADOR (pruebas de carga sin equipos reales)
+
+def generar_lecturas(lotes, parametros, n, media=100.0, desvio=5.0):
+    return [{
+        "lote": random.choice(lotes),
+        "parametro": random.choice(parametros),
+        "resultado": round(random.gauss(media, desvio), 3),
+        "fechaControl": datetime.now().strftime(FORMATO_FECHA_LECTURA),
+    } for _ in range(n)]
+
+
+def simular(lotes, parametros, tasa=50, segundos=30, por_envio=10, modo="http",
+            host="127.0.0.1", puerto=None, media=100.0, desvio=5.0):
+    """Envía ~`tasa` lecturas/s durante `segundos`, en paquetes de `por_envio`. Devuelve contadores."""
+    puerto = puerto or (PUERTO_HTTP if modo == "http" else PUERTO_SOCKET)
+    cont = {"enviadas": 0, "saturadas": 0, "errores": 0}
+    conexion = socket.create_connection((host, puerto)) if modo == "socket" else None
+    respuestas = conexion.makefile("r", encoding="utf-8") if conexion else None
+    fin = time.monotonic() + segundos
+    pausa = por_envio / float(tasa)
+    try:
+        while time.monotonic() < fin:
+            t0 = time.monotonic()
+            paquete = generar_lecturas(lotes, parametros, por_envio, media, desvio)
+            if modo == "http":
+                req = urllib.request.Request(f"http://{host}:{puerto}/lecturas", json.dumps(paquete).encode("utf-8"),
+                                                {"Content-Type": "application/json"})
+                try:
+                    urllib.request.urlopen(req, timeout=5).read()
+                    cont["enviadas"] += len(paquete)
+                except urllib.error.HTTPError as e:
+                    cont["saturadas" if e.code == 503 else "errores"] += len(paquete)
+                except OSError:
+                    cont["errores"] += len(paquete)
+            else:
+                conexion.sendall((json.dumps(paquete) + "\n").encode("utf-8"))
+                respuesta = respuestas.readline().strip()
+                clave = "enviadas" if respuesta == "OK" else ("saturadas" if respuesta == "SATURADO" else "errores")
+                cont[clave] += len(paquete)
+            time.sleep(max(0.0, pausa - (time.monotonic() - t0)))
+    finally:
+        if conexion:
+            conexion.close()
+    return cont
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servicio de ingesta de lecturas de sensores.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_serv = sub.add_parser("servir")
+    p_serv.add_argument("--usuario", type=int, required=True, help="idUsuario con el que se registran los controles")
+    p_serv.add_argument("--puerto-http", type=int, default=PUERTO_HTTP)
+    p_serv.add_argument("--puerto-socket", type=int, default=PUERTO_SOCKET)
+    p_serv.add_argument("--tam-lote", type=int, default=TAM_LOTE_INGESTA)
+    p_serv.add_argument("--intervalo", type=float, default=INTERVALO_INGESTA)
+    p_serv.add_argument("--capacidad", type=int, default=CAPACIDAD_INGESTA)
+
+    p_sim = sub.add_parser("simular")
+    p_sim.add_argument("--lotes", required=True, help="lotes separados por coma")
+    p_sim.add_argument("--parametros", required=True, help="idParametro o nombres separados por coma")
+    p_sim.add_argument("--tasa", type=float, default=50, help="lecturas por segundo")
+    p_sim.add_argument("--segundos", type=float, default=30)
+    p_sim.add_argument("--por-envio", type=int, default=10)
+    p_sim.add_argument("--modo", choices=["http", "socket"], default="http")
+    p_sim.add_argument("--host", default="127.0.0.1")
+    p_sim.add_argument("--puerto", type=int)
+    p_sim.add_argument("--media", type=float, default=100.0)
+    p_sim.add_argument("--desvio", type=float, default=5.0)
+
+    args = parser.parse_args(argv)
+    if args.comando == "servir":
+        servir(args.usuario, args.puerto_http, args.puerto_socket, args.tam_lote, args.intervalo, args.capacidad)
+    else:
+        cont = simular([l.strip() for l in args.lotes.split(",")], [p.strip() for p in args.parametros.split(",")],
+                        args.tasa, args.segundos, args.por_envio, args.modo, args.host, args.puerto,
+                        args.media, args.desvio)
+        print(json.dumps(cont))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,26 @@
 import streamlit as st
 from database.db_connection import get_connection
-import pandas as pd
+from modules.catalogo import obtener_catalogo, invalidar_catalogo
+from modules.especificaciones import registrar_version
+from modules.resumen_calidad import refrescar_requeridos
 
 # CONSULTAS A BASE DE DATOS
 
 def obtener_lineas():
-    conn = get_connection()
-    df = pd.read_sql("SELECT idLinea, nombreLinea FROM LineaProduccion ORDER BY nombreLinea", conn)
-    conn.close()
-    return df
+    return obtener_catalogo()["lineas"][["idLinea", "nombreLinea"]].reset_index(drop=True)
 
 def obtener_presentaciones(idLinea):
-    conn = get_connection()
-    df = pd.read_sql("""
-        SELECT idPresentacion, nombrePresentacion, codigoPresentacion
-        FROM PresentacionProducto 
-        WHERE idLinea = %s
-        ORDER BY nombrePresentacion
-    """, conn, params=(idLinea,))
-    conn.close()
-    return df
+    df = obtener_catalogo()["presentaciones"]
+    df = df[df["idLinea"] == idLinea]
+    return df[["idPresentacion", "nombrePresentacion", "codigoPresentacion"]].reset_index(drop=True)
 
 def obtener_parametros(idPresentacion):
-    conn = get_connection()
-    df = pd.read_sql("""
-        SELECT 
-            idPresentacionParametro,
-            idParametro,
-            limiteInferior,
-            limiteSuperior,
-            unidadMedida,
-            tipoParametro
-        FROM presentacionparametro
-        WHERE idPresentacion = %s
-    """, conn, params=(idPresentacion,))
-    conn.close()
-    return df
+    df = obtener_catalogo()["especificaciones"]
+    df = df[df["idPresentacion"] == idPresentacion]
+    return df[[
+        "idPresentacionParametro", "idParametro", "limiteInferior",
+        "limiteSuperior", "unidadMedida", "tipoParametro"
+    ]].reset_index(drop=True)
 
 # INSERTAR
 
@@ -44,6 +29,7 @@ def insertar_linea(nombre):
     cursor = conn.cursor()
     cursor.execute("INSERT INTO LineaProduccion (nombreLinea) VALUES (%s)", (nombre,))
     conn.commit()
+    invalidar_catalogo()
     conn.close()
 
 def insertar_presentacion(nombre, codigo, idLinea):
@@ -54,6 +40,7 @@ def insertar_presentacion(nombre, codigo, idLinea):
         VALUES (%s, %s, %s)
     """, (nombre, codigo, idLinea))
     conn.commit()
+    invalidar_catalogo()
     conn.close()
 
 def insertar_parametro(idPresentacion, idParametro, inf, sup, unidad, tipo):
@@ -64,7 +51,10 @@ def insertar_parametro(idPresentacion, idParametro, inf, sup, unidad, tipo):
         (idPresentacion, idParametro, limiteInferior, limiteSuperior, unidadMedida, tipoParametro)
         VALUES (%s,%s,%s,%s,%s,%s)
     """, (idPresentacion, idParametro, inf, sup, unidad, tipo))
+    registrar_version(cursor, idParametro, idPresentacion, inf, sup, tipo)
+    refrescar_requeridos(cursor, [idPresentacion])
     conn.commit()
+    invalidar_catalogo()
     conn.close()
 
 # EDITAR
@@ -74,6 +64,7 @@ def editar_linea(idLinea, nuevo_nombre):
     cursor = conn.cursor()
     cursor.execute("UPDATE LineaProduccion SET nombreLinea = %s WHERE idLinea = %s", (nuevo_nombre, idLinea))
     conn.commit()
+    invalidar_catalogo()
     conn.close()
 
 def editar_presentacion(idPresentacion, nuevo_nombre, nuevo_codigo):
@@ -85,6 +76,7 @@ def editar_presentacion(idPresentacion, nuevo_nombre, nuevo_codigo):
         WHERE idPresentacion = %s
     """, (nuevo_nombre, nuevo_codigo, idPresentacion))
     conn.commit()
+    invalidar_catalogo()
     conn.close()
 
 def editar_parametro(idPP, inf, sup, unidad, tipo):
@@ -95,7 +87,12 @@ def editar_parametro(idPP, inf, sup, unidad, tipo):
         SET limiteInferior=%s, limiteSuperior=%s, unidadMedida=%s, tipoParametro=%s
         WHERE idPresentacionParametro=%s
     """, (inf, sup, unidad, tipo, idPP))
+    cursor.execute("SELECT idParametro, idPresentacion FROM presentacionparametro WHERE idPresentacionParametro = %s", (idPP,))
+    fila = cursor.fetchone()
+    if fila:
+        registrar_version(cursor, fila[0], fila[1], inf, sup, tipo)
     conn.commit()
+    invalidar_catalogo()
     conn.close()
 
 # ELIMINAR
@@ -105,6 +102,7 @@ def eliminar_presentacion(idPresentacion):
     cursor = conn.cursor()
     cursor.execute("DELETE FROM PresentacionProducto WHERE idPresentacion = %s", (idPresentacion,))
     conn.commit()
+    invalidar_catalogo()
     conn.close()
 
 def eliminar_linea(idLinea):
@@ -112,13 +110,21 @@ def eliminar_linea(idLinea):
     cursor = conn.cursor()
     cursor.execute("DELETE FROM LineaProduccion WHERE idLinea = %s", (idLinea,))
     conn.commit()
+    invalidar_catalogo()
     conn.close()
 
 def eliminar_parametro(idPP):
     conn = get_connection()
     cursor = conn.cursor()
+    cursor.execute("SELECT idParametro, idPresentacion FROM presentacionparametro WHERE idPresentacionParametro = %s", (idPP,))
+    fila = cursor.fetchone()
     cursor.execute("DELETE FROM presentacionparametro WHERE idPresentacionParametro = %s", (idPP,))
+    if fila:
+        # versión sin límites: desde ahora rige el límite general del parámetro
+        registrar_version(cursor, fila[0], fila[1], None, None, None)
+        refrescar_requeridos(cursor, [fila[1]])
     conn.commit()
+    invalidar_catalogo()
     conn.close()
 
 # INTERFAZ PRINCIPAL
@@ -0,0 +1,240 @@
+import argparse
+import os
+import smtplib
+import time
+from datetime import datetime
+from email.message import EmailMessage
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from database.db_connection import get_connection
+from database.esquema import asegurar_esquema
+
+# NOTIFICACIÓN DE ALERTAS POR CORREO (resúmenes por rol y línea)
+#
+# Proceso aparte:  python -m modules.notificaciones [--transporte archivo|smtp] [--una-vez]
+# Dos canales, cada uno con su marca de agua (último idAlerta enviado) en marcanotificacion:
+#   - "resumen": cada INTERVALO_RESUMEN segundos, todas las alertas nuevas
+#   - "critico": cada INTERVALO_CRITICO segundos, sólo las críticas (desviación
+#     relativa al ancho del rango >= UMBRAL_CRITICO), para no esperar al resumen
+# En cada ciclo: una consulta de alertas nuevas (idAlerta > marca), una de
+# destinatarios, un mensaje por (rol, línea) con todos los destinatarios del rol
+# y una sola conexión SMTP. La marca avanza sólo si el envío terminó bien.
+#
+# Transportes: TransporteSMTP (servidor real o de pruebas local, p. ej.
+# `python -m aiosmtpd -n -l localhost:1025`) y TransporteArchivo, que deja
+# cada mensaje como .eml en una carpeta.
+
+CANAL_RESUMEN = "resumen"
+CANAL_CRITICO = "critico"
+INTERVALO_RESUMEN = 900
+INTERVALO_CRITICO = 30
+UMBRAL_CRITICO = 0.5
+MAX_ALERTAS_CICLO = 50000
+ROLES_DESTINO = ("supervisor", "gerente")
+CARPETA_CORREOS = Path(__file__).resolve().parents[1] / "data" / "correos"
+REMITENTE = os.environ.get("NOTIF_REMITENTE", "control-calidad@localhost")
+
+Q_ALERTAS_NUEVAS = """
+    SELECT a.idAlerta, a.tipoAlerta, a.fechaAlerta, a.idLinea, a.idPresentacion, a.idParametro,
+            a.valorFuera, a.limiteInferior, a.limiteSuperior,
+            l.nombreLinea, p.nombrePresentacion, par.nombreParametro, o.codigoOrden, d.lote
+    FROM alerta a
+    LEFT JOIN lineaproduccion l ON l.idLinea = a.idLinea
+    LEFT JOIN presentacionproducto p ON p.idPresentacion = a.idPresentacion
+    LEFT JOIN parametrocalidad par ON par.idParametro = a.idParametro
+    LEFT JOIN ordentrabajo o ON o.idOrdenTrabajo = a.idOrdenTrabajo
+    LEFT JOIN controlcalidad c ON c.idControl = a.idControl
+    LEFT JOIN DetalleOrdenTrabajo d ON d.idDetalle = c.idDetalle
+    WHERE a.idAlerta > %s
+    ORDER BY a.idAlerta
+    LIMIT %s
+"""
+
+
+class TransporteArchivo:
+    """Guarda cada mensaje como .eml (sustituto local del correo)."""
+
+    def __init__(self, carpeta=CARPETA_CORREOS):
+        self.carpeta = Path(carpeta)
+
+    def enviar(self, mensajes):
+        self.carpeta.mkdir(parents=True, exist_ok=True)
+        marca = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        for i, msg in enumerate(mensajes):
+            (self.carpeta / f"{marca}_{i:03d}.eml").write_bytes(bytes(msg))
+
+
+class TransporteSMTP:
+    """Envía todos los mensajes del ciclo por una sola conexión SMTP."""
+
+    def __init__(self, host="localhost", puerto=1025, usuario=None, clave=None, tls=False):
+        self.host, self.puerto = host, puerto
+        self.usuario, self.clave, self.tls = usuario, clave, tls
+
+    def enviar(self, mensajes):
+        with smtplib.SMTP(self.host, self.puerto, timeout=30) as smtp:
+            if self.tls:
+                smtp.starttls()
+            if self.usuario:
+                smtp.login(self.usuario, self.clave)
+            for msg in mensajes:
+                smtp.send_message(msg)
+
+
+def crear_transporte(nombre=None):
+    """Transporte según `nombre` o la variable NOTIF_TRANSPORTE (archivo por defecto)."""
+    nombre = (nombre or os.environ.get("NOTIF_TRANSPORTE", "archivo")).lower()
+    if nombre == "smtp":
+        return TransporteSMTP(
+            os.environ.get("SMTP_HOST", "localhost"), int(os.environ.get("SMTP_PUERTO", 1025)),
+            os.environ.get("SMTP_USUARIO"), os.environ.get("SMTP_CLAVE"),
+            os.environ.get("SMTP_TLS", "0") == "1",
+        )
+    return TransporteArchivo(os.environ.get("NOTIF_CARPETA", CARPETA_CORREOS))
+
+
+def leer_marca(cursor, canal):
+    """Último idAlerta enviado por el canal. La primera vez parte de la alerta más reciente (sin histórico)."""
+    cursor.execute("SELECT ultimoIdAlerta FROM marcanotificacion WHERE canal = %s", (canal,))
+    fila = cursor.fetchone()
+    if fila:
+        return int(fila[0])
+    cursor.execute("SELECT COALESCE(MAX(idAlerta), 0) FROM alerta")
+    marca = int(cursor.fetchone()[0])
+    guardar_marca(cursor, canal, marca)
+    return marca
+
+
+def guardar_marca(cursor, canal, id_alerta):
+    cursor.execute("""
+        INSERT INTO marcanotificacion (canal, ultimoIdAlerta, actualizado) VALUES (%s, %s, NOW())
+        ON DUPLICATE KEY UPDATE ultimoIdAlerta = VALUES(ultimoIdAlerta), actualizado = VALUES(actualizado)
+    """, (canal, int(id_alerta)))
+
+
+def destinatarios(cursor):
+    """{rol: [correos]} de los usuarios activos con correo de ROLES_DESTINO."""
+    cursor.execute("""
+        SELECT LOWER(R.nombreRol), U.correo
+        FROM Usuario U
+        INNER JOIN Rol R ON U.idRol = R.idRol
+        WHERE U.activo = 1 AND U.correo IS NOT NULL AND U.correo <> ''
+    """)
+    por_rol = {}
+    for nombre_rol, correo in cursor.fetchall():
+        for rol in ROLES_DESTINO:
+            if rol in nombre_rol:
+                por_rol.setdefault(rol, []).append(correo)
+    return por_rol
+
+
+def es_critica(alertas, umbral=UMBRAL_CRITICO):
+    """Máscara vectorizada: desviación respecto del límite >= umbral × ancho del rango."""
+    valor = pd.to_numeric(alertas["valorFuera"], errors="coerce").to_numpy(dtype="float64")
+    li = pd.to_numeric(alertas["limiteInferior"], errors="coerce").to_numpy(dtype="float64")
+    ls = pd.to_numeric(alertas["limiteSuperior"], errors="coerce").to_numpy(dtype="float64")
+    with np.errstate(invalid="ignore"):
+        desviacion = np.fmax(np.fmax(li - valor, valor - ls), 0)
+        ancho = ls - li
+        return np.nan_to_num(desviacion / np.where(ancho > 0, ancho, np.nan)) >= umbral
+
+
+def cuerpo_resumen(alertas):
+    """Texto del resumen de una línea: una fila por (presentación, parámetro, lote)."""
+    grupos = alertas.fillna({"nombrePresentacion": "-", "nombreParametro": "-", "lote": "-"}).groupby(
+        ["nombrePresentacion", "nombreParametro", "lote"], sort=True).agg(
+        alertas=("idAlerta", "size"), ordenes=("codigoOrden", lambda s: ", ".join(sorted(s.dropna().unique()))),
+        minimo=("valorFuera", "min"), maximo=("valorFuera", "max"),
+        limiteInferior=("limiteInferior", "last"), limiteSuperior=("limiteSuperior", "last"),
+        desde=("fechaAlerta", "min"), hasta=("fechaAlerta", "max"),
+    ).sort_values("alertas", ascending=False)
+    lineas = []
+    for (pres, param, lote), g in grupos.iterrows():
+        rango = f"{g['limiteInferior']} - {g['limiteSuperior']}" if pd.notna(g["limiteInferior"]) else "check"
+        lineas.append(
+            f"- {param} | {pres} | lote {lote}: {g['alertas']} alerta(s), valores {g['minimo']} a {g['maximo']} "
+            f"(permitido {rango}), {g['desde']:%d/%m %H:%M} - {g['hasta']:%d/%m %H:%M}, órdenes {g['ordenes']}"
+        )
+    return "\n".join(lineas)
+
+
+def armar_mensajes(alertas, por_rol, critico=False):
+    """Un EmailMessage por (rol, línea) con todos los destinatarios del rol en Bcc."""
+    mensajes = []
+    if alertas.empty:
+        return mensajes
+    alertas = alertas.assign(fechaAlerta=pd.to_datetime(alertas["fechaAlerta"]))
+    for nombre_linea, de_linea in alertas.groupby(alertas["nombreLinea"].fillna("Sin línea"), sort=True):
+        cuerpo = cuerpo_resumen(de_linea)
+        for rol, correos in por_rol.items():
+            msg = EmailMessage()
+            prefijo = "[CRÍTICO] " if critico else ""
+            msg["Subject"] = f"{prefijo}{len(de_linea)} alerta(s) de calidad — {nombre_linea}"
+            msg["From"] = REMITENTE
+            msg["To"] = REMITENTE
+            msg["Bcc"] = ", ".join(sorted(set(correos)))
+            msg.set_content(f"Resumen para {rol} — línea {nombre_linea}\n"
+                            f"Alertas {de_linea['idAlerta'].min()} a {de_linea['idAlerta'].max()}\n\n{cuerpo}\n")
+            mensajes.append(msg)
+    return mensajes
+
+
+def ciclo(canal, transporte, solo_criticas=False, limite=MAX_ALERTAS_CICLO):
+    """Envía las alertas nuevas del canal y avanza su marca. Devuelve (alertas, mensajes)."""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        marca = leer_marca(cursor, canal)
+        conn.commit()
+        cursor.execute(Q_ALERTAS_NUEVAS, (marca, int(limite)))
+        columnas = [c[0] for c in cursor.description]
+        alertas = pd.DataFrame(cursor.fetchall(), columns=columnas)
+        if alertas.empty:
+            return 0, 0
+        enviar = alertas[es_critica(alertas)] if solo_criticas else alertas
+        mensajes = armar_mensajes(enviar, destinatarios(cursor), critico=solo_criticas)
+        if mensajes:
+            transporte.enviar(mensajes)
+        guardar_marca(cursor, canal, alertas["idAlerta"].max())
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
+    return len(enviar), len(mensajes)
+
+
+def ejecutar(transporte, intervalo_resumen=INTERVALO_RESUMEN, intervalo_critico=INTERVALO_CRITICO, una_vez=False):
+    """Bucle del notificador: el canal crítico cada `intervalo_critico`, el resumen cada `intervalo_resumen`."""
+    proximo = {CANAL_RESUMEN: 0.0, CANAL_CRITICO: 0.0}
+    intervalos = {CANAL_RESUMEN: intervalo_resumen, CANAL_CRITICO: intervalo_critico}
+    while True:
+        for canal in (CANAL_CRITICO, CANAL_RESUMEN):
+            if time.monotonic() < proximo[canal]:
+                continue
+            try:
+                n, m = ciclo(canal, transporte, solo_criticas=(canal == CANAL_CRITICO))
+                if n:
+                    print(f"{datetime.now():%H:%M:%S} {canal}: {n} alertas en {m} mensajes")
+            except Exception as e:
+                print(f"{datetime.now():%H:%M:%S} {canal}: error, se reintenta en el próximo ciclo ({e})")
+            proximo[canal] = time.monotonic() + intervalos[canal]
+        if una_vez:
+            return
+        time.sleep(max(0.0, min(proximo.values()) - time.monotonic()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Notificador de alertas de calidad.")
+    parser.add_argument("--transporte", choices=["archivo", "smtp"])
+    parser.add_argument("--intervalo-resumen", type=float, default=INTERVALO_RESUMEN)
+    parser.add_argument("--intervalo-critico", type=float, default=INTERVALO_CRITICO)
+    parser.add_argument("--una-vez", action="store_true", help="un ciclo de cada canal y salir")
+    args = parser.parse_args(argv)
+    for error in asegurar_esquema():
+        print(error)
+    ejecutar(crear_transporte(args.transporte), args.intervalo_resumen, args.intervalo_critico, args.una_vez)
+
+
+if __name__ == "__main__":
+    main()
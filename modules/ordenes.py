@@ -1,13 +1,18 @@
 import streamlit as st
 import pandas as pd
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 from database.db_connection import get_connection
+from modules.catalogo import obtener_catalogo, como_tuplas
+from modules.fechas import parsear_fechas
+from modules.filtros import filtro, condicion, aplicar
+from modules.resumen_calidad import estado_calidad, recalcular_resumen_calidad
 import traceback
 
 # VALIDACIONES
 
 MAX_CODIGO_LEN = 50
 MAX_TEXT_LEN = 500
+TAM_PAGINA_ORDENES = 50
 
 def sanitize_str(s: str):
     if s is None:
@@ -68,30 +73,12 @@ def obtener_semana_iso(fecha):
 # ---------------------------
 
 def obtener_lineas():
-    conn = get_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT idLinea, nombreLinea FROM LineaProduccion ORDER BY nombreLinea;")
-        lineas = cursor.fetchall()
-    finally:
-        conn.close()
-    return lineas
+    return como_tuplas(obtener_catalogo()["lineas"], ["idLinea", "nombreLinea"])
 
 
 def obtener_presentaciones_linea(idLinea):
-    conn = get_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT idPresentacion, nombrePresentacion
-            FROM PresentacionProducto
-            WHERE idLinea = %s
-            ORDER BY nombrePresentacion
-        """, (idLinea,))
-        pres = cursor.fetchall()
-    finally:
-        conn.close()
-    return pres
+    df = obtener_catalogo()["presentaciones"]
+    return como_tuplas(df[df["idLinea"] == idLinea], ["idPresentacion", "nombrePresentacion"])
 
 
 def codigo_orden_existe(codigoorden):
@@ -162,6 +149,7 @@ def insertar_orden(codigoorden, fecha, semana, dia, turno, idLinea):
         raise
     finally:
         conn.close()
+    ordenes_recientes.clear()
     return id_orden
 
 
@@ -226,6 +214,7 @@ def actualizar_orden(idOrden, codigo, fecha, semana, dia, turno, idLinea):
         raise
     finally:
         conn.close()
+    ordenes_recientes.clear()
 
 
 def eliminar_orden(idOrden):
@@ -249,6 +238,7 @@ def eliminar_orden(idOrden):
         raise
     finally:
         conn.close()
+    ordenes_recientes.clear()
 
 
 def insertar_detalle(idOrden, idPresentacion, receta, fechaVencimiento, lote,
@@ -312,9 +302,27 @@ def obtener_ordenes():
             o.dia,
             o.turno,
             l.nombreLinea AS Linea,
-            o.idLinea
+            o.idLinea,
+            r.controles AS Controles,
+            r.parametrosCubiertos AS ParamCubiertos,
+            r.parametrosRequeridos AS ParamRequeridos,
+            r.fueraEspecificacion AS FueraEspec,
+            r.alertasAbiertas AS AlertasAbiertas,
+            r.ultimoControl AS UltimoControl
         FROM OrdenTrabajo o
         INNER JOIN LineaProduccion l ON o.idLinea = l.idLinea
+        LEFT JOIN (
+            SELECT idOrdenTrabajo,
+                    SUM(controles) AS controles,
+                    SUM(parametrosCubiertos) AS parametrosCubiertos,
+                    SUM(parametrosRequeridos) AS parametrosRequeridos,
+                    SUM(fueraEspecificacion) AS fueraEspecificacion,
+                    SUM(alertasAbiertas) AS alertasAbiertas,
+                    MIN(primerControl) AS primerControl,
+                    MAX(ultimoControl) AS ultimoControl
+            FROM resumencalidadorden
+            GROUP BY idOrdenTrabajo
+        ) r ON r.idOrdenTrabajo = o.idOrdenTrabajo
         ORDER BY o.fecha DESC, o.idOrdenTrabajo DESC;
     """
     try:
@@ -324,6 +332,184 @@ def obtener_ordenes():
     return df
 
 
+# BÚSQUEDA DE ÓRDENES (typeahead)
+# - turnos: T1 06-14, T2 14-22, T3 22-06 (las horas 00-06 pertenecen al T3 del día anterior)
+# - órdenes recientes: trie en memoria sobre código, línea y fecha (sufijos, para buscar subcadenas)
+# - resto del histórico: consulta LIKE con LIMIT apoyada en idx_orden_codigo
+
+DIAS_ORDENES_RECIENTES = 14
+MAX_RESULTADOS_BUSQUEDA = 20
+_MAX_IDS_POR_NODO = 200
+
+
+def turno_de(momento):
+    """(fecha de producción, turno) al que pertenece un datetime."""
+    hora = momento.hour
+    if 6 <= hora < 14:
+        return momento.date(), "T1-8H"
+    if 14 <= hora < 22:
+        return momento.date(), "T2-8H"
+    if hora >= 22:
+        return momento.date(), "T3-8H"
+    return (momento - timedelta(days=1)).date(), "T3-8H"
+
+
+def turnos_recientes(momento=None):
+    """Turno actual y anterior como lista de (fecha, turno)."""
+    momento = momento or datetime.now()
+    actual = turno_de(momento)
+    anterior = turno_de(momento - timedelta(hours=8))
+    return [actual, anterior]
+
+
+def _claves_busqueda(codigo, linea, fecha):
+    return [str(codigo or "").lower(), str(linea or "").lower(), str(fecha or "")]
+
+
+def construir_trie(filas):
+    """
+    filas: tuplas (id, codigoOrden, linea, fecha) ordenadas de más reciente a más antigua.
+    Cada sufijo de cada clave se inserta, así un recorrido por prefijo encuentra subcadenas.
+    Cada nodo guarda hasta _MAX_IDS_POR_NODO ids en orden de recencia.
+    """
+    raiz = {}
+    for id_orden, codigo, linea, fecha in filas:
+        vistos = set()
+        for clave in _claves_busqueda(codigo, linea, fecha):
+            for i in range(len(clave)):
+                nodo = raiz
+                for caracter in clave[i:]:
+                    nodo = nodo.setdefault(caracter, {})
+                    ids = nodo.setdefault("", [])
+                    if (id(nodo) not in vistos) and len(ids) < _MAX_IDS_POR_NODO:
+                        ids.append(id_orden)
+                        vistos.add(id(nodo))
+    return raiz
+
+
+def buscar_en_trie(trie, texto):
+    nodo = trie
+    for caracter in texto.lower():
+        nodo = nodo.get(caracter)
+        if nodo is None:
+            return []
+    return nodo.get("", [])
+
+
+@st.cache_resource(ttl=60, max_entries=1)
+def ordenes_recientes(dias=DIAS_ORDENES_RECIENTES):
+    """
+    Órdenes de los últimos `dias` días: ({id: fila}, trie). Compartido entre sesiones;
+    quien crea, modifica o elimina órdenes llama a ordenes_recientes.clear().
+    """
+    conn = get_connection()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("""
+            SELECT o.idOrdenTrabajo AS ID, o.codigoOrden, o.fecha, o.turno,
+                    l.nombreLinea AS Linea, o.idLinea
+            FROM OrdenTrabajo o
+            INNER JOIN LineaProduccion l ON o.idLinea = l.idLinea
+            WHERE o.fecha >= %s
+            ORDER BY o.fecha DESC, o.idOrdenTrabajo DESC
+        """, (date.today() - timedelta(days=dias + 1),))
+        filas = cursor.fetchall()
+    finally:
+        conn.close()
+    por_id = {f["ID"]: f for f in filas}
+    trie = construir_trie((f["ID"], f["codigoOrden"], f["Linea"], f["fecha"]) for f in filas)
+    return por_id, trie
+
+
+def buscar_ordenes(texto="", solo_turnos_recientes=True, limite=MAX_RESULTADOS_BUSQUEDA):
+    """
+    Órdenes que coinciden con `texto` en código, línea o fecha (AAAA-MM-DD),
+    más recientes primero. Por defecto sólo el turno actual y el anterior.
+    Devuelve lista de dicts (ID, codigoOrden, fecha, turno, Linea, idLinea).
+    """
+    texto = (texto or "").strip()
+    if solo_turnos_recientes:
+        por_id, trie = ordenes_recientes()
+        turnos = set(turnos_recientes())
+        ids = buscar_en_trie(trie, texto) if texto else list(por_id)
+        resultado = []
+        for id_orden in ids:
+            fila = por_id[id_orden]
+            if (fila["fecha"], fila["turno"]) in turnos:
+                resultado.append(fila)
+                if len(resultado) >= limite:
+                    break
+        return resultado
+
+    if not texto:
+        return []
+    prefijo = texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    conn = get_connection()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        # primero prefijos de código (usa el índice), luego subcadenas en código/línea/fecha
+        cursor.execute("""
+            (SELECT o.idOrdenTrabajo AS ID, o.codigoOrden, o.fecha, o.turno,
+                    l.nombreLinea AS Linea, o.idLinea, 0 AS prioridad
+                FROM OrdenTrabajo o
+                INNER JOIN LineaProduccion l ON o.idLinea = l.idLinea
+                WHERE o.codigoOrden LIKE %s
+                ORDER BY o.fecha DESC, o.idOrdenTrabajo DESC
+                LIMIT %s)
+            UNION ALL
+            (SELECT o.idOrdenTrabajo AS ID, o.codigoOrden, o.fecha, o.turno,
+                    l.nombreLinea AS Linea, o.idLinea, 1 AS prioridad
+                FROM OrdenTrabajo o
+                INNER JOIN LineaProduccion l ON o.idLinea = l.idLinea
+                WHERE o.codigoOrden NOT LIKE %s
+                    AND (o.codigoOrden LIKE %s OR l.nombreLinea LIKE %s OR CAST(o.fecha AS CHAR) LIKE %s)
+                ORDER BY o.fecha DESC, o.idOrdenTrabajo DESC
+                LIMIT %s)
+            ORDER BY prioridad, fecha DESC, ID DESC
+            LIMIT %s
+        """, (f"{prefijo}%", limite, f"{prefijo}%", f"%{prefijo}%", f"%{prefijo}%", f"%{prefijo}%", limite, limite))
+        filas = cursor.fetchall()
+    finally:
+        conn.close()
+    for f in filas:
+        f.pop("prioridad", None)
+    return filas
+
+
+def buscar_por_lote(lote, exacto=True, limite=MAX_RESULTADOS_BUSQUEDA):
+    """
+    Resuelve un lote (exacto o por prefijo) a detalle, orden, presentación y línea
+    en una sola consulta apoyada en idx_detalle_lote. Más recientes primero.
+    """
+    lote = sanitize_str(lote)
+    if not lote:
+        return []
+    if exacto:
+        condicion_lote, valor = "d.lote = %s", lote
+    else:
+        condicion_lote = "d.lote LIKE %s"
+        valor = lote.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    conn = get_connection()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(f"""
+            SELECT d.idDetalle, d.lote, d.idPresentacion, p.nombrePresentacion,
+                    o.idOrdenTrabajo, o.codigoOrden, o.fecha, o.turno,
+                    o.idLinea, l.nombreLinea
+            FROM DetalleOrdenTrabajo d
+            INNER JOIN OrdenTrabajo o ON d.idOrdenTrabajo = o.idOrdenTrabajo
+            LEFT JOIN PresentacionProducto p ON d.idPresentacion = p.idPresentacion
+            LEFT JOIN LineaProduccion l ON o.idLinea = l.idLinea
+            WHERE {condicion_lote}
+            ORDER BY o.fecha DESC, d.idDetalle DESC
+            LIMIT %s
+        """, (valor, limite))
+        filas = cursor.fetchall()
+    finally:
+        conn.close()
+    return filas
+
+
 def obtener_detalles(idOrden):
     conn = get_connection()
     query = """
@@ -352,6 +538,69 @@ def obtener_detalles(idOrden):
     return df
 
 
+def cargar_pagina_ordenes(ids_orden):
+    """
+    Carga en bloque una página de órdenes: las órdenes, todos sus detalles
+    (una consulta cada una) y las presentaciones de sus líneas (desde el
+    catálogo). Devuelve tres dicts: {idOrden: orden}, {idOrden: DataFrame
+    de detalles} y {idLinea: [(idPresentacion, nombrePresentacion)]}.
+    """
+    ids_orden = [int(i) for i in ids_orden]
+    if not ids_orden:
+        return {}, {}, {}
+    marcadores = ", ".join(["%s"] * len(ids_orden))
+    conn = get_connection()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(f"""
+            SELECT o.*, l.nombreLinea
+            FROM OrdenTrabajo o
+            LEFT JOIN LineaProduccion l ON o.idLinea = l.idLinea
+            WHERE o.idOrdenTrabajo IN ({marcadores})
+        """, tuple(ids_orden))
+        ordenes = {int(o["idOrdenTrabajo"]): o for o in cursor.fetchall()}
+        cursor.close()
+
+        df_det = pd.read_sql(f"""
+            SELECT 
+                d.idOrdenTrabajo,
+                d.idDetalle,
+                d.idPresentacion,
+                p.nombrePresentacion AS Producto,
+                d.receta AS Receta,
+                d.lote AS Lote,
+                d.fechaVencimiento AS FechaVencimiento,
+                d.rendimientoReceta AS RendimientoReceta,
+                d.rendimientoCajasB AS RendimientoCajasB,
+                d.produccionUnidades AS ProduccionUnidades,
+                d.produccionCajasB AS ProduccionCajasB,
+                d.observacion AS Observacion
+            FROM DetalleOrdenTrabajo d
+            LEFT JOIN PresentacionProducto p 
+                ON d.idPresentacion = p.idPresentacion
+            WHERE d.idOrdenTrabajo IN ({marcadores})
+            ORDER BY d.idOrdenTrabajo, d.idDetalle;
+        """, conn, params=tuple(ids_orden))
+    finally:
+        conn.close()
+
+    columnas_det = [c for c in df_det.columns if c != "idOrdenTrabajo"]
+    detalles = {
+        int(id_orden): grupo[columnas_det].reset_index(drop=True)
+        for id_orden, grupo in df_det.groupby("idOrdenTrabajo", sort=False)
+    }
+    vacio = pd.DataFrame(columns=columnas_det)
+    detalles = {i: detalles.get(i, vacio) for i in ids_orden}
+
+    lineas_pagina = {o.get("idLinea") for o in ordenes.values()}
+    pres = obtener_catalogo()["presentaciones"]
+    presentaciones = {
+        id_linea: como_tuplas(pres[pres["idLinea"] == id_linea], ["idPresentacion", "nombrePresentacion"])
+        for id_linea in lineas_pagina
+    }
+    return ordenes, detalles, presentaciones
+
+
 def actualizar_detalle(idDetalle, idPresentacion, receta, fechaVencimiento, lote,
                         observacion, rendimientoReceta, rendimientoCajasB,
                         produccionUnidades, produccionCajasB):
@@ -407,6 +656,7 @@ def eliminar_detalle(idDetalle):
     try:
         cursor = conn.cursor()
         cursor.execute("DELETE FROM DetalleOrdenTrabajo WHERE idDetalle = %s", (idDetalle,))
+        cursor.execute("DELETE FROM resumencalidadorden WHERE idDetalle = %s", (idDetalle,))
         conn.commit()
     except Exception:
         conn.rollback()
@@ -414,6 +664,242 @@ def eliminar_detalle(idDetalle):
     finally:
         conn.close()
 
+# IMPORTACIÓN MASIVA DEL PLAN DE PRODUCCIÓN
+# Una fila por detalle; los datos de la orden se repiten en cada fila de la misma orden.
+
+TURNOS = ["T1-8H", "T2-8H", "T3-8H"]
+DIAS_SEMANA = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"]
+COLUMNAS_PLAN = [
+    "codigoOrden", "fecha", "turno", "linea", "presentacion", "receta", "lote", "fechaVencimiento",
+    "rendimientoReceta", "rendimientoCajasB", "produccionUnidades", "produccionCajasB",
+]
+COLUMNAS_PLAN_OPCIONALES = ["semana", "dia", "observacion"]
+
+
+def leer_plan_produccion(archivo):
+    nombre = getattr(archivo, "name", str(archivo)).lower()
+    if nombre.endswith((".xlsx", ".xls")):
+        df = pd.read_excel(archivo, dtype=str)
+    else:
+        df = pd.read_csv(archivo, dtype=str, sep=None, engine="python")
+    df.columns = [str(c).strip() for c in df.columns]
+    return df
+
+
+def validar_plan_produccion(df):
+    """
+    Valida todas las filas del plan de forma vectorizada.
+    Devuelve (plan normalizado, DataFrame de errores con columnas fila/error).
+    Una orden con cualquier fila inválida se rechaza completa.
+    """
+    faltantes = [c for c in COLUMNAS_PLAN if c not in df.columns]
+    if faltantes:
+        raise ValueError(f"Faltan columnas en el archivo: {', '.join(faltantes)}")
+
+    plan = df.copy().reset_index(drop=True)
+    for c in COLUMNAS_PLAN_OPCIONALES:
+        if c not in plan.columns:
+            plan[c] = None
+    plan["fila"] = plan.index + 2  # fila en la hoja (con encabezado)
+    reglas = []
+
+    def texto(col, largo):
+        return plan[col].fillna("").astype(str).str.strip().str.slice(0, largo)
+
+    plan["codigoOrden"] = texto("codigoOrden", MAX_CODIGO_LEN)
+    for col in ["receta", "lote", "observacion", "turno", "dia", "linea", "presentacion"]:
+        plan[col] = texto(col, MAX_TEXT_LEN)
+    reglas.append((plan["codigoOrden"] == "", "El código de orden es obligatorio."))
+    reglas.append((plan["receta"] == "", "Receta es obligatoria."))
+    reglas.append((plan["lote"] == "", "Lote es obligatorio."))
+    reglas.append((plan["presentacion"] == "", "Presentación es obligatoria."))
+    reglas.append((~plan["turno"].isin(TURNOS), "Turno inválido."))
+
+    # fechas
+    hoy = pd.Timestamp(date.today())
+    fecha = parsear_fechas(plan["fecha"])
+    reglas.append((fecha.isna(), "Fecha inválida."))
+    reglas.append((fecha < pd.Timestamp(2000, 1, 1), "Fecha demasiado antigua."))
+    reglas.append((fecha > hoy + pd.DateOffset(years=1), "Fecha fuera de rango."))
+    semana_iso = fecha.dt.isocalendar().week.astype("Int64")
+    semana = pd.to_numeric(plan["semana"], errors="coerce").astype("Int64")
+    reglas.append((semana.notna() & (semana != semana_iso), "La semana no coincide con la semana ISO de la fecha."))
+    plan["semana"] = semana_iso
+    dia_fecha = fecha.dt.dayofweek.map(dict(enumerate(DIAS_SEMANA))).astype("string")
+    reglas.append((fecha.notna() & (plan["dia"] != "") & (plan["dia"].str.lower() != dia_fecha.str.lower()), "El día no corresponde a la fecha."))
+    plan["dia"] = dia_fecha
+    plan["fecha"] = fecha.dt.date
+
+    vencimiento = parsear_fechas(plan["fechaVencimiento"])
+    reglas.append((vencimiento.isna(), "Fecha de vencimiento inválida."))
+    reglas.append((vencimiento < hoy, "La fecha de vencimiento no puede ser anterior a hoy."))
+    plan["fechaVencimiento"] = vencimiento.dt.date
+
+    # rendimientos y producciones
+    for col, nombre, permitir_cero in [
+        ("rendimientoReceta", "Rendimiento Receta", False),
+        ("produccionUnidades", "Producción Unidades", False),
+        ("rendimientoCajasB", "Rendimiento Cajas B", True),
+        ("produccionCajasB", "Producción Cajas B", True),
+    ]:
+        valores = pd.to_numeric(plan[col].astype(str).str.replace(",", ".", regex=False), errors="coerce")
+        reglas.append((valores.isna(), f"{nombre} debe ser numérico."))
+        reglas.append(((valores < 0) if permitir_cero else (valores <= 0),
+                        f"{nombre} {'no puede ser negativo' if permitir_cero else 'debe ser mayor que 0'}."))
+        plan[col] = valores
+
+    # línea y presentación contra el catálogo (por nombre o código, sin distinguir mayúsculas)
+    catalogo = obtener_catalogo()
+    lineas_cat = catalogo["lineas"]
+    mapa_linea = dict(zip(lineas_cat["nombreLinea"].str.lower(), lineas_cat["idLinea"]))
+    plan["idLinea"] = plan["linea"].str.lower().map(mapa_linea).astype("Int64")
+    reglas.append((plan["idLinea"].isna(), "Línea no encontrada."))
+
+    pres_cat = catalogo["presentaciones"]
+    por_nombre = pres_cat.assign(clave=pres_cat["nombrePresentacion"].str.lower())[["idLinea", "clave", "idPresentacion"]]
+    por_codigo = pres_cat.assign(clave=pres_cat["codigoPresentacion"].fillna("").astype(str).str.lower())[["idLinea", "clave", "idPresentacion"]]
+    por_codigo = por_codigo[por_codigo["clave"] != ""]  # presentaciones sin código
+    claves = pd.concat([por_codigo, por_nombre]).drop_duplicates(["idLinea", "clave"], keep="last")
+    claves["idLinea"] = claves["idLinea"].astype("Int64")
+    plan = plan.assign(clave=plan["presentacion"].str.lower()).merge(claves, on=["idLinea", "clave"], how="left").drop(columns="clave")
+    plan["idPresentacion"] = plan["idPresentacion"].astype("Int64")
+    reglas.append((plan["idLinea"].notna() & plan["idPresentacion"].isna(), "Presentación no encontrada en la línea indicada."))
+
+    # consistencia dentro del archivo: mismo código = misma cabecera de orden
+    cabecera = ["fecha", "turno", "idLinea"]
+    cabeceras_distintas = plan.groupby("codigoOrden")[cabecera].transform("nunique", dropna=False).max(axis=1) > 1
+    reglas.append((cabeceras_distintas, "El código de orden se repite en el archivo con otra fecha, turno o línea."))
+    reglas.append((plan.duplicated(["codigoOrden", "lote", "idPresentacion"], keep=False), "Detalle duplicado (misma orden, lote y presentación)."))
+
+    # códigos ya existentes en la base (una sola consulta)
+    codigos = [c for c in plan["codigoOrden"].unique().tolist() if c]
+    existentes = set()
+    if codigos:
+        conn = get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT codigoOrden FROM OrdenTrabajo WHERE codigoOrden IN ({', '.join(['%s'] * len(codigos))})",
+                tuple(codigos)
+            )
+            existentes = {r[0] for r in cursor.fetchall()}
+        finally:
+            conn.close()
+    reglas.append((plan["codigoOrden"].isin(existentes), "Ya existe una orden con ese código."))
+
+    errores = pd.concat(
+        [pd.DataFrame({"fila": plan.loc[m.fillna(False).astype(bool), "fila"], "error": msg}) for m, msg in reglas],
+        ignore_index=True
+    )
+    if not errores.empty:
+        filas_malas = set(errores["fila"])
+        ordenes_malas = set(plan.loc[plan["fila"].isin(filas_malas), "codigoOrden"])
+        arrastradas = plan[plan["codigoOrden"].isin(ordenes_malas) & ~plan["fila"].isin(filas_malas)]
+        errores = pd.concat([errores, pd.DataFrame({
+            "fila": arrastradas["fila"], "error": "Rechazada: otra fila de la misma orden tiene errores."
+        })], ignore_index=True)
+        errores = errores.groupby("fila")["error"].apply(" ".join).reset_index()
+        plan = plan[~plan["codigoOrden"].isin(ordenes_malas)]
+    return plan.reset_index(drop=True), errores
+
+
+def importar_plan_produccion(plan):
+    """
+    Inserta órdenes y detalles ya validados en una sola transacción, con
+    sentencias por lotes. Devuelve (órdenes creadas, detalles creados).
+    """
+    if plan.empty:
+        return 0, 0
+    ordenes = plan.drop_duplicates("codigoOrden")
+    filas_orden = [
+        (r.codigoOrden, r.fecha, int(r.semana), r.dia, r.turno, int(r.idLinea))
+        for r in ordenes.itertuples(index=False)
+    ]
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.executemany("""
+            INSERT INTO OrdenTrabajo (codigoOrden, fecha, semana, dia, turno, idLinea)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, filas_orden)
+        codigos = [f[0] for f in filas_orden]
+        cursor.execute(
+            f"SELECT codigoOrden, idOrdenTrabajo FROM OrdenTrabajo WHERE codigoOrden IN ({', '.join(['%s'] * len(codigos))})",
+            tuple(codigos)
+        )
+        ids = dict(cursor.fetchall())
+        filas_detalle = [
+            (int(r.idPresentacion), r.receta, r.fechaVencimiento, r.lote, r.observacion or None,
+                float(r.rendimientoReceta), float(r.rendimientoCajasB),
+                float(r.produccionUnidades), float(r.produccionCajasB), ids[r.codigoOrden])
+            for r in plan.itertuples(index=False)
+        ]
+        cursor.executemany("""
+            INSERT INTO DetalleOrdenTrabajo (
+                idPresentacion, receta, fechaVencimiento, lote,
+                observacion, rendimientoReceta, rendimientoCajasB,
+                produccionUnidades, produccionCajasB, idOrdenTrabajo
+            )
+            VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+        """, filas_detalle)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    ordenes_recientes.clear()
+    return len(filas_orden), len(filas_detalle)
+
+
+def importar_plan_ui():
+    st.subheader("Importar Plan de Producción (CSV / Excel)")
+    st.caption(
+        "Una fila por detalle. Columnas: " + ", ".join(COLUMNAS_PLAN)
+        + " (opcionales: " + ", ".join(COLUMNAS_PLAN_OPCIONALES) + ")."
+    )
+    archivo = st.file_uploader("Archivo del plan semanal", type=["csv", "xlsx", "xls"])
+    if archivo is None:
+        return
+
+    try:
+        plan_crudo = leer_plan_produccion(archivo)
+        plan, errores = validar_plan_produccion(plan_crudo)
+    except ValueError as ve:
+        st.error(f"Validación: {ve}")
+        return
+    except Exception as e:
+        st.error(f"Error leyendo el archivo: {e}")
+        return
+
+    n_ordenes = plan["codigoOrden"].nunique() if not plan.empty else 0
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Filas leídas", len(plan_crudo))
+    c2.metric("Órdenes válidas", n_ordenes)
+    c3.metric("Filas con errores", len(errores))
+
+    if not errores.empty:
+        st.markdown("#### Filas rechazadas")
+        st.dataframe(errores, use_container_width=True)
+        st.download_button("Descargar errores (CSV)", errores.to_csv(index=False).encode("utf-8"),
+                            file_name="errores_plan.csv", mime="text/csv")
+
+    if plan.empty:
+        st.info("No hay órdenes válidas para importar.")
+        return
+
+    st.markdown("#### Vista previa")
+    st.dataframe(plan.drop(columns=["fila"]), use_container_width=True)
+
+    if st.button(f"Importar {n_ordenes} órdenes ({len(plan)} detalles)"):
+        try:
+            creadas, detalles = importar_plan_produccion(plan)
+            st.success(f"Se importaron {creadas} órdenes y {detalles} detalles.")
+        except Exception as e:
+            st.error(f"Error importando el plan (no se guardó ningún registro): {e}")
+            st.write(traceback.format_exc())
+
+
 # INTERFAZ STREAMLIT
 def gestionar_ordenes():
 
@@ -430,7 +916,7 @@ def gestionar_ordenes():
         st.warning("No existen líneas de producción registradas.")
         return
 
-    menu = st.sidebar.radio("Menú de Órdenes", ["Registrar Nueva Orden", "Consultar Órdenes"])
+    menu = st.sidebar.radio("Menú de Órdenes", ["Registrar Nueva Orden", "Consultar Órdenes", "Importar Plan Semanal"])
 
     # REGISTRAR NUEVA ORDEN
     if menu == "Registrar Nueva Orden":
@@ -559,6 +1045,10 @@ def gestionar_ordenes():
             else:
                 st.dataframe(detalles_df, use_container_width=True)
 
+    # IMPORTAR PLAN SEMANAL
+    elif menu == "Importar Plan Semanal":
+        importar_plan_ui()
+
     # CONSULTAR ÓRDENES
     elif menu == "Consultar Órdenes":
 
@@ -576,6 +1066,15 @@ def gestionar_ordenes():
             return
 
         df_ordenes["fecha"] = pd.to_datetime(df_ordenes["fecha"]).dt.date
+        df_ordenes.insert(df_ordenes.columns.get_loc("Controles"), "Calidad", estado_calidad(df_ordenes))
+
+        if st.button("Recalcular resumen de calidad"):
+            try:
+                recalcular_resumen_calidad()
+                st.success("Resumen de calidad recalculado.")
+                st.experimental_rerun()
+            except Exception as e:
+                st.error(f"Error recalculando el resumen: {e}")
 
         # FILTROS ORGANIZADOS
         col1, col2, col3 = st.columns(3)
@@ -603,26 +1102,16 @@ def gestionar_ordenes():
         # BUSCADOR
         codigo_buscar = st.text_input("Buscar por Código de Orden")
 
-        # APLICAR FILTROS
-        df_filtrado = df_ordenes.copy()
-
-        if usar_fecha:
-            df_filtrado = df_filtrado[df_filtrado["fecha"] == fecha_filtro]
-
-        if semana_filtro != 0:
-            df_filtrado = df_filtrado[df_filtrado["semana"] == semana_filtro]
-
-        if dia_filtro != "Todos":
-            df_filtrado = df_filtrado[df_filtrado["dia"].str.lower() == dia_filtro.lower()]
-
-        if turno_filtro != "Todos":
-            df_filtrado = df_filtrado[df_filtrado["turno"] == turno_filtro]
-
-        if linea_filtro != "Todas":
-            df_filtrado = df_filtrado[df_filtrado["Linea"] == linea_filtro]
-
-        if codigo_buscar:
-            df_filtrado = df_filtrado[df_filtrado["codigoOrden"].str.contains(codigo_buscar, case=False, na=False)]
+        # APLICAR FILTROS (una sola máscara)
+        spec = filtro(
+            condicion("fecha", "=", fecha_filtro if usar_fecha else None),
+            condicion("semana", "=", semana_filtro if semana_filtro != 0 else None),
+            condicion("dia", "igual_texto", dia_filtro if dia_filtro != "Todos" else None),
+            condicion("turno", "=", turno_filtro if turno_filtro != "Todos" else None),
+            condicion("Linea", "=", linea_filtro if linea_filtro != "Todas" else None),
+            condicion("codigoOrden", "contiene", codigo_buscar or None),
+        )
+        df_filtrado = aplicar(spec, df_ordenes)
 
         # RESULTADOS
         st.markdown("### Órdenes encontradas")
@@ -635,18 +1124,24 @@ def gestionar_ordenes():
 
         st.markdown("### Detalle por orden (desplegar para ver / editar)")
 
+        # Paginación: sólo se cargan en bloque las órdenes de la página visible
+        total_paginas = max(1, -(-len(df_filtrado) // TAM_PAGINA_ORDENES))
+        pagina = st.number_input(f"Página (de {total_paginas})", min_value=1, max_value=total_paginas, value=1, step=1)
+        df_pagina = df_filtrado.iloc[(pagina - 1) * TAM_PAGINA_ORDENES: pagina * TAM_PAGINA_ORDENES]
+
+        try:
+            ordenes_pag, detalles_pag, presentaciones_pag = cargar_pagina_ordenes(df_pagina["ID"].tolist())
+        except Exception as e:
+            st.error(f"Error cargando órdenes: {e}")
+            return
+
         # Crear expanders por cada orden
-        for _, row in df_filtrado.iterrows():
-            idOrden = int(row["ID"])
-            titulo = f"{row['codigoOrden']} — Semana {row['semana']} — {row['dia']} — {row['Linea']}"
+        for row in df_pagina.itertuples(index=False):
+            idOrden = int(row.ID)
+            titulo = f"{row.codigoOrden} — Semana {row.semana} — {row.dia} — {row.Linea}"
 
             with st.expander(titulo, expanded=False):
-                # Cargar datos completos de la orden
-                try:
-                    orden = obtener_orden_por_id(idOrden)
-                except Exception as e:
-                    st.error(f"Error cargando orden: {e}")
-                    continue
+                orden = ordenes_pag.get(idOrden)
 
                 if not orden:
                     st.error("No se pudo cargar la orden desde la base de datos.")
@@ -662,7 +1157,7 @@ def gestionar_ordenes():
                 st.markdown("---")
 
                 # Detalles
-                detalles_df = obtener_detalles(idOrden)
+                detalles_df = detalles_pag[idOrden]
 
                 if detalles_df.empty:
                     st.info("No hay detalles registrados para esta orden.")
@@ -699,7 +1194,7 @@ def gestionar_ordenes():
                                 # Formulario para editar detalle
                                 if st.button(f"Editar detalle {idDetalle}", key=f"edit_det_btn_{idDetalle}"):
                                     try:
-                                        presentaciones = obtener_presentaciones_linea(orden.get("idLinea"))
+                                        presentaciones = presentaciones_pag.get(orden.get("idLinea"), [])
                                         opciones_pres = {p[1]: p[0] for p in presentaciones} if presentaciones else {}
 
                                         with st.form(f"form_edit_det_{idDetalle}", clear_on_submit=False):
@@ -753,7 +1248,7 @@ def gestionar_ordenes():
 
                 # Formulario para agregar nuevo detalle
                 st.markdown("#### Agregar nuevo detalle a esta orden")
-                presentaciones_linea = obtener_presentaciones_linea(orden.get("idLinea"))
+                presentaciones_linea = presentaciones_pag.get(orden.get("idLinea"), [])
                 opciones_new = {p[1]: p[0] for p in presentaciones_linea} if presentaciones_linea else {}
 
                 with st.form(f"form_agregar_detalle_{idOrden}", clear_on_submit=True):
@@ -0,0 +1,191 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+from database.db_connection import get_connection
+from modules.catalogo import obtener_catalogo
+from modules.graficos_control import D2_N2
+
+# PANEL EN VIVO (pantalla de planta)
+#
+# Tres paneles que se refrescan solos como fragmentos (st.fragment con
+# run_every): sólo se vuelve a ejecutar el fragmento, no la página. Cada panel
+# guarda en la sesión sus filas y una marca de agua (último id visto) y en cada
+# refresco pide únicamente las filas nuevas (id > marca). Las consultas se
+# cachean unos segundos por marca, así varias pantallas en la misma marca
+# comparten una sola consulta. El estado de las alertas ya mostradas cambia
+# después (confirmación, re-evaluación): se vuelve a leer en cada refresco
+# para el rango de ids del buffer.
+
+REFRESCO_PANEL = 5
+MAX_ALERTAS_PANEL = 200
+ULTIMOS_POR_LINEA = 20
+VENTANA_IMR = 50
+HORAS_INICIALES = 8
+MAX_FILAS_CONSULTA = 20000
+
+# st.fragment (Streamlit >= 1.37); en versiones anteriores, experimental_fragment
+fragmento = getattr(st, "fragment", None) or getattr(st, "experimental_fragment")
+
+
+def _consultar(sql, params):
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        columnas = [c[0] for c in cursor.description]
+        df = pd.DataFrame(cursor.fetchall(), columns=columnas)
+        cursor.close()
+    finally:
+        conn.close()
+    return df
+
+
+@st.cache_data(ttl=REFRESCO_PANEL, max_entries=16, show_spinner=False)
+def alertas_desde(marca):
+    """Alertas con idAlerta > marca (None = las MAX_ALERTAS_PANEL más recientes), ascendentes."""
+    if marca is None:
+        return _consultar("""
+            SELECT * FROM (
+                SELECT idAlerta, fechaAlerta, tipoAlerta, estado, idLinea, idParametro, idPresentacion,
+                        valorFuera, limiteInferior, limiteSuperior, descripcion
+                FROM alerta ORDER BY idAlerta DESC LIMIT %s
+            ) t ORDER BY idAlerta
+        """, (MAX_ALERTAS_PANEL,))
+    return _consultar("""
+        SELECT idAlerta, fechaAlerta, tipoAlerta, estado, idLinea, idParametro, idPresentacion,
+                valorFuera, limiteInferior, limiteSuperior, descripcion
+        FROM alerta WHERE idAlerta > %s ORDER BY idAlerta LIMIT %s
+    """, (int(marca), MAX_FILAS_CONSULTA))
+
+
+@st.cache_data(ttl=REFRESCO_PANEL, max_entries=16, show_spinner=False)
+def estados_alertas(id_desde, id_hasta):
+    """idAlerta y estado actual de las alertas con id en [id_desde, id_hasta]."""
+    return _consultar("SELECT idAlerta, estado FROM alerta WHERE idAlerta BETWEEN %s AND %s",
+                        (int(id_desde), int(id_hasta)))
+
+
+@st.cache_data(ttl=REFRESCO_PANEL, max_entries=16, show_spinner=False)
+def controles_desde(marca):
+    """Controles con idControl > marca (None = las últimas HORAS_INICIALES horas), ascendentes."""
+    columnas = """idControl, fechaControl, resultado, idLinea, idParametro, idPresentacion, idDetalle"""
+    if marca is None:
+        return _consultar(f"""
+            SELECT {columnas} FROM controlcalidad
+            WHERE fechaControl >= NOW() - INTERVAL %s HOUR
+            ORDER BY idControl LIMIT %s
+        """, (HORAS_INICIALES, MAX_FILAS_CONSULTA))
+    return _consultar(f"""
+        SELECT {columnas} FROM controlcalidad
+        WHERE idControl > %s ORDER BY idControl LIMIT %s
+    """, (int(marca), MAX_FILAS_CONSULTA))
+
+
+def _acumular(clave, nuevas, id_col, recortar):
+    """Agrega `nuevas` al buffer de la sesión, aplica `recortar` y avanza la marca. Devuelve (buffer, n nuevas)."""
+    previo = st.session_state.get(clave)
+    buffer = nuevas if previo is None else pd.concat([previo, nuevas], ignore_index=True)
+    buffer = recortar(buffer)
+    st.session_state[clave] = buffer
+    if not nuevas.empty:
+        st.session_state[f"{clave}_marca"] = int(nuevas[id_col].max())
+    return buffer, len(nuevas)
+
+
+def _nombres(df):
+    cat = obtener_catalogo()
+    mapas = {
+        "Linea": ("idLinea", cat["lineas"].set_index("idLinea")["nombreLinea"]),
+        "Parametro": ("idParametro", cat["parametros"].set_index("idParametro")["nombreParametro"]),
+        "Presentacion": ("idPresentacion", cat["presentaciones"].set_index("idPresentacion")["nombrePresentacion"]),
+    }
+    df = df.copy()
+    for nombre, (col, mapa) in mapas.items():
+        if col in df.columns:
+            df[nombre] = df[col].map(mapa)
+    return df
+
+
+def estado_imr(controles, ventana=VENTANA_IMR):
+    """
+    Estado I-MR vectorizado por (línea, parámetro, presentación) sobre los últimos
+    `ventana` puntos: media, sigma (MR̄/d2), límites ±3σ, último valor y si está fuera.
+    """
+    claves = ["idLinea", "idParametro", "idPresentacion"]
+    df = controles.copy()
+    df[claves] = df[claves].fillna(-1).astype("int64")
+    df = df.sort_values(claves + ["fechaControl", "idControl"], kind="stable")
+    df = df.groupby(claves, sort=False).tail(ventana)
+    x = pd.to_numeric(df["resultado"], errors="coerce").astype("float64")
+    mismo_grupo = (df[claves] == df[claves].shift()).all(axis=1)
+    mr = x.diff().abs().where(mismo_grupo)
+    g = pd.DataFrame({"x": x, "mr": mr, "fecha": df["fechaControl"]}).groupby(
+        [df[c] for c in claves], sort=False)
+    est = g.agg(n=("x", "count"), media=("x", "mean"), mrbar=("mr", "mean"),
+                ultimo=("x", "last"), ultimaFecha=("fecha", "last")).reset_index()
+    sigma = est["mrbar"] / D2_N2
+    est["UCL"] = est["media"] + 3 * sigma
+    est["LCL"] = est["media"] - 3 * sigma
+    est["fueraControl"] = (est["n"] >= 2) & ((est["ultimo"] > est["UCL"]) | (est["ultimo"] < est["LCL"]))
+    return est
+
+
+@fragmento(run_every=REFRESCO_PANEL)
+def panel_alertas():
+    marca = st.session_state.get("vivo_alertas_marca")
+    nuevas = alertas_desde(marca)
+    buffer, n = _acumular("vivo_alertas", nuevas, "idAlerta", lambda b: b.tail(MAX_ALERTAS_PANEL))
+    st.subheader("Alertas recientes")
+    if buffer.empty:
+        st.info("Sin alertas.")
+        return
+    estados = estados_alertas(buffer["idAlerta"].min(), buffer["idAlerta"].max()).set_index("idAlerta")["estado"]
+    buffer = buffer.assign(estado=buffer["idAlerta"].map(estados).fillna(buffer["estado"]))
+    st.session_state["vivo_alertas"] = buffer
+    if marca is not None and n:
+        st.warning(f"{n} alerta(s) nueva(s).")
+    vista = _nombres(buffer.iloc[::-1])
+    st.dataframe(vista[["fechaAlerta", "Linea", "Parametro", "Presentacion", "tipoAlerta", "valorFuera",
+                        "limiteInferior", "limiteSuperior", "estado"]], use_container_width=True, height=320)
+
+
+@fragmento(run_every=REFRESCO_PANEL)
+def panel_controles_e_imr():
+    nuevas = controles_desde(st.session_state.get("vivo_controles_marca"))
+    claves = ["idLinea", "idParametro", "idPresentacion"]
+    buffer, _ = _acumular("vivo_controles", nuevas, "idControl",
+                            lambda b: b.groupby(claves, sort=False, dropna=False).tail(VENTANA_IMR))
+    if buffer.empty:
+        st.info(f"Sin controles en las últimas {HORAS_INICIALES} horas.")
+        return
+
+    col_ctrl, col_imr = st.columns(2)
+    with col_ctrl:
+        st.subheader(f"Últimos {ULTIMOS_POR_LINEA} controles por línea")
+        ultimos = buffer.sort_values("idControl").groupby("idLinea", sort=False).tail(ULTIMOS_POR_LINEA)
+        ultimos = _nombres(ultimos.sort_values(["idLinea", "idControl"], ascending=[True, False]))
+        for linea, g in ultimos.groupby("Linea", sort=True):
+            with st.expander(str(linea), expanded=False):
+                st.dataframe(g[["fechaControl", "Parametro", "Presentacion", "resultado"]],
+                                use_container_width=True)
+    with col_imr:
+        st.subheader("Estado I-MR actual")
+        est = _nombres(estado_imr(buffer))
+        est["estado"] = np.where(est["n"] < 2, "sin datos suficientes",
+                                    np.where(est["fueraControl"], "FUERA DE CONTROL", "en control"))
+        est = est.sort_values(["fueraControl", "Linea", "Parametro"], ascending=[False, True, True])
+        st.dataframe(est[["Linea", "Parametro", "Presentacion", "estado", "ultimo", "LCL", "UCL", "n",
+                            "ultimaFecha"]], use_container_width=True, height=420)
+
+
+def ver_panel_vivo():
+    st.title("Panel en Vivo")
+    st.caption(f"Se actualiza cada {REFRESCO_PANEL} s sin recargar la página.")
+    st.markdown("---")
+    panel_alertas()
+    st.markdown("---")
+    panel_controles_e_imr()
+
+
+if __name__ == "__main__":
+    ver_panel_vivo()
@@ -0,0 +1,232 @@
+import streamlit as st
+import pandas as pd
+from datetime import date, datetime, timedelta
+from database.db_connection import get_connection
+from modules.catalogo import obtener_catalogo
+from modules.especificaciones import obtener_versiones, adjuntar_limites_vigentes, especificacion_efectiva
+from modules.resumen_calidad import ESTADO_ALERTA_DESCARTADA, ESTADOS_ALERTA_ABIERTA, refrescar_resumen_calidad
+from modules.evaluacion import TIPOS_ALERTA_ESPEC, evaluar, payloads_alerta, guardar_alertas
+from modules.episodios import descartar_en_episodios, obtener_episodios
+from modules.controles.alertas import cargar_alertas
+
+# RE-EVALUACIÓN RETROACTIVA DE ALERTAS
+#
+# Recorre controlcalidad de un rango de fechas por bloques (paginación por
+# idControl), compara todos los resultados del bloque contra la especificación
+# en una sola operación vectorizada y calcula la diferencia con las alertas
+# existentes:
+#   - nuevas:    controles que no cumplen y no tienen alerta activa → INSERT (executemany)
+#     (la comparación la hace modules.evaluacion, la misma que usa el registro manual)
+#   - obsoletas: alertas abiertas de controles que ahora cumplen     → estado 'descartada'
+#     (y se descuentan de sus episodios). Las que ya decidió una persona
+#     (confirmada, rechazada, cerrada) no se tocan.
+# Cada bloque se aplica en su propia transacción. La marca de la caché de alertas
+# (cantidad, último id) no ve los cambios de estado, así que tras cada bloque
+# aplicado se limpian las cachés de alertas y episodios.
+
+ESTADO_DESCARTADA = ESTADO_ALERTA_DESCARTADA
+TAM_BLOQUE_REEVALUACION = 50000
+
+Q_BLOQUE = """
+    SELECT cc.idControl, cc.fechaControl, cc.resultado, cc.idParametro, cc.idPresentacion,
+            cc.idLinea, cc.idDetalle, cc.idOrdenTrabajo, o.codigoOrden
+    FROM controlcalidad cc
+    LEFT JOIN OrdenTrabajo o ON o.idOrdenTrabajo = cc.idOrdenTrabajo
+    WHERE cc.fechaControl >= %s AND cc.fechaControl < %s AND cc.idControl > %s
+    {filtro_param}
+    ORDER BY cc.idControl
+    LIMIT %s
+"""
+
+
+def evaluar_bloque(bloque, catalogo, criterio="actual", ef=None):
+    """
+    Agrega tipoParametro, límites y `cumple` a los controles del bloque.
+    criterio "actual": especificación efectiva de hoy; "historico": la vigente en cada fechaControl.
+    `ef`: especificacion_efectiva(catalogo) ya calculada (se reutiliza entre bloques).
+    """
+    if ef is None:
+        ef = especificacion_efectiva(catalogo)
+    ef = ef[["idPresentacion", "idParametro", "nombreParametro", "tipoParametro", "limiteInferior", "limiteSuperior"]]
+    df = bloque.merge(ef, on=["idPresentacion", "idParametro"], how="left")
+    # controles de parámetros sin especificación por presentación: límites generales
+    par = catalogo["parametros"].set_index("idParametro")
+    for col in ["nombreParametro", "tipoParametro", "limiteInferior", "limiteSuperior"]:
+        df[col] = df[col].where(df[col].notna(), df["idParametro"].map(par[col]))
+    for col in ["limiteInferior", "limiteSuperior"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+    if criterio == "historico":
+        df = adjuntar_limites_vigentes(df, obtener_versiones())
+
+    return evaluar(df)
+
+
+def _alertas_activas(cursor, id_desde, id_hasta):
+    """Alertas de especificación no descartadas (con su estado) con idControl en (id_desde, id_hasta]."""
+    cursor.execute("""
+        SELECT idAlerta, idControl, estado
+        FROM alerta
+        WHERE idControl > %s AND idControl <= %s
+            AND tipoAlerta IN (%s, %s)
+            AND estado <> %s
+    """, (id_desde, id_hasta) + TIPOS_ALERTA_ESPEC + (ESTADO_DESCARTADA,))
+    return pd.DataFrame(cursor.fetchall(), columns=["idAlerta", "idControl", "estado"])
+
+
+def reevaluar(desde, hasta, ids_parametro=None, criterio="actual", aplicar=False,
+                tam_bloque=TAM_BLOQUE_REEVALUACION, progreso=None):
+    """
+    Re-evalúa los controles con fechaControl en [desde, hasta] (fechas inclusivas).
+    Con aplicar=False sólo calcula la diferencia. `progreso(procesados, bloque)` se
+    llama tras cada bloque. Devuelve un DataFrame resumen por bloque.
+    """
+    fin = hasta + timedelta(days=1)
+    filtro_param, params_param = "", ()
+    if ids_parametro:
+        ids_parametro = [int(i) for i in ids_parametro]
+        filtro_param = f"AND cc.idParametro IN ({', '.join(['%s'] * len(ids_parametro))})"
+        params_param = tuple(ids_parametro)
+    consulta = Q_BLOQUE.format(filtro_param=filtro_param)
+    catalogo = obtener_catalogo()
+    ef = especificacion_efectiva(catalogo)
+
+    resumen = []
+    ultimo_id, procesados, n_bloque = 0, 0, 0
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        while True:
+            cursor.execute(consulta, (desde, fin, ultimo_id) + params_param + (int(tam_bloque),))
+            columnas = [c[0] for c in cursor.description]
+            bloque = pd.DataFrame(cursor.fetchall(), columns=columnas)
+            if bloque.empty:
+                break
+            n_bloque += 1
+            primer_id, ultimo_id = ultimo_id, int(bloque["idControl"].iloc[-1])
+
+            evaluado = evaluar_bloque(bloque, catalogo, criterio, ef)
+            activas = _alertas_activas(cursor, primer_id, ultimo_id)
+            activas = activas[activas["idControl"].isin(bloque["idControl"])]
+            con_alerta = evaluado["idControl"].isin(activas["idControl"])
+            nuevas = evaluado[~evaluado["cumple"] & ~con_alerta]
+            # sólo se descartan alertas abiertas: no se pisan decisiones de una persona
+            obsoletas = activas[activas["estado"].isin(ESTADOS_ALERTA_ABIERTA)
+                                & activas["idControl"].isin(evaluado.loc[evaluado["cumple"], "idControl"])]
+
+            if aplicar and (len(nuevas) or len(obsoletas)):
+                try:
+                    guardar_alertas(cursor, payloads_alerta(nuevas, sufijo=" (re-evaluación)"))
+                    if len(obsoletas):
+                        ids = obsoletas["idAlerta"].astype(int).tolist()
+                        cursor.execute(
+                            f"UPDATE alerta SET estado = %s WHERE idAlerta IN ({', '.join(['%s'] * len(ids))})",
+                            (ESTADO_DESCARTADA,) + tuple(ids)
+                        )
+                        descartar_en_episodios(cursor, ids)
+                    afectados = pd.concat([
+                        nuevas["idDetalle"],
+                        evaluado.loc[evaluado["idControl"].isin(obsoletas["idControl"]), "idDetalle"],
+                    ])
+                    refrescar_resumen_calidad(cursor, afectados.dropna().tolist())
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                cargar_alertas.clear()
+                obtener_episodios.clear()
+
+            procesados += len(bloque)
+            resumen.append({
+                "bloque": n_bloque,
+                "controles": len(bloque),
+                "no_cumplen": int((~evaluado["cumple"]).sum()),
+                "alertas_nuevas": len(nuevas),
+                "alertas_obsoletas": len(obsoletas),
+            })
+            if progreso:
+                progreso(procesados, n_bloque)
+            if len(bloque) < tam_bloque:
+                break
+        cursor.close()
+    finally:
+        conn.close()
+    return pd.DataFrame(resumen, columns=["bloque", "controles", "no_cumplen", "alertas_nuevas", "alertas_obsoletas"])
+
+
+def contar_controles(desde, hasta, ids_parametro=None):
+    filtro_param, params = "", (desde, hasta + timedelta(days=1))
+    if ids_parametro:
+        filtro_param = f"AND idParametro IN ({', '.join(['%s'] * len(ids_parametro))})"
+        params += tuple(int(i) for i in ids_parametro)
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT COUNT(*) FROM controlcalidad
+            WHERE fechaControl >= %s AND fechaControl < %s {filtro_param}
+        """, params)
+        total = cursor.fetchone()[0]
+    finally:
+        conn.close()
+    return int(total or 0)
+
+
+def ver_reevaluacion():
+    st.title("Re-evaluación de Alertas")
+    st.markdown("---")
+    st.write("Recalcula la conformidad de controles ya registrados contra la especificación y "
+                "genera las alertas faltantes o descarta las que ya no corresponden.")
+
+    catalogo = obtener_catalogo()
+    ef = especificacion_efectiva(catalogo)
+    params = catalogo["parametros"]
+    col1, col2 = st.columns(2)
+    with col1:
+        rango = st.date_input("Rango de fechas", value=(date.today() - timedelta(days=30), date.today()))
+    with col2:
+        criterio = st.radio("Comparar contra", ["Especificación actual", "Especificación vigente en cada fecha"])
+    nombres = dict(zip(params["nombreParametro"], params["idParametro"]))
+    sel_params = st.multiselect("Parámetros (vacío = todos)", list(nombres.keys()))
+
+    if not isinstance(rango, (list, tuple)) or len(rango) != 2:
+        st.info("Seleccione fecha inicial y final.")
+        return
+    desde, hasta = rango
+    ids = [nombres[n] for n in sel_params] or None
+    criterio_clave = "actual" if criterio == "Especificación actual" else "historico"
+
+    col_sim, col_apl = st.columns(2)
+    simular = col_sim.button("Simular (sin cambios)")
+    aplicar = col_apl.button("Aplicar re-evaluación")
+    if not (simular or aplicar):
+        return
+
+    try:
+        total = contar_controles(desde, hasta, ids)
+        barra = st.progress(0.0, text=f"0 / {total} controles")
+        inicio = datetime.now()
+
+        def progreso(procesados, bloque):
+            barra.progress(min(1.0, procesados / total) if total else 1.0,
+                            text=f"{procesados} / {total} controles (bloque {bloque})")
+
+        resumen = reevaluar(desde, hasta, ids, criterio_clave, aplicar=aplicar, progreso=progreso)
+    except Exception as e:
+        st.error(f"Error en la re-evaluación: {e}")
+        return
+
+    segundos = (datetime.now() - inicio).total_seconds()
+    if resumen.empty:
+        st.info("No hay controles en el rango seleccionado.")
+        return
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Controles", int(resumen["controles"].sum()))
+    c2.metric("No cumplen", int(resumen["no_cumplen"].sum()))
+    c3.metric("Alertas nuevas", int(resumen["alertas_nuevas"].sum()))
+    c4.metric("Alertas obsoletas", int(resumen["alertas_obsoletas"].sum()))
+    st.caption(f"{'Aplicado' if aplicar else 'Simulación'} en {segundos:.1f} s.")
+    st.dataframe(resumen, use_container_width=True)
+
+
+if __name__ == "__main__":
+    ver_reevaluacion()
@@ -0,0 +1,122 @@
+import pandas as pd
+from database.db_connection import get_connection
+
+# RESUMEN DE CALIDAD POR DETALLE (tabla resumencalidadorden)
+# Se recalcula sólo para los detalles tocados, justo después de cada escritura
+# de controles o alertas, con un único INSERT ... SELECT ... ON DUPLICATE KEY UPDATE.
+# parametrosRequeridos depende de la especificación de la presentación: se
+# actualiza también al agregar o quitar parámetros de una presentación.
+
+ESTADOS_ALERTA_ABIERTA = ("pendiente", "en_proceso")
+ESTADO_ALERTA_DESCARTADA = "descartada"
+
+
+def refrescar_resumen_calidad(cursor, ids_detalle=None):
+    """Recalcula el resumen de los detalles indicados (None = todos). No hace commit."""
+    if ids_detalle is not None:
+        ids_detalle = sorted({int(i) for i in ids_detalle if i is not None})
+        if not ids_detalle:
+            return
+        marcadores = ", ".join(["%s"] * len(ids_detalle))
+        filtro_cc, filtro_d = f"WHERE idDetalle IN ({marcadores})", f"WHERE d.idDetalle IN ({marcadores})"
+        filtro_a = f"WHERE cc.idDetalle IN ({marcadores})"
+        params = (tuple(ids_detalle) + (ESTADO_ALERTA_DESCARTADA,) + ESTADOS_ALERTA_ABIERTA
+                    + tuple(ids_detalle) + tuple(ids_detalle))
+    else:
+        filtro_cc = filtro_d = filtro_a = ""
+        params = (ESTADO_ALERTA_DESCARTADA,) + ESTADOS_ALERTA_ABIERTA
+    cursor.execute(f"""
+        INSERT INTO resumencalidadorden
+            (idDetalle, idOrdenTrabajo, controles, parametrosCubiertos, parametrosRequeridos,
+                fueraEspecificacion, alertasAbiertas, primerControl, ultimoControl, actualizado)
+        SELECT d.idDetalle, d.idOrdenTrabajo,
+                COALESCE(c.controles, 0), COALESCE(c.cubiertos, 0), COALESCE(r.requeridos, 0),
+                COALESCE(a.fuera, 0), COALESCE(a.abiertas, 0), c.primero, c.ultimo, NOW()
+        FROM detalleordentrabajo d
+        LEFT JOIN (
+            SELECT idDetalle, COUNT(*) AS controles, COUNT(DISTINCT idParametro) AS cubiertos,
+                    MIN(fechaControl) AS primero, MAX(fechaControl) AS ultimo
+            FROM controlcalidad
+            {filtro_cc}
+            GROUP BY idDetalle
+        ) c ON c.idDetalle = d.idDetalle
+        LEFT JOIN (
+            SELECT cc.idDetalle, COUNT(DISTINCT CASE WHEN a.estado <> %s THEN a.idControl END) AS fuera,
+                    SUM(a.estado IN (%s, %s)) AS abiertas
+            FROM alerta a
+            INNER JOIN controlcalidad cc ON cc.idControl = a.idControl
+            {filtro_a}
+            GROUP BY cc.idDetalle
+        ) a ON a.idDetalle = d.idDetalle
+        LEFT JOIN (
+            SELECT idPresentacion, COUNT(*) AS requeridos
+            FROM presentacionparametro
+            GROUP BY idPresentacion
+        ) r ON r.idPresentacion = d.idPresentacion
+        {filtro_d}
+        ON DUPLICATE KEY UPDATE
+            idOrdenTrabajo = VALUES(idOrdenTrabajo),
+            controles = VALUES(controles),
+            parametrosCubiertos = VALUES(parametrosCubiertos),
+            parametrosRequeridos = VALUES(parametrosRequeridos),
+            fueraEspecificacion = VALUES(fueraEspecificacion),
+            alertasAbiertas = VALUES(alertasAbiertas),
+            primerControl = VALUES(primerControl),
+            ultimoControl = VALUES(ultimoControl),
+            actualizado = VALUES(actualizado)
+    """, params)
+
+
+def refrescar_requeridos(cursor, ids_presentacion):
+    """parametrosRequeridos de los detalles de las presentaciones dadas. No hace commit."""
+    ids_presentacion = sorted({int(i) for i in ids_presentacion if i is not None})
+    if not ids_presentacion:
+        return
+    cursor.execute(f"""
+        UPDATE resumencalidadorden r
+        INNER JOIN detalleordentrabajo d ON d.idDetalle = r.idDetalle
+        SET r.parametrosRequeridos = (
+                SELECT COUNT(*) FROM presentacionparametro pp WHERE pp.idPresentacion = d.idPresentacion),
+            r.actualizado = NOW()
+        WHERE d.idPresentacion IN ({", ".join(["%s"] * len(ids_presentacion))})
+    """, tuple(ids_presentacion))
+
+
+def detalles_de_alertas(cursor, ids_alerta):
+    """idDetalle de los controles asociados a las alertas dadas."""
+    ids_alerta = [int(i) for i in ids_alerta]
+    if not ids_alerta:
+        return []
+    cursor.execute(f"""
+        SELECT DISTINCT cc.idDetalle
+        FROM alerta a
+        INNER JOIN controlcalidad cc ON cc.idControl = a.idControl
+        WHERE a.idAlerta IN ({", ".join(["%s"] * len(ids_alerta))})
+    """, tuple(ids_alerta))
+    return [r[0] for r in cursor.fetchall()]
+
+
+def estado_calidad(df):
+    """Etiqueta de calidad por orden a partir de las columnas de resumencalidadorden."""
+    estado = pd.Series("Sin controles", index=df.index)
+    con_controles = df["Controles"].fillna(0) > 0
+    estado[con_controles] = "En curso"
+    completo = con_controles & (df["ParamCubiertos"].fillna(0) >= df["ParamRequeridos"].fillna(0))
+    estado[completo] = "Completo"
+    estado[df["FueraEspec"].fillna(0) > 0] = "Con desvíos"
+    estado[df["AlertasAbiertas"].fillna(0) > 0] = "Alertas abiertas"
+    return estado
+
+
+def recalcular_resumen_calidad():
+    """Reconstruye resumencalidadorden completo (carga inicial o corrección)."""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        refrescar_resumen_calidad(cursor)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
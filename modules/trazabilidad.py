@@ -0,0 +1,225 @@
+import streamlit as st
+import pandas as pd
+from database.db_connection import get_connection
+from modules.catalogo import obtener_catalogo
+from modules.especificaciones import obtener_versiones, adjuntar_limites_vigentes
+
+# TRAZABILIDAD (lote / orden → detalles → controles → alertas)
+#
+# Cada consulta es un IN sobre columnas indexadas (lote, codigoOrden, idDetalle,
+# idControl), partida en bloques para listas grandes. Para cientos de lotes se
+# hacen unas pocas consultas en total, no una por lote. Resultado cacheado por
+# la tupla de lotes/códigos pedida. Cada control se muestra con la especificación
+# vigente en su fechaControl (historial de versiones) y la fecha desde la que regía.
+
+TAM_BLOQUE_IN = 500
+
+
+def _bloques(valores):
+    valores = list(valores)
+    for i in range(0, len(valores), TAM_BLOQUE_IN):
+        yield valores[i:i + TAM_BLOQUE_IN]
+
+
+def _consultar_en_bloques(cursor, plantilla, valores):
+    """Ejecuta `plantilla` (con {marcadores}) por bloques de valores y concatena."""
+    filas, columnas = [], None
+    for bloque in _bloques(valores):
+        cursor.execute(plantilla.format(marcadores=", ".join(["%s"] * len(bloque))), tuple(bloque))
+        columnas = [c[0] for c in cursor.description]
+        filas.extend(cursor.fetchall())
+    return pd.DataFrame(filas, columns=columnas) if columnas else pd.DataFrame()
+
+
+Q_DETALLES_POR_LOTE = """
+    SELECT d.idDetalle, d.lote, d.receta, d.fechaVencimiento, d.idPresentacion,
+            p.nombrePresentacion, o.idOrdenTrabajo, o.codigoOrden, o.fecha, o.turno,
+            o.idLinea, l.nombreLinea
+    FROM DetalleOrdenTrabajo d
+    INNER JOIN OrdenTrabajo o ON d.idOrdenTrabajo = o.idOrdenTrabajo
+    LEFT JOIN PresentacionProducto p ON d.idPresentacion = p.idPresentacion
+    LEFT JOIN LineaProduccion l ON o.idLinea = l.idLinea
+    WHERE d.lote IN ({marcadores})
+"""
+
+Q_DETALLES_POR_ORDEN = Q_DETALLES_POR_LOTE.replace("d.lote IN", "o.codigoOrden IN")
+
+Q_CONTROLES = """
+    SELECT cc.idControl, cc.idDetalle, cc.fechaControl, cc.resultado, cc.observaciones,
+            cc.idParametro, cc.idTipoControl, cc.idUsuario,
+            CONCAT(u.nombre, ' ', u.apellido) AS operario
+    FROM controlcalidad cc
+    LEFT JOIN Usuario u ON u.idUsuario = cc.idUsuario
+    WHERE cc.idDetalle IN ({marcadores})
+"""
+
+Q_ALERTAS = """
+    SELECT a.idAlerta, a.idControl, a.tipoAlerta, a.descripcion, a.fechaAlerta, a.estado,
+            a.valorFuera, a.limiteInferior, a.limiteSuperior
+    FROM alerta a
+    WHERE a.idControl IN ({marcadores})
+"""
+
+
+def especificacion_vigente(catalogo, controles):
+    """
+    Límites vigentes en la fecha de cada control por (presentación, parámetro) y
+    la fecha desde la que regían; sin versión anterior, la especificación actual.
+    """
+    esp = catalogo["especificaciones"][["idPresentacion", "idParametro", "limiteInferior", "limiteSuperior"]]
+    par = catalogo["parametros"].set_index("idParametro")
+    df = controles.merge(esp, on=["idPresentacion", "idParametro"], how="left")
+    for col in ["limiteInferior", "limiteSuperior"]:
+        df[col] = df[col].fillna(df["idParametro"].map(par[col]))
+    df = adjuntar_limites_vigentes(df, obtener_versiones(), columna_vigencia="especVigenteDesde")
+    return df.rename(columns={"limiteInferior": "limiteInferiorEspec", "limiteSuperior": "limiteSuperiorEspec"})
+
+
+@st.cache_data(ttl=300, max_entries=32, show_spinner=False)
+def trazar(lotes=(), codigos=()):
+    """
+    Genealogía completa de los lotes y/o códigos de orden dados.
+    Devuelve dict de DataFrames: detalles, controles, alertas y resumen (por lote).
+    """
+    lotes = tuple(sorted({str(l).strip() for l in lotes if str(l).strip()}))
+    codigos = tuple(sorted({str(c).strip() for c in codigos if str(c).strip()}))
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        partes = []
+        if lotes:
+            partes.append(_consultar_en_bloques(cursor, Q_DETALLES_POR_LOTE, lotes))
+        if codigos:
+            partes.append(_consultar_en_bloques(cursor, Q_DETALLES_POR_ORDEN, codigos))
+        detalles = pd.concat(partes, ignore_index=True).drop_duplicates("idDetalle") if partes else pd.DataFrame()
+
+        controles = pd.DataFrame()
+        alertas = pd.DataFrame()
+        if not detalles.empty:
+            controles = _consultar_en_bloques(cursor, Q_CONTROLES, detalles["idDetalle"].astype(int).tolist())
+        if not controles.empty:
+            alertas = _consultar_en_bloques(cursor, Q_ALERTAS, controles["idControl"].astype(int).tolist())
+        cursor.close()
+    finally:
+        conn.close()
+
+    if detalles.empty:
+        vacio = pd.DataFrame()
+        return {"detalles": vacio, "controles": vacio, "alertas": vacio, "resumen": vacio,
+                "no_encontrados": list(lotes) + list(codigos)}
+
+    catalogo = obtener_catalogo()
+    contexto = detalles[["idDetalle", "lote", "codigoOrden", "idPresentacion", "nombreLinea"]]
+    if not controles.empty:
+        controles = controles.merge(contexto, on="idDetalle", how="left")
+        controles = especificacion_vigente(catalogo, controles)
+        controles["nombreParametro"] = controles["idParametro"].map(
+            catalogo["parametros"].set_index("idParametro")["nombreParametro"])
+        controles = controles.sort_values(["lote", "fechaControl"])
+    if not alertas.empty:
+        alertas = alertas.merge(controles[["idControl", "idDetalle", "lote", "codigoOrden", "nombreParametro"]],
+                                on="idControl", how="left").sort_values(["lote", "fechaAlerta"])
+
+    resumen = detalles[["lote", "codigoOrden", "fecha", "nombreLinea", "nombrePresentacion", "idDetalle"]].copy()
+    if not controles.empty:
+        agg = controles.groupby("idDetalle").agg(
+            controles=("idControl", "size"),
+            operarios=("operario", lambda s: ", ".join(sorted(s.dropna().unique()))),
+            primerControl=("fechaControl", "min"),
+            ultimoControl=("fechaControl", "max"),
+        )
+        resumen = resumen.merge(agg, on="idDetalle", how="left")
+    if not alertas.empty:
+        resumen = resumen.merge(alertas.groupby("idDetalle").size().rename("alertas"), on="idDetalle", how="left")
+    for col in ["controles", "alertas"]:
+        resumen[col] = resumen[col].fillna(0).astype(int) if col in resumen.columns else 0
+
+    encontrados = set(detalles["lote"]) | set(detalles["codigoOrden"])
+    return {
+        "detalles": detalles,
+        "controles": controles,
+        "alertas": alertas,
+        "resumen": resumen.sort_values(["lote", "codigoOrden"]).reset_index(drop=True),
+        "no_encontrados": [v for v in lotes + codigos if v not in encontrados],
+    }
+
+
+def _leer_lista(texto, archivo):
+    valores = [v.strip() for v in texto.replace(",", "\n").replace(";", "\n").splitlines()]
+    if archivo is not None:
+        df = pd.read_excel(archivo, dtype=str) if archivo.name.lower().endswith((".xlsx", ".xls")) \
+            else pd.read_csv(archivo, dtype=str)
+        valores += df.iloc[:, 0].dropna().astype(str).str.strip().tolist()
+    return tuple(v for v in valores if v)
+
+
+def ver_trazabilidad():
+    st.title("Trazabilidad de Lotes")
+    st.markdown("---")
+
+    modo = st.radio("Modo", ["Lote u Orden", "Masivo (simulación de retiro)"], horizontal=True)
+    if modo == "Lote u Orden":
+        col1, col2 = st.columns(2)
+        with col1:
+            lote = st.text_input("Lote")
+        with col2:
+            codigo = st.text_input("Código de Orden")
+        lotes = (lote.strip(),) if lote.strip() else ()
+        codigos = (codigo.strip(),) if codigo.strip() else ()
+    else:
+        texto = st.text_area("Lotes (uno por línea o separados por coma)", height=150)
+        archivo = st.file_uploader("O cargue un archivo (primera columna = lote)", type=["csv", "xlsx", "xls"])
+        lotes, codigos = _leer_lista(texto, archivo), ()
+
+    if not lotes and not codigos:
+        st.info("Ingrese al menos un lote o código de orden.")
+        return
+
+    try:
+        with st.spinner("Consultando trazabilidad..."):
+            traza = trazar(lotes, codigos)
+    except Exception as e:
+        st.error(f"Error consultando trazabilidad: {e}")
+        return
+
+    if traza["no_encontrados"]:
+        st.warning(f"No encontrados ({len(traza['no_encontrados'])}): " + ", ".join(traza["no_encontrados"][:50]))
+    if traza["detalles"].empty:
+        return
+
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Lotes", traza["detalles"]["lote"].nunique())
+    c2.metric("Órdenes", traza["detalles"]["codigoOrden"].nunique())
+    c3.metric("Controles", len(traza["controles"]))
+    c4.metric("Alertas", len(traza["alertas"]))
+
+    tab_res, tab_ctrl, tab_alert, tab_op = st.tabs(["Resumen por lote", "Controles", "Alertas", "Operarios"])
+    with tab_res:
+        st.dataframe(traza["resumen"].drop(columns=["idDetalle"]), use_container_width=True)
+        st.download_button("Descargar resumen (CSV)", traza["resumen"].to_csv(index=False).encode("utf-8"),
+                            file_name="trazabilidad_resumen.csv", mime="text/csv")
+    with tab_ctrl:
+        if traza["controles"].empty:
+            st.info("Sin controles registrados.")
+        else:
+            st.dataframe(traza["controles"], use_container_width=True)
+            st.download_button("Descargar controles (CSV)", traza["controles"].to_csv(index=False).encode("utf-8"),
+                                file_name="trazabilidad_controles.csv", mime="text/csv")
+    with tab_alert:
+        if traza["alertas"].empty:
+            st.info("Sin alertas.")
+        else:
+            st.dataframe(traza["alertas"], use_container_width=True)
+    with tab_op:
+        if traza["controles"].empty:
+            st.info("Sin controles registrados.")
+        else:
+            operarios = traza["controles"].groupby("operario", dropna=False).agg(
+                controles=("idControl", "size"), lotes=("lote", "nunique"),
+                desde=("fechaControl", "min"), hasta=("fechaControl", "max"),
+            ).reset_index()
+            st.dataframe(operarios, use_container_width=True)
+
+
+if __name__ == "__main__":
+    ver_trazabilidad()
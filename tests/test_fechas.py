@@ -0,0 +1,34 @@
+from datetime import datetime
+
+import pandas as pd
+
+from modules.fechas import parsear_fechas
+
+
+def test_iso_no_invierte_dia_y_mes():
+    fechas = parsear_fechas(["2024-05-01 10:00:03", "2024-05-01T10:00:03", "2024-05-01"])
+    assert fechas.tolist() == [
+        pd.Timestamp(2024, 5, 1, 10, 0, 3), pd.Timestamp(2024, 5, 1, 10, 0, 3), pd.Timestamp(2024, 5, 1)]
+
+
+def test_dia_mes_anio():
+    fechas = parsear_fechas(["01/05/2024", "01/05/2024 10:00", "13/05/2024"])
+    assert fechas.tolist() == [
+        pd.Timestamp(2024, 5, 1), pd.Timestamp(2024, 5, 1, 10, 0), pd.Timestamp(2024, 5, 13)]
+
+
+def test_formatos_mezclados_y_celdas_excel():
+    # celda de fecha de Excel leída con dtype=str y datetime de openpyxl
+    fechas = parsear_fechas(["2026-11-03 00:00:00", "03/11/2026", datetime(2026, 11, 3)])
+    assert fechas.tolist() == [pd.Timestamp(2026, 11, 3)] * 3
+
+
+def test_invalidas_y_nulas():
+    fechas = parsear_fechas(["", "no es fecha", None, "31/02/2024"])
+    assert fechas.isna().all()
+
+
+def test_conserva_el_indice():
+    fechas = parsear_fechas(pd.Series(["02/01/2024", "2024-01-02"], index=[10, 20]))
+    assert fechas.index.tolist() == [10, 20]
+    assert fechas.tolist() == [pd.Timestamp(2024, 1, 2)] * 2
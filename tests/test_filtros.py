@@ -0,0 +1,118 @@
+import sqlite3
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules.filtros import a_mascara, a_sql, condicion, filtro
+
+# Cada especificación se aplica por los dos caminos de modules.filtros sobre la
+# misma tabla: a_sql contra sqlite y a_mascara contra el DataFrame. Ambos deben
+# devolver exactamente las mismas filas.
+
+
+@pytest.fixture(scope="module")
+def tabla():
+    return pd.DataFrame({
+        "idControl": [1, 2, 3, 4, 5, 6, 7, 8],
+        "idLinea": [1, 1, 2, 2, 3, np.nan, 1, 3],
+        "resultado": [10.0, 12.5, 9.75, np.nan, 15.0, 10.0, -1.0, 12.5],
+        "tipoAlerta": ["fuera_rango", "fuera_rango", "check_fallido", None,
+                        "fuera_rango", "check_fallido", "fuera_rango", "tendencia"],
+        "descripcion": ["pH alto", "100% fuera", "campo_1 vacío", None,
+                        "Peso BAJO", "pH bajo", "a_b", "50%_ok"],
+        "fechaControl": pd.to_datetime([
+            "2024-03-01 08:00:00", "2024-03-01 23:59:59", "2024-03-02 00:00:00", "2024-03-02 12:30:00",
+            None, "2024-03-03 07:15:00", "2024-03-01 00:00:00", "2024-03-03 18:45:00",
+        ]),
+    })
+
+
+@pytest.fixture(scope="module")
+def conexion(tabla):
+    conn = sqlite3.connect(":memory:")
+    tabla.assign(fechaControl=tabla["fechaControl"].dt.strftime("%Y-%m-%d %H:%M:%S")).to_sql(
+        "controles", conn, index=False)
+    yield conn
+    conn.close()
+
+
+def _filas_sql(conn, spec):
+    where, params = a_sql(spec)
+    # placeholders de MySQL → sqlite; MySQL usa "\" como escape de LIKE por defecto
+    where = where.replace("%s", "?").replace("LIKE ?", "LIKE ? ESCAPE '\\'")
+    params = [p.isoformat() if isinstance(p, date) else p for p in params]
+    filas = conn.execute(f"SELECT idControl FROM controles {where}", params).fetchall()
+    return {r[0] for r in filas}
+
+
+def _filas_mascara(tabla, spec):
+    return set(tabla.loc[a_mascara(spec, tabla), "idControl"].tolist())
+
+
+CASOS = {
+    "sin_condiciones": filtro(),
+    "igual": filtro(condicion("idLinea", "=", 1)),
+    "igual_texto": filtro(condicion("tipoAlerta", "=", "fuera_rango")),
+    "distinto": filtro(condicion("idLinea", "!=", 1)),
+    "distinto_texto": filtro(condicion("tipoAlerta", "!=", "fuera_rango")),
+    "menor": filtro(condicion("resultado", "<", 10.0)),
+    "menor_igual": filtro(condicion("resultado", "<=", 10.0)),
+    "mayor": filtro(condicion("resultado", ">", 10.0)),
+    "mayor_igual": filtro(condicion("resultado", ">=", 12.5)),
+    "in": filtro(condicion("idLinea", "in", [1, 3])),
+    "in_un_valor": filtro(condicion("tipoAlerta", "in", ["tendencia"])),
+    "in_vacio": filtro(condicion("idLinea", "in", [])),
+    "in_con_none": filtro(condicion("idLinea", "in", [2, None])),
+    "contiene": filtro(condicion("descripcion", "contiene", "ph")),
+    "contiene_mayusculas": filtro(condicion("descripcion", "contiene", "peso bajo")),
+    "contiene_porcentaje": filtro(condicion("descripcion", "contiene", "%")),
+    "contiene_guion_bajo": filtro(condicion("descripcion", "contiene", "_")),
+    "igual_texto": filtro(condicion("tipoAlerta", "igual_texto", "FUERA_RANGO")),
+    "igual_texto_mixto": filtro(condicion("descripcion", "igual_texto", "ph ALTO")),
+    "igual_texto_no_es_contiene": filtro(condicion("descripcion", "igual_texto", "ph")),
+    "fecha": filtro(condicion("fechaControl", "fecha", date(2024, 3, 1))),
+    "fecha_sin_filas": filtro(condicion("fechaControl", "fecha", date(2024, 3, 9))),
+    "valor_none_se_ignora": filtro(condicion("idLinea", "=", None), condicion("tipoAlerta", "in", None)),
+    "combinado": filtro(
+        condicion("idLinea", "in", [1, 2, 3]),
+        condicion("resultado", ">=", 9.75),
+        condicion("tipoAlerta", "!=", "tendencia"),
+        condicion("descripcion", "contiene", "p"),
+        condicion("fechaControl", "fecha", None),
+    ),
+}
+
+
+@pytest.mark.parametrize("spec", CASOS.values(), ids=CASOS.keys())
+def test_sql_y_mascara_coinciden(tabla, conexion, spec):
+    assert _filas_sql(conexion, spec) == _filas_mascara(tabla, spec)
+
+
+def test_condiciones_sin_valor_no_generan_where():
+    assert a_sql(filtro(condicion("idLinea", "=", None))) == ("", ())
+
+
+def test_in_vacio_no_devuelve_filas(tabla, conexion):
+    spec = filtro(condicion("idLinea", "in", []))
+    assert a_sql(spec) == ("WHERE 1 = 0", ())
+    assert _filas_mascara(tabla, spec) == set()
+
+
+def test_columnas_traduce_expresiones():
+    where, params = a_sql(filtro(condicion("idLinea", "=", 2), condicion("fechaAlerta", "fecha", date(2024, 3, 1))),
+                            {"idLinea": "a.idLinea", "fechaAlerta": "a.fechaAlerta"})
+    assert where == "WHERE a.idLinea = %s AND DATE(a.fechaAlerta) = %s"
+    assert params == (2, date(2024, 3, 1))
+
+
+def test_igual_texto_no_distingue_mayusculas():
+    ordenes = pd.DataFrame({"dia": ["lunes", "LUNES", "Lunes", "Martes", None]})
+    spec = filtro(condicion("dia", "igual_texto", "Lunes"))
+    assert a_mascara(spec, ordenes).tolist() == [True, True, True, False, False]
+
+
+def test_operador_no_soportado():
+    with pytest.raises(ValueError):
+        condicion("idLinea", "like", "x")